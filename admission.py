@@ -0,0 +1,283 @@
+"""Admission control for the extraction endpoints.
+
+At most ``ADMISSION_MAX_CONCURRENCY`` extraction requests run at once in a worker; the rest wait in
+a bounded queue, highest priority first. A request whose estimated wait is over the deadline is
+turned away at once with 503 and a Retry-After, so under a burst the requests that are accepted
+still finish in predictable time instead of every one of them timing out together.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Tuple
+
+from starlette.responses import JSONResponse
+
+import llm
+import metrics
+import ocr
+
+# Extraction requests run at once in this worker, by default as many as Document AI calls; more
+# only queue up inside Document AI and ollama. Set to 0 to turn admission control off
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "8"))
+# Requests waiting for a slot; when full, a newcomer only gets in by displacing a lower priority one
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "32"))
+# Longest a request may wait for a slot, estimated on arrival and enforced while it waits
+ADMISSION_DEADLINE_SECONDS = float(os.getenv("ADMISSION_DEADLINE_SECONDS", "60"))
+# Service time assumed for an endpoint until one of its requests has finished: about one OCR call
+# and one llama3 generation on CPU
+ADMISSION_INITIAL_SECONDS = float(os.getenv("ADMISSION_INITIAL_SECONDS", "10"))
+# Weight of the latest request in each endpoint's moving average of service time
+ADMISSION_SMOOTHING = float(os.getenv("ADMISSION_SMOOTHING", "0.2"))
+# Rejected uploads up to this size are read before the 503 is sent; bigger ones are not read at all
+ADMISSION_DRAIN_BYTES = int(os.getenv("ADMISSION_DRAIN_BYTES", str(64 * 1024)))
+
+# Lower goes first. Single documents are what an applicant waits on at the counter; bundles and
+# plain OCR are bigger and can be retried later. Other routes (job submission, which only queues,
+# and the status endpoints) are never held back.
+ENDPOINT_PRIORITIES = {
+    "/process-aadhaar/": 0,
+    "/process-income-cert/": 0,
+    "/process-document/": 1,
+    "/process-pdf/": 2,
+    "/process-bundle/": 3,
+}
+
+# Stages with a concurrency limit of their own, as (calls run at once, mean seconds per call). Work
+# in them past that limit is queued, whether an admitted request or a job or batch started it
+STAGE_CAPACITY: Dict[str, Callable[[], Tuple[int, float]]] = {
+    "ocr": lambda: (int(ocr.pool.limiter.limit), sum(ocr.pool.latencies) / len(ocr.pool.latencies) if ocr.pool.latencies else 0.0),
+    "llm": lambda: (llm.scheduler.max_in_flight, llm.scheduler.stats()["mean_generation_seconds"]),
+}
+
+# (priority, token, endpoint, future): heap order is priority, then arrival
+Waiter = Tuple[int, int, str, asyncio.Future]
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Slots for running requests and a priority queue for the ones waiting for a slot.
+
+    Waits are estimated from the running and queued requests and each endpoint's moving average
+    of service time, so a burst of bundles counts for more than the same number of Aadhaar cards.
+    The per-stage in-flight counts bound the estimate from below: a request cannot finish before
+    the work already queued in the OCR and LLM stages ahead of it.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = ADMISSION_MAX_CONCURRENCY,
+        queue_size: int = ADMISSION_QUEUE_SIZE,
+        deadline: float = ADMISSION_DEADLINE_SECONDS,
+    ):
+        self.max_concurrency = max_concurrency
+        self.queue_size = queue_size
+        self.deadline = deadline
+        self._running: Dict[int, Tuple[str, float]] = {}
+        self._waiting: List[Waiter] = []
+        self._tokens = itertools.count()
+        self.service_seconds: Dict[str, float] = {}
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = Counter()
+        self.wait_seconds = 0.0
+
+    def service_time(self, endpoint: str) -> float:
+        return self.service_seconds.get(endpoint, ADMISSION_INITIAL_SECONDS)
+
+    def stage_wait(self) -> float:
+        """Seconds the OCR and LLM stages need to clear the work queued in them past their limits."""
+        wait = 0.0
+        for stage, capacity in STAGE_CAPACITY.items():
+            limit, seconds = capacity()
+            backlog = metrics.stages_in_flight.get(stage, 0) - limit
+            if limit > 0 and backlog > 0:
+                wait = max(wait, backlog * seconds / limit)
+        return wait
+
+    def estimated_wait(self, priority: int) -> float:
+        """Seconds until a request of this priority, arriving now, would get a slot and past the
+        work queued in the stages."""
+        if len(self._running) < self.max_concurrency and not self._waiting:
+            return self.stage_wait()
+        now = time.monotonic()
+        # What is left of the running requests, plus the queued ones that would go first
+        work = sum(max(self.service_time(endpoint) - (now - started), 0.0) for endpoint, started in self._running.values())
+        work += sum(self.service_time(endpoint) for waiter_priority, _, endpoint, _ in self._waiting if waiter_priority <= priority)
+        return max(work / self.max_concurrency, self.stage_wait())
+
+    async def acquire(self, endpoint: str, priority: int) -> int:
+        """Waits for a slot and returns the token to release it with.
+
+        Raises Rejected when the estimated wait is over the deadline, the queue is full of requests
+        that go first, the wait runs past the deadline, or a higher priority request takes its place.
+        """
+        token = next(self._tokens)
+        wait = self.estimated_wait(priority)
+        if wait > self.deadline:
+            raise self._reject(endpoint, "deadline", wait)
+        if len(self._running) < self.max_concurrency and not self._waiting:
+            self._start(token, endpoint)
+            return token
+
+        if len(self._waiting) >= self.queue_size:
+            lowest = max(self._waiting)
+            if lowest[0] <= priority:
+                raise self._reject(endpoint, "queue_full", wait)
+            # Room is made by turning away the latest arrival of the lowest priority
+            self._remove(lowest)
+            lowest[3].set_exception(self._reject(lowest[2], "displaced", self.estimated_wait(lowest[0])))
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (priority, token, endpoint, future)
+        heapq.heappush(self._waiting, waiter)
+        self.queued += 1
+        queued_at = time.monotonic()
+        try:
+            # asyncio.wait rather than wait_for: it neither cancels the future on timeout nor, on 3.11,
+            # swallows a cancellation that arrives together with the slot
+            await asyncio.wait((future,), timeout=self.deadline)
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        finally:
+            waited = time.monotonic() - queued_at
+            self.wait_seconds += waited
+            metrics.ADMISSION_WAIT.observe(waited)
+        if not future.done():
+            self._abandon(waiter)
+            raise self._reject(endpoint, "timeout", self.estimated_wait(priority))
+        # Raises Rejected when displaced by a higher priority request
+        future.result()
+        return token
+
+    def release(self, token: int, ok: bool = True) -> None:
+        """Frees a slot and hands it to the next waiter; ``ok`` requests count towards the service time."""
+        endpoint, started = self._running.pop(token)
+        if ok:
+            seconds = time.monotonic() - started
+            previous = self.service_seconds.get(endpoint)
+            self.service_seconds[endpoint] = seconds if previous is None else previous + ADMISSION_SMOOTHING * (seconds - previous)
+        while self._waiting and len(self._running) < self.max_concurrency:
+            _, waiter_token, waiter_endpoint, future = heapq.heappop(self._waiting)
+            if future.done():
+                # Its request gave up in this same loop iteration
+                continue
+            self._start(waiter_token, waiter_endpoint)
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": len(self._running),
+            "waiting": len(self._waiting),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": sum(self.rejected.values()),
+            **{f"rejected.{reason}": count for reason, count in self.rejected.items()},
+            "mean_wait_seconds": self.wait_seconds / self.queued if self.queued else 0.0,
+            # What a lowest priority request arriving now would be told
+            "estimated_wait_seconds": self.estimated_wait(max(ENDPOINT_PRIORITIES.values())),
+            "stage_wait_seconds": self.stage_wait(),
+            **{f"service_seconds.{endpoint.strip('/')}": seconds for endpoint, seconds in self.service_seconds.items()},
+            **{f"stage_in_flight.{stage}": count for stage, count in metrics.stages_in_flight.items()},
+        }
+
+    def _start(self, token: int, endpoint: str) -> None:
+        self._running[token] = (endpoint, time.monotonic())
+        self.admitted += 1
+
+    def _abandon(self, waiter: Waiter) -> None:
+        """Takes a request that stopped waiting out of the queue, or gives back the slot it was just handed."""
+        token, future = waiter[1], waiter[3]
+        if future.done() and not future.cancelled() and future.exception() is None:
+            self.release(token, ok=False)
+        else:
+            self._remove(waiter)
+            future.cancel()
+
+    def _remove(self, waiter: Waiter) -> None:
+        if waiter in self._waiting:
+            self._waiting.remove(waiter)
+            heapq.heapify(self._waiting)
+
+    def _reject(self, endpoint: str, reason: str, wait: float) -> Rejected:
+        self.rejected[reason] += 1
+        metrics.ADMISSION_REJECTED.labels(endpoint, reason).inc()
+        return Rejected(reason, max(1, math.ceil(wait)))
+
+
+controller = AdmissionController()
+
+
+async def _drain(scope, receive, limit: int = ADMISSION_DRAIN_BYTES) -> None:
+    """Reads and drops a small upload, so the client gets the 503 on a connection it can keep using.
+
+    Larger uploads, and clients waiting for 100 Continue, are not read at all: the 503 goes out at
+    once and the server closes the connection rather than take the rest of the body.
+    """
+    headers = dict(scope["headers"])
+    if headers.get(b"expect", b"").lower() == b"100-continue":
+        return
+    length = headers.get(b"content-length")
+    if length is not None and (not length.isdigit() or int(length) > limit):
+        return
+    received = 0
+    while received <= limit:
+        message = await receive()
+        if message["type"] != "http.request" or not message.get("more_body", False):
+            return
+        received += len(message.get("body", b""))
+
+
+class AdmissionMiddleware:
+    """Holds the endpoints in ``ENDPOINT_PRIORITIES`` to the controller's slots.
+
+    Plain ASGI rather than ``@app.middleware("http")``, so a streamed response keeps its slot until
+    the last line is sent, not only until the handler returns.
+    """
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        priority = ENDPOINT_PRIORITIES.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if priority is None or self.controller.max_concurrency <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = scope["path"]
+        try:
+            token = await self.controller.acquire(endpoint, priority)
+        except Rejected as e:
+            await _drain(scope, receive)
+            response = JSONResponse(
+                {"detail": f"Server busy ({e.reason}), retry in {e.retry_after}s"},
+                status_code=503, headers={"Retry-After": str(e.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            # Failures are left out of the service time: a quick 503 from ollama says nothing of how long a success takes
+            self.controller.release(token, ok=status < 500)
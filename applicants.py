@@ -0,0 +1,230 @@
+"""Persistent index of extracted applicants, used to flag repeat submissions.
+
+Historical records can be loaded from CSV, JSON lines or the Parquet results written by batch.py:
+
+    python applicants.py out/results
+    python applicants.py old_applications.csv --doc-type income_cert
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Kept next to the job queue, in the directory for state that must survive restarts
+APPLICANT_INDEX_PATH = os.getenv(
+    "APPLICANT_INDEX_PATH", os.path.join(os.getenv("GRANTS_DATA_DIR", ".data"), "applicants.sqlite3")
+)
+
+# The same number is extracted under a different key depending on the document type
+AADHAAR_FIELDS = ("Aadhaar_number", "Adhaar_Number", "Aadhaar_Number", "Aadhar_Card_No")
+MOBILE_FIELDS = ("Mobile_number", "Mobile_No")
+NAME_FIELDS = ("Name", "Applicant Name")
+DOB_FIELD = "Date_of_birth"
+
+# Checked in this order; the first key that finds an earlier record is reported
+MATCH_KEYS = ("aadhaar", "mobile", "name_dob")
+
+
+def _first(fields: Dict, names: Iterable[str]) -> Optional[str]:
+    for name in names:
+        value = fields.get(name)
+        if value not in (None, ""):
+            return str(value)
+    return None
+
+
+def normalize_aadhaar(value: Optional[str]) -> Optional[str]:
+    """The twelve digits, without the spaces the card prints between groups of four."""
+    digits = re.sub(r"\D", "", value or "")
+    return digits if len(digits) == 12 else None
+
+
+def normalize_mobile(value: Optional[str]) -> Optional[str]:
+    """The ten digit subscriber number, without a +91 or 0 prefix."""
+    digits = re.sub(r"\D", "", value or "")
+    return digits[-10:] if len(digits) >= 10 else None
+
+
+def normalize_name_dob(name: Optional[str], dob: Optional[str]) -> Optional[str]:
+    name = " ".join(re.sub(r"[^A-Z ]", " ", (name or "").upper()).split())
+    dob = re.sub(r"[-.]", "/", (dob or "").strip())
+    if not name or not dob:
+        return None
+    return f"{name}|{dob}"
+
+
+def match_keys(fields: Dict) -> Dict[str, Optional[str]]:
+    return {
+        "aadhaar": normalize_aadhaar(_first(fields, AADHAAR_FIELDS)),
+        "mobile": normalize_mobile(_first(fields, MOBILE_FIELDS)),
+        "name_dob": normalize_name_dob(_first(fields, NAME_FIELDS), fields.get(DOB_FIELD)),
+    }
+
+
+class ApplicantIndex:
+    """SQLite table of extracted records with an index per match key.
+
+    Matching is within one document type, so the Aadhaar card and income certificate of a single
+    bundle do not flag each other; each lookup is an index seek rather than a scan.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS applicants (
+                id INTEGER PRIMARY KEY,
+                doc_type TEXT NOT NULL,
+                aadhaar TEXT,
+                mobile TEXT,
+                name_dob TEXT,
+                fields TEXT NOT NULL,
+                source TEXT,
+                created_at REAL NOT NULL
+            )"""
+        )
+        for key in MATCH_KEYS:
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS applicants_{key} ON applicants (doc_type, {key})")
+        self.lookups = 0
+        self.duplicates = 0
+
+    def _find(self, doc_type: str, keys: Dict[str, Optional[str]]) -> Optional[dict]:
+        for key in MATCH_KEYS:
+            if keys[key] is None:
+                continue
+            row = self._conn.execute(
+                f"SELECT id, source, created_at FROM applicants WHERE doc_type = ? AND {key} = ? ORDER BY id LIMIT 1",
+                (doc_type, keys[key]),
+            ).fetchone()
+            if row is not None:
+                return {"id": row["id"], "matched_on": key, "source": row["source"], "created_at": row["created_at"]}
+        return None
+
+    def find(self, doc_type: str, fields: Dict) -> Optional[dict]:
+        """The earliest record of this document type sharing a match key with ``fields``."""
+        with self._lock:
+            return self._find(doc_type, match_keys(fields))
+
+    def check_and_record(self, doc_type: str, fields: Dict, source: Optional[str] = None) -> Optional[dict]:
+        """Looks up an earlier record for ``fields`` and adds them to the index, returning the match.
+
+        Both happen in one write transaction, so two workers handed the same applicant at once
+        cannot each miss the other.
+        """
+        keys = match_keys(fields)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                duplicate_of = self._find(doc_type, keys)
+                self._insert([(doc_type, keys, fields, source, time.time())])
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            self.lookups += 1
+            if duplicate_of is not None:
+                self.duplicates += 1
+            return duplicate_of
+
+    def _insert(self, records: List[Tuple[str, Dict[str, Optional[str]], Dict, Optional[str], float]]) -> None:
+        self._conn.executemany(
+            "INSERT INTO applicants (doc_type, aadhaar, mobile, name_dob, fields, source, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (doc_type, keys["aadhaar"], keys["mobile"], keys["name_dob"], json.dumps(fields, default=str), source, created_at)
+                for doc_type, keys, fields, source, created_at in records
+            ],
+        )
+
+    def bulk_import(self, records: Iterable[Tuple[str, Dict, Optional[str]]], batch_size: int = 10000) -> int:
+        """Adds (doc_type, fields, source) records without checking them, a batch per transaction."""
+        imported = 0
+        batch = []
+        for doc_type, fields, source in records:
+            batch.append((doc_type, match_keys(fields), fields, source, time.time()))
+            if len(batch) >= batch_size:
+                imported += self._import_batch(batch)
+                batch = []
+        if batch:
+            imported += self._import_batch(batch)
+        return imported
+
+    def _import_batch(self, batch: list) -> int:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._insert(batch)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return len(batch)
+
+    def stats(self) -> dict:
+        with self._lock:
+            records = self._conn.execute("SELECT COUNT(*) FROM applicants").fetchone()[0]
+        return {"records": records, "lookups": self.lookups, "duplicates": self.duplicates}
+
+
+index = ApplicantIndex(APPLICANT_INDEX_PATH)
+
+
+def read_records(path: str, doc_type: Optional[str] = None) -> Iterator[Tuple[str, Dict, Optional[str]]]:
+    """Records from a CSV or JSON lines file (one column or key per field), or batch.py Parquet output.
+
+    ``doc_type`` fills in for files without a doc_type column; batch.py rows that failed validation
+    are skipped, as they would not have been recorded by the API either.
+    """
+    if os.path.isdir(path):
+        for part in sorted(glob.glob(os.path.join(path, "*.parquet"))):
+            yield from read_records(part, doc_type)
+    elif path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for row in pq.read_table(path).to_pylist():
+            if row.get("status") == "valid" and row.get("fields"):
+                yield row["doc_type"], json.loads(row["fields"]), row.get("path")
+    elif path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                yield _record(row, doc_type, path)
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield _record(json.loads(line), doc_type, path)
+
+
+def _record(row: Dict, doc_type: Optional[str], path: str) -> Tuple[str, Dict, Optional[str]]:
+    row = dict(row)
+    row_type = row.pop("doc_type", None) or doc_type
+    if row_type is None:
+        raise ValueError(f"{path}: a record has no doc_type and --doc-type was not given")
+    return row_type, row, row.pop("source", None) or path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load historical applicant records into the duplicate index.")
+    parser.add_argument("paths", nargs="+", help="CSV, JSON lines or Parquet files, or batch.py results directories")
+    parser.add_argument("--doc-type", help="document type for records without a doc_type column")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        imported = index.bulk_import(read_records(path, args.doc_type))
+        print(f"{path}: imported {imported} records")
+    print(json.dumps(index.stats()))
+
+
+if __name__ == "__main__":
+    main()
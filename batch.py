@@ -0,0 +1,293 @@
+"""Bulk OCR -> extract -> validate over a folder or manifest of scanned PDFs, written to Parquet.
+
+    python batch.py Docs/ --output out/ --processes 4 --concurrency 8
+    python batch.py manifest.csv --output out/ --doc-type income_cert
+
+A manifest is a .txt file with one path per line, or a .csv with a ``path`` column and an optional
+``doc_type`` column. Results go to ``out/results/part-*.parquet`` and one row per failing field to
+``out/errors/part-*.parquet``. Finished files are recorded in ``out/checkpoint.sqlite3`` only once
+their part is on disk, so a restarted run skips them and redoes anything that was in flight. Files
+that failed with an error (an OCR or LLM outage, say) are not recorded and are retried on the next
+run; their new row lands in a later part than the error row.
+"""
+import argparse
+import asyncio
+import csv
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi import HTTPException
+
+import llm
+import ocr
+import preprocess
+from doctypes import DOC_TYPES, detect_type
+from layout import layout_chunks
+from ocr import process_document
+from pipeline import StageTimer, processor_name
+
+# Files each worker process takes per task, and rows buffered before a Parquet part is written
+BATCH_CHUNK_FILES = int(os.getenv("BATCH_CHUNK_FILES", "16"))
+BATCH_PART_ROWS = int(os.getenv("BATCH_PART_ROWS", "5000"))
+
+RESULT_SCHEMA = pa.schema([
+    ("path", pa.string()),
+    ("sha256", pa.string()),
+    ("doc_type", pa.string()),
+    # "valid", "invalid" (failed validation), "unrecognized" or "error"
+    ("status", pa.string()),
+    ("fields", pa.string()),
+    ("field_sources", pa.string()),
+    ("repair_attempts", pa.string()),
+    ("error", pa.string()),
+    ("timings", pa.string()),
+    ("processed_at", pa.float64()),
+])
+
+ERROR_SCHEMA = pa.schema([
+    ("path", pa.string()),
+    ("doc_type", pa.string()),
+    ("field", pa.string()),
+    ("message", pa.string()),
+])
+
+Task = Tuple[str, Optional[str]]
+
+
+def iter_inputs(source: str, doc_type: Optional[str]) -> Iterator[Task]:
+    """(path, doc_type) for every PDF under a directory or listed in a manifest."""
+    if os.path.isdir(source):
+        for path in sorted(glob.glob(os.path.join(source, "**", "*.pdf"), recursive=True)):
+            yield path, doc_type
+    elif source.endswith(".csv"):
+        with open(source, newline="") as f:
+            for row in csv.DictReader(f):
+                yield row["path"], row.get("doc_type") or doc_type
+    else:
+        with open(source) as f:
+            for line in f:
+                if line.strip():
+                    yield line.strip(), doc_type
+
+
+# Outcomes that are final; "error" rows are written but retried on the next run
+CHECKPOINT_STATUSES = {"valid", "invalid", "unrecognized"}
+
+
+class Checkpoint:
+    """Paths whose results are already in a written Parquet part."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, status TEXT NOT NULL, part TEXT NOT NULL)")
+
+    def done(self) -> set:
+        return {path for (path,) in self._conn.execute("SELECT path FROM files")}
+
+    def mark(self, rows: List[dict], part: str) -> None:
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files (path, status, part) VALUES (?, ?, ?)",
+                [(row["path"], row["status"], part) for row in rows if row["status"] in CHECKPOINT_STATUSES],
+            )
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class PartWriter:
+    """Buffers rows and writes numbered Parquet parts atomically, continuing any earlier run's numbering."""
+
+    def __init__(self, output: str, checkpoint: Checkpoint, part_rows: int = BATCH_PART_ROWS):
+        self.results_dir = os.path.join(output, "results")
+        self.errors_dir = os.path.join(output, "errors")
+        os.makedirs(self.results_dir, exist_ok=True)
+        os.makedirs(self.errors_dir, exist_ok=True)
+        self.checkpoint = checkpoint
+        self.part_rows = part_rows
+        self.part = len(glob.glob(os.path.join(self.results_dir, "part-*.parquet")))
+        self.results: List[dict] = []
+        self.errors: List[dict] = []
+
+    def add(self, results: List[dict], errors: List[dict]) -> None:
+        self.results.extend(results)
+        self.errors.extend(errors)
+        if len(self.results) >= self.part_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.results:
+            return
+        name = f"part-{self.part:05d}.parquet"
+        self._write(pa.Table.from_pylist(self.errors, schema=ERROR_SCHEMA), os.path.join(self.errors_dir, name))
+        self._write(pa.Table.from_pylist(self.results, schema=RESULT_SCHEMA), os.path.join(self.results_dir, name))
+        # Checkpoint last: a crash before this line only means the files are processed again
+        self.checkpoint.mark(self.results, name)
+        self.part += 1
+        self.results, self.errors = [], []
+
+    @staticmethod
+    def _write(table: pa.Table, path: str) -> None:
+        tmp = path + ".tmp"
+        pq.write_table(table, tmp)
+        os.replace(tmp, path)
+
+
+async def process_file(path: str, doc_type: Optional[str], shard_pages: Optional[int]) -> Tuple[dict, List[dict]]:
+    """Runs one PDF through the pipeline, keeping the fields even when validation fails."""
+    timer = StageTimer()
+    row = {"path": path, "sha256": None, "doc_type": doc_type, "status": "error", "fields": None,
+           "field_sources": None, "repair_attempts": None, "error": None, "timings": None, "processed_at": None}
+    errors = []
+    try:
+        with open(path, "rb") as f:
+            content = f.read()
+        row["sha256"] = hashlib.sha256(content).hexdigest()
+
+        with timer.stage("ocr"):
+            document = await process_document(processor_name, content, shard_pages=shard_pages, digest=row["sha256"])
+        text = document.text
+
+        if doc_type is None:
+            with timer.stage("classify"):
+                doc_type, _ = detect_type(text, len(document.pages) or 1)
+        row["doc_type"] = doc_type
+
+        if doc_type is None:
+            row["status"] = "unrecognized"
+        else:
+            document_type = DOC_TYPES[doc_type]
+            with timer.stage("extract"):
+                extraction = await document_type.extract(text, layout_chunks(document, text))
+            with timer.stage("validate"):
+                field_errors = document_type.schema.errors(extraction.fields)
+            row["fields"] = json.dumps(extraction.fields, default=str)
+            row["field_sources"] = json.dumps(extraction.field_sources)
+            row["repair_attempts"] = json.dumps(extraction.repair_attempts)
+            row["status"] = "invalid" if field_errors else "valid"
+            errors = [{"path": path, "doc_type": doc_type, "field": field, "message": message} for field, message in field_errors.items()]
+    except HTTPException as e:
+        row["error"] = json.dumps(e.detail, default=str)
+    except Exception as e:
+        row["error"] = repr(e)
+
+    row["timings"] = json.dumps(timer.timings)
+    row["processed_at"] = time.time()
+    return row, errors
+
+
+async def process_chunk(tasks: List[Task], concurrency: int, shard_pages: Optional[int]) -> Tuple[List[dict], List[dict]]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(path: str, doc_type: Optional[str]):
+        async with semaphore:
+            return await process_file(path, doc_type, shard_pages)
+
+    outcomes = await asyncio.gather(*(one(path, doc_type) for path, doc_type in tasks))
+    return [row for row, _ in outcomes], [error for _, errors in outcomes for error in errors]
+
+
+def init_worker() -> None:
+    # A worker is a CPU process already: the PDF optimizer runs on a thread here rather than in a
+    # process pool of its own, which nothing would shut down and which would keep the worker from exiting
+    preprocess.PDF_OPTIMIZE_WORKERS = 0
+
+
+async def _stop() -> None:
+    # As main.py's lifespan does; both start again on the next chunk's first file
+    await llm.scheduler.stop()
+    ocr.pool.shutdown()
+
+
+async def _run_chunk(tasks: List[Task], concurrency: int, shard_pages: Optional[int]) -> Tuple[List[dict], List[dict]]:
+    try:
+        return await process_chunk(tasks, concurrency, shard_pages)
+    finally:
+        await _stop()
+
+
+def run_chunk(tasks: List[Task], concurrency: int, shard_pages: Optional[int]) -> Tuple[List[dict], List[dict]]:
+    """Runs one chunk on an event loop of its own, stopping the Document AI pool and LLM scheduler
+    before the loop is closed; asyncio.run then finalizes async generators and the default
+    executor, so nothing is left pending on the closed loop.
+    """
+    return asyncio.run(_run_chunk(tasks, concurrency, shard_pages))
+
+
+def chunked(tasks: List[Task], size: int) -> Iterator[List[Task]]:
+    for start in range(0, len(tasks), size):
+        yield tasks[start:start + size]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", help="directory of PDFs, or a .txt/.csv manifest")
+    parser.add_argument("--output", required=True, help="directory for Parquet parts and the checkpoint")
+    parser.add_argument("--doc-type", help="schema name for every file; detected per file when omitted")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="worker processes (0 runs inline)")
+    parser.add_argument("--concurrency", type=int, default=4, help="files in flight per process")
+    parser.add_argument("--chunk-files", type=int, default=BATCH_CHUNK_FILES)
+    parser.add_argument("--part-rows", type=int, default=BATCH_PART_ROWS)
+    parser.add_argument("--shard-pages", type=int)
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    checkpoint = Checkpoint(os.path.join(args.output, "checkpoint.sqlite3"))
+    finished = checkpoint.done()
+    tasks = [task for task in iter_inputs(args.source, args.doc_type) if task[0] not in finished]
+    print(f"{len(tasks)} files to process, {len(finished)} already done")
+
+    writer = PartWriter(args.output, checkpoint, args.part_rows)
+    statuses = Counter()
+    started = time.perf_counter()
+
+    def collect(results: List[dict], errors: List[dict]) -> None:
+        writer.add(results, errors)
+        statuses.update(row["status"] for row in results)
+        done = sum(statuses.values())
+        rate = done / (time.perf_counter() - started)
+        print(f"{done}/{len(tasks)} files, {rate:.2f}/s, {dict(statuses)}", flush=True)
+
+    try:
+        if args.processes == 0:
+            for chunk in chunked(tasks, args.chunk_files):
+                collect(*run_chunk(chunk, args.concurrency, args.shard_pages))
+        else:
+            # Spawned, not forked: importing the pipeline has already opened SQLite connections (OCR and
+            # LLM caches, applicant index) that a forked child would share with this process
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=args.processes, mp_context=context, initializer=init_worker) as executor:
+                # Keep a couple of chunks queued per process rather than submitting the whole backlog
+                chunks = chunked(tasks, args.chunk_files)
+                pending = set()
+                while True:
+                    while len(pending) < args.processes * 2:
+                        chunk = next(chunks, None)
+                        if chunk is None:
+                            break
+                        pending.add(executor.submit(run_chunk, chunk, args.concurrency, args.shard_pages))
+                    if not pending:
+                        break
+                    completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        collect(*future.result())
+    finally:
+        writer.flush()
+        checkpoint.close()
+        # The optimizer's processes, started when files are run inline
+        preprocess.shutdown()
+
+
+if __name__ == "__main__":
+    main()
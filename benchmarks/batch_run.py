@@ -0,0 +1,89 @@
+"""End-to-end run of batch.py against the Document AI and ollama stand-ins, with the PDF optimizer on.
+
+The samples in Docs/ are copied --copies times under different names and processed by batch.py in
+a subprocess. The run fails if it does not finish within --timeout seconds, or if any file is
+missing from the Parquet results or the checkpoint:
+
+    python benchmarks/batch_run.py --processes 2 --copies 2
+"""
+import argparse
+import os
+import shutil
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import DOCS_DIR, FakeDocumentAI, FakeOllama  # noqa: E402
+from load_test import ROOT, free_port  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=2, help="batch.py --processes, 0 runs inline")
+    parser.add_argument("--copies", type=int, default=2, help="times each sample is included")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--ocr-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    ocr_port, llm_port = free_port(), free_port()
+    grpc_server = FakeDocumentAI(args.ocr_latency, 0.0, 0.0).serve(ocr_port)
+    llm_server = FakeOllama(args.llm_latency, 0.0, 2).serve(llm_port)
+    work_dir = tempfile.mkdtemp(prefix="batch-run-")
+    try:
+        source = os.path.join(work_dir, "in")
+        os.makedirs(source)
+        names = sorted(name for name in os.listdir(DOCS_DIR) if name.endswith(".pdf"))
+        for copy in range(args.copies):
+            for name in names:
+                shutil.copy(os.path.join(DOCS_DIR, name), os.path.join(source, f"{copy}-{name}"))
+        expected = args.copies * len(names)
+
+        output = os.path.join(work_dir, "out")
+        env = {
+            **os.environ,
+            "DOCUMENTAI_ENDPOINT": f"localhost:{ocr_port}",
+            "OLLAMA_HOST": f"http://localhost:{llm_port}",
+            "GRANTS_CACHE_DIR": os.path.join(work_dir, "cache"),
+            "GRANTS_DATA_DIR": os.path.join(work_dir, "data"),
+            # Every sample goes through the optimizer, however small
+            "PDF_OPTIMIZE": "1",
+            "PDF_OPTIMIZE_MIN_BYTES": "0",
+        }
+        started = time.perf_counter()
+        # In a session of its own, so a hung run can be killed along with its worker processes
+        batch = subprocess.Popen(
+            [sys.executable, "batch.py", source, "--output", output, "--processes", str(args.processes), "--chunk-files", "2"],
+            cwd=ROOT, env=env, start_new_session=True,
+        )
+        try:
+            returncode = batch.wait(timeout=args.timeout)
+        except subprocess.TimeoutExpired:
+            os.killpg(batch.pid, signal.SIGKILL)
+            batch.wait()
+            sys.exit(f"FAIL batch.py did not exit within {args.timeout:.0f}s")
+        if returncode:
+            sys.exit(f"FAIL batch.py exited with {returncode}")
+        seconds = time.perf_counter() - started
+
+        rows = pq.read_table(os.path.join(output, "results")).num_rows
+        with sqlite3.connect(os.path.join(output, "checkpoint.sqlite3")) as conn:
+            checkpointed = conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        print(f"{expected} files, {rows} result rows, {checkpointed} checkpointed, {seconds:.1f}s")
+        if rows != expected or checkpointed != expected:
+            sys.exit("FAIL results or checkpoint incomplete")
+    finally:
+        llm_server.shutdown()
+        grpc_server.stop(0)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Memory and time of chunking a long OCR result: the old blank-line split versus layout spans.
+
+The document is synthetic, built like fake_services.py answers: the sample texts repeated over
+--pages pages, one paragraph per line. Peak allocation is measured with tracemalloc:
+
+    python benchmarks/chunking.py --pages 50
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable
+
+from google.cloud import documentai_v1beta3 as documentai
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from context import select_context  # noqa: E402
+from fake_services import SAMPLE_TEXT, fake_page  # noqa: E402
+from layout import layout_chunks  # noqa: E402
+
+
+def build_document(page_count: int) -> documentai.Document:
+    samples = list(SAMPLE_TEXT.values())
+    text = ""
+    pages = []
+    for number in range(1, page_count + 1):
+        # Scans rarely have blank lines, so neither does the page text
+        page_text = samples[number % len(samples)].replace("\n\n", "\n") + "\n"
+        pages.append(fake_page(number, len(text), page_text))
+        text += page_text
+    # Round-tripped like a cached result, so fields are read back out of the protobuf
+    return documentai.Document.deserialize(documentai.Document.serialize(documentai.Document(text=text, pages=pages)))
+
+
+def old_text(document: documentai.Document) -> str:
+    extracted_data = []
+    for chunk_number, chunk_content in enumerate(document.text.split("\n\n"), start=1):
+        extracted_data.append({"file_name": "test.pdf", "file_type": ".pdf", "chunk_number": chunk_number, "content": chunk_content})
+    return "\n".join(t["content"] for t in extracted_data)
+
+
+def new_text(document: documentai.Document) -> str:
+    return document.text.replace("\n\n", "\n")
+
+
+def measure(name: str, function: Callable[[], object], repeat: int = 5) -> None:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    seconds = (time.perf_counter() - started) / repeat
+    # Timed and traced separately, as tracing slows allocation-heavy code several times over
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    chunks = len(result) if isinstance(result, list) else 1
+    print(f"{name:<36}{seconds * 1000:>10.2f}{peak / 1024:>12.0f}{chunks:>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--doc-type", default="income_cert")
+    args = parser.parse_args()
+
+    document = build_document(args.pages)
+    text = document.text
+    layout = layout_chunks(document, text)
+    print(f"{args.pages} pages, {len(text)} characters")
+    print(f"{'':<36}{'ms':>10}{'peak KiB':>12}{'chunks':>8}")
+    measure("process-pdf text, split and join", lambda: old_text(document))
+    measure("process-pdf text, replace", lambda: new_text(document))
+    measure("chunks, blank-line split", lambda: document.text.split("\n\n"))
+    measure("chunks, layout spans", lambda: layout_chunks(document, text))
+    measure("prompt context, blank-line split", lambda: select_context(text, args.doc_type))
+    measure("prompt context, layout spans", lambda: select_context(text, args.doc_type, layout=layout))
+
+
+if __name__ == "__main__":
+    main()
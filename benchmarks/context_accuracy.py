@@ -0,0 +1,104 @@
+"""Checks that prompt trimming leaves llama3 extractions on the sample PDFs unchanged.
+
+Each document is OCRed once, then extracted twice: from the full OCR text and from the layout
+paragraphs select_context keeps. Needs Document AI credentials and a local ollama server:
+
+    python benchmarks/context_accuracy.py --budget 400
+
+With --sample-text it runs offline on the canned OCR text in fake_services.py instead, and reports
+field recall: the share of fields the regex extractors read from the full text that they still
+read, with the same value, from the trimmed context. Small budgets make trimming bite:
+
+    python benchmarks/context_accuracy.py --sample-text --budget 60
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from checks import SCHEMAS  # noqa: E402
+from context import LLM_CONTEXT_TOKEN_BUDGET, select_context  # noqa: E402
+from extractors import extract_aadhaar_entities, extract_income_cert_entities  # noqa: E402
+from fake_services import SAMPLE_TEXT  # noqa: E402
+from layout import layout_chunks  # noqa: E402
+from llm import parse_aadhaar_info, parse_income_cert  # noqa: E402
+from ocr import process_document  # noqa: E402
+from pipeline import processor_name  # noqa: E402
+
+# The sample scans and the extractor that fits each best
+SAMPLES = {
+    "Docs/medium_aadhar.pdf": "aadhaar",
+    "Docs/test.pdf": "aadhaar",
+    "Docs/low.pdf": "income_cert",
+    "Docs/strike.pdf": "income_cert",
+}
+
+PARSERS = {
+    "aadhaar": parse_aadhaar_info,
+    "income_cert": parse_income_cert,
+}
+
+REGEX_EXTRACTORS = {
+    "aadhaar": extract_aadhaar_entities,
+    "income_cert": extract_income_cert_entities,
+}
+
+
+def normalize(info: dict, doc_type: str) -> dict:
+    return {key: " ".join(str(info.get(key) or "").split()).lower() for key in SCHEMAS[doc_type].patterns}
+
+
+async def check(path: str, doc_type: str, budget: int) -> bool:
+    with open(path, "rb") as f:
+        document = await process_document(processor_name, f.read())
+
+    context, usage = select_context(document.text, doc_type, token_budget=budget, layout=layout_chunks(document))
+    parse = PARSERS[doc_type]
+    full = normalize(await parse(document.text), doc_type)
+    trimmed = normalize(await parse(context), doc_type)
+
+    changed = {key: (full[key], trimmed[key]) for key in full if full[key] != trimmed[key]}
+    print(
+        f"{os.path.basename(path):<20}{doc_type:<13}{usage['tokens_before']:>8}{usage['tokens_after']:>8}"
+        f"{usage['tokens_saved']:>8}  {'same' if not changed else changed}"
+    )
+    return not changed
+
+
+def field_recall(budget: int) -> float:
+    found = kept = 0
+    for path, doc_type in SAMPLES.items():
+        text = SAMPLE_TEXT[os.path.basename(path)]
+        context, usage = select_context(text, doc_type, token_budget=budget)
+        extract = REGEX_EXTRACTORS[doc_type]
+        full, trimmed = extract(text), extract(context)
+        lost = sorted(key for key, value in full.items() if trimmed.get(key) != value)
+        found += len(full)
+        kept += len(full) - len(lost)
+        print(
+            f"{os.path.basename(path):<20}{doc_type:<13}{usage['tokens_before']:>8}{usage['tokens_after']:>8}"
+            f"{usage['tokens_saved']:>8}  {len(full) - len(lost)}/{len(full)}{'  lost ' + ', '.join(lost) if lost else ''}"
+        )
+    return kept / found if found else 1.0
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=int, default=LLM_CONTEXT_TOKEN_BUDGET, help="token budget for the trimmed prompt")
+    parser.add_argument("--sample-text", action="store_true", help="measure regex field recall on the canned OCR text, offline")
+    args = parser.parse_args()
+
+    print(f"{'file':<20}{'type':<13}{'before':>8}{'after':>8}{'saved':>8}  fields")
+    if args.sample_text:
+        recall = field_recall(args.budget)
+        print(f"field recall {recall:.0%}")
+        sys.exit(0 if recall == 1.0 else 1)
+    results = [await check(path, doc_type, args.budget) for path, doc_type in SAMPLES.items()]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,361 @@
+"""Local stand-ins for Document AI and ollama, so the service can be load tested without cloud quota.
+
+The Document AI fake is a plaintext gRPC server that answers ProcessDocument with canned text for the
+pages of the sample scans in Docs/ (recognised by their images, also inside shards and bundles) and a
+placeholder for any other page. The ollama fake answers /api/chat and /api/generate with a JSON object
+holding every key named in the prompt's [json_structure]. Both sleep for a configurable latency first. Point the app at them with:
+
+    DOCUMENTAI_ENDPOINT=localhost:50051 OLLAMA_HOST=http://localhost:11434 python main.py
+
+and start them with:
+
+    python benchmarks/fake_services.py --ocr-latency 1.5 --llm-latency 4
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent import futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+import grpc
+import pikepdf
+from google.cloud import documentai_v1beta3 as documentai
+from PIL import Image
+
+DOCS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Docs")
+
+# OCR text shaped like each sample scan (fictitious values), including the Telugu duplicates and the
+# boilerplate that real Document AI output carries
+SAMPLE_TEXT = {
+    "medium_aadhar.pdf": (
+        "భారత ప్రభుత్వం\nGovernment of India\nరవి కుమార్\nRavi Kumar\nపుట్టిన తేదీ/DOB: 14/08/1991\n"
+        "పురుషుడు/ MALE\n\n4821 7735 0193\nVID: 9134 5521 0087 6612\n\n"
+        "ఆధార్, నా గుర్తింపు\nAadhaar is proof of identity, not of citizenship or date of birth."
+    ),
+    "test.pdf": (
+        "Government of India\nSita Devi\nDOB: 02/11/1987\nFEMALE\n\n7304 2219 5569\n"
+        "Download Date: 03/01/2024\nIssue Date: 12/05/2019"
+    ),
+    "low.pdf": (
+        "ANNEXURE-B\nAPPLICATION FOR ISSUE OF CERTIFICATE TO OTHER BACKWARD CLASSES\n\n"
+        "1. Name of the Applicant: Lakshmi Narayana\n2. Father's/Husband's Name: Venkata Rao\n"
+        "3. Date of Birth: 21/06/1995\n4. Caste: Gouda\n\n5. Aadhaar No: 6612 9043 1188\n"
+        "6. Mobile No: 9848012345\n7. Ration Card No: WAP 0123 4567\n\n"
+        "Annual income of the family from all sources: 1,20,000\n\nSignature of the Applicant"
+    ),
+    "strike.pdf": (
+        "FORM-II A\nAPPLICATION FOR GRANT OF COMMUNITY AND DATE OF BIRTH CERTIFICATE\n"
+        "SCHEDULED CASTES/BACKWARD CLASSES\n\nName: K Srinivas\nFather Name: K Ramaiah\n"
+        "Date of Birth: 05-03-1989\nCommunity: Mala\n\nAadhar 3390 1175 2209\nCell 9000012345\n\n"
+        "Signature of the Applicant"
+    ),
+}
+
+# Plausible values for prompt keys, matched on the lowercased key name in this order
+LLM_VALUES = [
+    (("aadhaar", "adhaar", "aadhar"), "4821 7735 0193"),
+    (("date", "dob", "birth"), "14/08/1991"),
+    (("mobile", "phone", "cell"), "9848012345"),
+    (("income",), "120000"),
+    (("card", "_no", "number"), "WAP01234567"),
+    (("address",), "12 Gandhi Nagar, Vijayawada"),
+    (("caste", "community"), "Gouda"),
+    (("father", "husband"), "Venkata Rao"),
+]
+DEFAULT_LLM_VALUE = "Ravi Kumar"
+
+JSON_KEY = re.compile(r'"([^":{}]+)"?\s*:\s*---')
+
+# Image hashes of one page; pages further apart than this many differing bits are different scans
+Fingerprint = Tuple[int, ...]
+FINGERPRINT_MAX_DISTANCE = 16
+
+
+def jittered(latency: float, jitter: float) -> float:
+    return max(0.0, latency + random.uniform(-jitter, jitter))
+
+
+def image_hash(image: pikepdf.Object) -> int:
+    """256-bit average hash of an image: the same for a scan after it is recompressed or downsampled."""
+    if image.get("/Filter") == pikepdf.Name.DCTDecode:
+        pil_image = Image.open(io.BytesIO(image.read_raw_bytes()))
+        # Decodes at a fraction of the size, which is all the hash needs
+        pil_image.draft("L", (64, 64))
+    else:
+        pil_image = pikepdf.PdfImage(image).as_pil_image()
+    values = list(pil_image.convert("L").resize((16, 16), Image.Resampling.BOX).getdata())
+    mean = sum(values) / len(values)
+    return sum(1 << index for index, value in enumerate(values) if value > mean)
+
+
+def page_fingerprints(content: bytes) -> List[Fingerprint]:
+    """The hashes of each page's embedded images, so a sample page is recognised inside shards,
+    bundles and optimized uploads.
+    """
+    try:
+        with pikepdf.open(io.BytesIO(content)) as pdf:
+            prints = []
+            for page in pdf.pages:
+                xobjects = page.obj.get("/Resources", {}).get("/XObject", {})
+                prints.append(tuple(
+                    image_hash(xobjects[name]) for name in sorted(xobjects.keys()) if xobjects[name].get("/Subtype") == "/Image"
+                ))
+            return prints
+    except pikepdf.PdfError:
+        return [(int(hashlib.sha256(content).hexdigest(), 16),)]
+
+
+def fingerprint_distance(first: Fingerprint, second: Fingerprint) -> int:
+    if len(first) != len(second):
+        return FINGERPRINT_MAX_DISTANCE + 1
+    return sum(bin(a ^ b).count("1") for a, b in zip(first, second))
+
+
+def _layout(start: int, end: int, top: float = 0.0, bottom: float = 1.0) -> documentai.Document.Page.Layout:
+    box = [documentai.NormalizedVertex(x=x, y=y) for x, y in ((0.05, top), (0.95, top), (0.95, bottom), (0.05, bottom))]
+    return documentai.Document.Page.Layout(
+        text_anchor=documentai.Document.TextAnchor(text_segments=[documentai.Document.TextAnchor.TextSegment(start_index=start, end_index=end)]),
+        confidence=0.95,
+        bounding_poly=documentai.BoundingPoly(normalized_vertices=box),
+    )
+
+
+def fake_page(number: int, offset: int, page_text: str) -> documentai.Document.Page:
+    """A page whose text starts at ``offset`` in the document, one paragraph per line stacked down the page."""
+    lines = page_text.splitlines(keepends=True)
+    paragraphs = []
+    start = offset
+    for index, line in enumerate(lines):
+        paragraphs.append(documentai.Document.Page.Paragraph(
+            layout=_layout(start, start + len(line), index / len(lines), (index + 1) / len(lines))
+        ))
+        start += len(line)
+    return documentai.Document.Page(page_number=number, layout=_layout(offset, offset + len(page_text)), paragraphs=paragraphs)
+
+
+class FakeDocumentAI:
+    """ProcessDocument handler: base latency plus a per-page cost, canned text by page image hash."""
+
+    def __init__(self, latency: float = 1.0, page_latency: float = 0.2, jitter: float = 0.0,
+                 fixtures: Optional[Dict[str, str]] = None, unique: bool = False):
+        self.latency = latency
+        self.page_latency = page_latency
+        self.jitter = jitter
+        # Start every answer with a reference number of its own, so repeated uploads of the samples
+        # read like different applicants' documents and their prompts are not coalesced
+        self.unique = unique
+        # The canned text goes on a sample's first page; its later pages come back blank
+        self.texts: Dict[Fingerprint, str] = {}
+        for name, text in {**SAMPLE_TEXT, **(fixtures or {})}.items():
+            path = os.path.join(DOCS_DIR, name)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    prints = page_fingerprints(f.read())
+                self.texts.update({fingerprint: "" for fingerprint in prints[1:]})
+                self.texts[prints[0]] = text
+        self.requests = 0
+
+    def page_text(self, fingerprint: Fingerprint, default: str) -> str:
+        if fingerprint in self.texts:
+            return self.texts[fingerprint]
+        if not fingerprint:
+            return default
+        nearest = min(self.texts, key=lambda known: fingerprint_distance(fingerprint, known), default=None)
+        if nearest is None or fingerprint_distance(fingerprint, nearest) > FINGERPRINT_MAX_DISTANCE:
+            return default
+        return self.texts[nearest]
+
+    def process_document(self, request: documentai.ProcessRequest, context) -> documentai.ProcessResponse:
+        self.requests += 1
+        prints = page_fingerprints(request.raw_document.content)
+        time.sleep(jittered(self.latency + self.page_latency * len(prints), self.jitter))
+
+        text = ""
+        pages = []
+        for number, fingerprint in enumerate(prints, start=1):
+            page_text = self.page_text(fingerprint, f"Page {number} of {len(prints)}")
+            if self.unique and number == 1:
+                page_text = f"Ref No {self.requests}\n{page_text}"
+            page_text += "\n" if page_text else ""
+            pages.append(fake_page(number, len(text), page_text))
+            text += page_text
+        document = documentai.Document(text=text, mime_type=request.raw_document.mime_type, pages=pages)
+        return documentai.ProcessResponse(document=document)
+
+    def serve(self, port: int, workers: int = 32) -> grpc.Server:
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers))
+        handler = grpc.method_handlers_generic_handler(
+            "google.cloud.documentai.v1beta3.DocumentProcessorService",
+            {
+                "ProcessDocument": grpc.unary_unary_rpc_method_handler(
+                    self.process_document,
+                    request_deserializer=documentai.ProcessRequest.deserialize,
+                    response_serializer=documentai.ProcessResponse.serialize,
+                ),
+            },
+        )
+        server.add_generic_rpc_handlers((handler,))
+        server.add_insecure_port(f"localhost:{port}")
+        server.start()
+        return server
+
+
+class FakeOllama:
+    """Answers chat and generate calls, running at most ``slots`` generations at once like a CPU-bound ollama."""
+
+    def __init__(self, latency: float = 3.0, jitter: float = 0.0, slots: int = 1,
+                 overrides: Optional[Dict[str, str]] = None, filler: float = 0.0, prompt_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.slots = threading.Semaphore(slots)
+        self.overrides = overrides or {}
+        # Seconds of trailing whitespace a stream keeps producing after the object, as llama3 does in
+        # JSON mode, unless the client hangs up first
+        self.filler = filler
+        # Prompt tokens evaluated per second, 0 for free; like ollama, the part of a prompt shared with
+        # the previous one is kept evaluated and not counted again
+        self.prompt_rate = prompt_rate
+        self.last_prompt = ""
+        self.prompt_lock = threading.Lock()
+        self.requests = 0
+        self.filler_cut = 0
+
+    def answer(self, prompt: str) -> str:
+        values = {}
+        for key in JSON_KEY.findall(prompt):
+            key = key.strip()
+            lowered = key.lower()
+            value = next((value for words, value in LLM_VALUES if any(word in lowered for word in words)), DEFAULT_LLM_VALUE)
+            values[key] = self.overrides.get(key, value)
+        return json.dumps(values)
+
+    @staticmethod
+    def prompt(body: dict) -> str:
+        return body.get("prompt") or "\n".join(message.get("content", "") for message in body.get("messages", []))
+
+    def evaluate_prompt(self, body: dict) -> Tuple[int, float]:
+        """Tokens of the prompt after its prefix shared with the last one (four characters a token), and seconds taken."""
+        prompt = self.prompt(body)
+        with self.prompt_lock:
+            shared = len(os.path.commonprefix([self.last_prompt, prompt]))
+            self.last_prompt = prompt
+        tokens = (len(prompt) - shared + 3) // 4
+        seconds = tokens / self.prompt_rate if self.prompt_rate else 0.0
+        with self.slots:
+            time.sleep(seconds)
+        return tokens, seconds
+
+    def generate(self, body: dict) -> str:
+        self.requests += 1
+        prompt = self.prompt(body)
+        with self.slots:
+            time.sleep(jittered(self.latency, self.jitter))
+        return self.answer(prompt) if prompt else ""
+
+    def serve(self, port: int) -> ThreadingHTTPServer:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, payload: dict, status: int = 200) -> None:
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self.send_json({"models": [{"name": "llama3:latest", "model": "llama3:latest"}]})
+                elif self.path == "/api/version":
+                    self.send_json({"version": "0.0.0-fake"})
+                else:
+                    self.send_json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                if self.path not in ("/api/chat", "/api/generate"):
+                    self.send_json({"error": "not found"}, 404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                prompt_tokens, prompt_seconds = fake.evaluate_prompt(body)
+                content = fake.generate(body)
+                chat = self.path == "/api/chat"
+
+                def message(text: str, done: bool) -> dict:
+                    payload = {"model": body.get("model", "llama3"), "created_at": "1970-01-01T00:00:00Z", "done": done}
+                    if done:
+                        payload.update(prompt_eval_count=prompt_tokens, prompt_eval_duration=int(prompt_seconds * 1e9))
+                    if chat:
+                        payload["message"] = {"role": "assistant", "content": text}
+                    else:
+                        payload["response"] = text
+                    return payload
+
+                # ollama streams by default; the client sends stream=false for a single reply
+                if not body.get("stream", True):
+                    self.send_json(message(content, True))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                for start in range(0, len(content), 8):
+                    self.wfile.write((json.dumps(message(content[start:start + 8], False)) + "\n").encode())
+                try:
+                    with fake.slots:
+                        deadline = time.monotonic() + fake.filler
+                        while time.monotonic() < deadline:
+                            self.wfile.write((json.dumps(message("\n", False)) + "\n").encode())
+                            self.wfile.flush()
+                            time.sleep(0.02)
+                    self.wfile.write((json.dumps(message("", True)) + "\n").encode())
+                except (BrokenPipeError, ConnectionResetError):
+                    fake.filler_cut += 1
+
+        server = ThreadingHTTPServer(("localhost", port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def load_json(path: Optional[str]) -> Optional[dict]:
+    if not path:
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ocr-port", type=int, default=50051)
+    parser.add_argument("--ocr-latency", type=float, default=1.0, help="seconds per ProcessDocument call")
+    parser.add_argument("--ocr-page-latency", type=float, default=0.2, help="extra seconds per page")
+    parser.add_argument("--ocr-fixtures", help="JSON file mapping Docs/ file names to OCR text")
+    parser.add_argument("--llm-port", type=int, default=11434)
+    parser.add_argument("--llm-latency", type=float, default=3.0, help="seconds per generation")
+    parser.add_argument("--llm-slots", type=int, default=1, help="generations run at once")
+    parser.add_argument("--llm-responses", help="JSON file of field values to answer with")
+    parser.add_argument("--llm-filler", type=float, default=0.0, help="seconds of whitespace streamed after the JSON object")
+    parser.add_argument("--llm-prompt-rate", type=float, default=0.0, help="prompt tokens evaluated per second, 0 for free")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform +/- seconds added to every latency")
+    args = parser.parse_args()
+
+    ocr = FakeDocumentAI(args.ocr_latency, args.ocr_page_latency, args.jitter, load_json(args.ocr_fixtures))
+    grpc_server = ocr.serve(args.ocr_port)
+    FakeOllama(args.llm_latency, args.jitter, args.llm_slots, load_json(args.llm_responses), args.llm_filler,
+               args.llm_prompt_rate).serve(args.llm_port)
+    print(f"Document AI on localhost:{args.ocr_port}, ollama on http://localhost:{args.llm_port}")
+    grpc_server.wait_for_termination()
+
+
+if __name__ == "__main__":
+    main()
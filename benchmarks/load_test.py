@@ -0,0 +1,303 @@
+"""Replays the sample scans against every endpoint and reports latency percentiles, throughput and memory.
+
+Document AI and ollama are replaced by the stand-ins in fake_services.py, and the app runs under
+uvicorn in a subprocess, so no cloud quota or GPU is needed:
+
+    python benchmarks/load_test.py --concurrency 8 --requests 40 --output results.json
+    python benchmarks/load_test.py --baseline results.json   # exits 1 on a regression
+
+Caches are disabled unless --warm-cache is given, so every request pays for OCR and generation.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List
+
+import httpx
+import pikepdf
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import FakeDocumentAI, FakeOllama  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# The sample scans and the document type each one is
+SAMPLES = {
+    "Docs/low.pdf": "income-cert",
+    "Docs/medium_aadhar.pdf": "aadhaar",
+    "Docs/strike.pdf": "community_or_birth_certificate",
+    "Docs/test.pdf": "aadhaar",
+}
+
+ENDPOINTS = ["pdf", "pdf-stream", "aadhaar", "income-cert", "document", "bundle", "jobs"]
+# Endpoints for one document type, sent only the samples of that type; the rest get every sample
+TYPED_ENDPOINTS = ("aadhaar", "income-cert")
+BUNDLE = "Docs/bundle.pdf"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: List[float], q: float) -> float:
+    # Nearest-rank percentile, so small runs report an observed latency
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+class MemorySampler:
+    """Polls the RSS of the server process and its children, keeping the peak."""
+
+    def __init__(self, pid: int, interval: float = 0.05):
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def rss(self) -> int:
+        total = 0
+        for process in [self.process] + self.process.children(recursive=True):
+            try:
+                total += process.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        return total
+
+    def reset(self) -> None:
+        self.peak = self.rss()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.rss())
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+async def call(client: httpx.AsyncClient, endpoint: str, path: str, doc_type: str, content: bytes) -> int:
+    files = {"file": (os.path.basename(path), content, "application/pdf")}
+    if endpoint == "pdf":
+        return (await client.post("/process-pdf/", files=files)).status_code
+    if endpoint == "pdf-stream":
+        async with client.stream("POST", "/process-pdf/", params={"stream": "true"}, files=files) as response:
+            async for _ in response.aiter_lines():
+                pass
+            return response.status_code
+    if endpoint == "aadhaar":
+        return (await client.post("/process-aadhaar/", files=files)).status_code
+    if endpoint == "income-cert":
+        return (await client.post("/process-income-cert/", files=files)).status_code
+    if endpoint == "document":
+        return (await client.post("/process-document/", files=files)).status_code
+    if endpoint == "bundle":
+        return (await client.post("/process-bundle/", files=files)).status_code
+    if endpoint == "jobs":
+        # Types without an endpoint of their own go through the auto-routing pipeline
+        job_type = doc_type if doc_type in TYPED_ENDPOINTS else "document"
+        response = await client.post(f"/jobs/{job_type}", files=files)
+        if response.status_code != 202:
+            return response.status_code
+        job_id = response.json()["job_id"]
+        while True:
+            job = (await client.get(f"/jobs/{job_id}", params={"wait": 30})).json()
+            if job["status"] == "succeeded":
+                return 200
+            if job["status"] == "failed":
+                return job["error"]["status_code"]
+    raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+async def run_endpoint(base_url: str, endpoint: str, samples: Dict[str, bytes], total: int, concurrency: int) -> dict:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    # The bundle endpoint gets all the samples as one scan; the others cycle through the ones they take
+    if endpoint == "bundle":
+        paths = [BUNDLE]
+    elif endpoint in TYPED_ENDPOINTS:
+        paths = [path for path in samples if SAMPLES.get(path) == endpoint]
+    else:
+        paths = [path for path in samples if path != BUNDLE]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(client: httpx.AsyncClient, index: int) -> None:
+        path = paths[index % len(paths)]
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                status = str(await call(client, endpoint, path, SAMPLES.get(path, "bundle"), samples[path]))
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=600) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(client, index) for index in range(total)))
+        elapsed = time.perf_counter() - started
+
+    # 422 is a validation verdict, not a failure of the service
+    errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 500)
+    return {
+        "requests": total,
+        "errors": errors,
+        "statuses": statuses,
+        "seconds": elapsed,
+        "rps": total / elapsed if elapsed else 0.0,
+        "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+
+def make_bundle(contents: List[bytes]) -> bytes:
+    # The sources stay open until the bundle is saved, since their pages are copied lazily
+    sources = [pikepdf.open(io.BytesIO(content)) for content in contents]
+    bundle = pikepdf.new()
+    for pdf in sources:
+        bundle.pages.extend(pdf.pages)
+    buffer = io.BytesIO()
+    bundle.save(buffer)
+    for pdf in sources:
+        pdf.close()
+    return buffer.getvalue()
+
+
+def start_server(port: int, env: dict) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "localhost", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with {server.returncode}")
+        try:
+            if httpx.get(f"http://localhost:{port}/ready", timeout=1).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Server did not start within 60 seconds")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    regressions = []
+    for endpoint, before in baseline["endpoints"].items():
+        after = results["endpoints"].get(endpoint)
+        if after is None:
+            continue
+        if after["p95"] > before["p95"] * (1 + tolerance):
+            regressions.append(f"{endpoint}: p95 {before['p95']:.3f}s -> {after['p95']:.3f}s")
+        if after["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{endpoint}: rps {before['rps']:.2f} -> {after['rps']:.2f}")
+        if after["errors"] > before["errors"]:
+            regressions.append(f"{endpoint}: errors {before['errors']} -> {after['errors']}")
+    if results["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + tolerance):
+        regressions.append(f"peak RSS {baseline['peak_rss_mb']:.1f}MB -> {results['peak_rss_mb']:.1f}MB")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight at once")
+    parser.add_argument("--requests", type=int, default=20, help="requests per endpoint, cycling through the samples")
+    parser.add_argument("--ocr-latency", type=float, default=0.5)
+    parser.add_argument("--ocr-page-latency", type=float, default=0.1)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--llm-slots", type=int, default=1)
+    parser.add_argument("--llm-filler", type=float, default=0.0, help="seconds of whitespace the fake streams after the JSON object")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--warm-cache", action="store_true", help="keep the OCR and LLM caches enabled")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown before failing")
+    args = parser.parse_args()
+
+    samples = {}
+    for path in SAMPLES:
+        with open(os.path.join(ROOT, path), "rb") as f:
+            samples[path] = f.read()
+
+    samples[BUNDLE] = make_bundle(list(samples.values()))
+
+    ocr_port, llm_port, app_port = free_port(), free_port(), free_port()
+    grpc_server = FakeDocumentAI(args.ocr_latency, args.ocr_page_latency, args.jitter).serve(ocr_port)
+    llm_server = FakeOllama(args.llm_latency, args.jitter, args.llm_slots, filler=args.llm_filler).serve(llm_port)
+
+    data_dir = os.path.join(ROOT, ".data", f"load-test-{os.getpid()}")
+    env = {
+        **os.environ,
+        "DOCUMENTAI_ENDPOINT": f"localhost:{ocr_port}",
+        "OLLAMA_HOST": f"http://localhost:{llm_port}",
+        "GRANTS_CACHE_DIR": os.path.join(data_dir, "cache"),
+        "GRANTS_DATA_DIR": data_dir,
+    }
+    if not args.warm_cache:
+        for name in ("OCR_CACHE_MEMORY_BYTES", "OCR_CACHE_DISK_BYTES", "LLM_CACHE_MEMORY_BYTES", "LLM_CACHE_DISK_BYTES"):
+            env[name] = "0"
+
+    server = start_server(app_port, env)
+    sampler = MemorySampler(server.pid)
+    sampler.start()
+    results = {
+        "config": {**vars(args), "python": platform.python_version(), "started_at": time.time()},
+        "endpoints": {},
+    }
+    try:
+        print(f"{'endpoint':<13}{'reqs':>6}{'errors':>8}{'rps':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'peak MB':>9}")
+        for endpoint in args.endpoints:
+            sampler.reset()
+            stats = asyncio.run(run_endpoint(f"http://localhost:{app_port}", endpoint, samples, args.requests, args.concurrency))
+            stats["peak_rss_mb"] = sampler.peak / 1024 / 1024
+            results["endpoints"][endpoint] = stats
+            print(
+                f"{endpoint:<13}{stats['requests']:>6}{stats['errors']:>8}{stats['rps']:>8.2f}{stats['p50']:>8.3f}"
+                f"{stats['p95']:>8.3f}{stats['p99']:>8.3f}{stats['peak_rss_mb']:>9.1f}"
+            )
+    finally:
+        sampler.stop()
+        server.terminate()
+        server.wait()
+        llm_server.shutdown()
+        grpc_server.stop(0)
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    results["peak_rss_mb"] = max((stats["peak_rss_mb"] for stats in results["endpoints"].values()), default=0.0)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Behaviour of the app under a burst bigger than it can serve, with and without admission control.
+
+A burst of Aadhaar and income certificate uploads (and, with --bundles, some low priority bundles)
+is sent all at once, as when a district office batch-uploads. Clients give up after
+--client-timeout seconds. For each setting the report shows how many requests were answered,
+turned away with 503 or timed out, and how long the answered ones took:
+
+    python benchmarks/overload.py --burst 200 --deadline 10 --client-timeout 30
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import FakeDocumentAI, FakeOllama  # noqa: E402
+from load_test import ROOT, SAMPLES, free_port, make_bundle, percentile, start_server  # noqa: E402
+
+PATHS = {"aadhaar": "/process-aadhaar/", "income-cert": "/process-income-cert/"}
+
+
+async def burst(base_url: str, samples: Dict[str, bytes], bundle: bytes, count: int, bundles: int, timeout: float) -> dict:
+    uploads = [(PATHS[doc_type], path, samples[path]) for path, doc_type in SAMPLES.items() if doc_type in PATHS]
+    requests = [uploads[index % len(uploads)] for index in range(count)]
+    requests += [("/process-bundle/", "bundle.pdf", bundle)] * bundles
+    latencies: Dict[str, List[float]] = {"answered": [], "shed": [], "timed_out": []}
+    retry_after: List[int] = []
+
+    async def one(client: httpx.AsyncClient, path: str, name: str, content: bytes) -> None:
+        start = time.perf_counter()
+        try:
+            response = await client.post(path, files={"file": (name, content, "application/pdf")})
+        except httpx.TimeoutException:
+            outcome = "timed_out"
+        else:
+            outcome = "shed" if response.status_code == 503 else "answered"
+            if "Retry-After" in response.headers:
+                retry_after.append(int(response.headers["Retry-After"]))
+        latencies[outcome].append(time.perf_counter() - start)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=httpx.Limits(max_connections=None)) as client:
+        # One of each first, like a worker that has been serving for a while and has measured its endpoints
+        for path, name, content in set(requests):
+            await client.post(path, files={"file": (name, content, "application/pdf")})
+        started = time.perf_counter()
+        await asyncio.gather(*(one(client, *request) for request in requests))
+        elapsed = time.perf_counter() - started
+
+    answered = latencies["answered"]
+    return {
+        "seconds": elapsed,
+        **{outcome: len(values) for outcome, values in latencies.items()},
+        "p50": percentile(answered, 50),
+        "p95": percentile(answered, 95),
+        "max": max(answered, default=0.0),
+        "shed_after": statistics.median(latencies["shed"]) if latencies["shed"] else 0.0,
+        "retry_after": (min(retry_after), max(retry_after)) if retry_after else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--burst", type=int, default=200, help="single-document uploads sent at once")
+    parser.add_argument("--bundles", type=int, default=0, help="bundle uploads sent with them")
+    parser.add_argument("--concurrency", type=int, default=8, help="ADMISSION_MAX_CONCURRENCY when admission control is on")
+    parser.add_argument("--deadline", type=float, default=10, help="ADMISSION_DEADLINE_SECONDS")
+    parser.add_argument("--client-timeout", type=float, default=30)
+    parser.add_argument("--ocr-latency", type=float, default=1.0)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--llm-slots", type=int, default=2)
+    args = parser.parse_args()
+
+    samples = {}
+    for path in SAMPLES:
+        with open(os.path.join(ROOT, path), "rb") as f:
+            samples[path] = f.read()
+    bundle = make_bundle(list(samples.values()))
+
+    ocr_port, llm_port = free_port(), free_port()
+    grpc_server = FakeDocumentAI(args.ocr_latency, 0.0, 0.0, unique=True).serve(ocr_port)
+    llm_server = FakeOllama(args.llm_latency, 0.0, args.llm_slots).serve(llm_port)
+
+    print(f"{'admission':<11}{'answered':>9}{'503':>6}{'timeout':>8}{'p50':>8}{'p95':>8}{'max':>8}{'503 after':>10}{'Retry-After':>13}")
+    try:
+        for concurrency in (args.concurrency, 0):
+            data_dir = os.path.join(ROOT, ".data", f"overload-{os.getpid()}")
+            env = {
+                **os.environ,
+                "DOCUMENTAI_ENDPOINT": f"localhost:{ocr_port}",
+                "OLLAMA_HOST": f"http://localhost:{llm_port}",
+                "GRANTS_CACHE_DIR": os.path.join(data_dir, "cache"),
+                "GRANTS_DATA_DIR": data_dir,
+                "ADMISSION_MAX_CONCURRENCY": str(concurrency),
+                "ADMISSION_DEADLINE_SECONDS": str(args.deadline),
+                # Every request pays for OCR and generation, as distinct uploads from a batch would
+                "OCR_CACHE_MEMORY_BYTES": "0",
+                "OCR_CACHE_DISK_BYTES": "0",
+                "LLM_CACHE_MEMORY_BYTES": "0",
+                "LLM_CACHE_DISK_BYTES": "0",
+            }
+            port = free_port()
+            server = start_server(port, env)
+            try:
+                result = asyncio.run(burst(f"http://localhost:{port}", samples, bundle, args.burst, args.bundles, args.client_timeout))
+            finally:
+                server.terminate()
+                server.wait()
+                shutil.rmtree(data_dir, ignore_errors=True)
+            retry_after = "-" if result["retry_after"] is None else "{}-{}s".format(*result["retry_after"])
+            print(
+                f"{'on' if concurrency else 'off':<11}{result['answered']:>9}{result['shed']:>6}{result['timed_out']:>8}"
+                f"{result['p50']:>8.2f}{result['p95']:>8.2f}{result['max']:>8.2f}{result['shed_after']:>10.3f}{retry_after:>13}"
+            )
+    finally:
+        llm_server.shutdown()
+        grpc_server.stop(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Bytes saved by the pre-OCR PDF optimizer on the samples in Docs/, and what it does to OCR latency.
+
+Without --ocr only the optimizer runs. With --ocr each sample is also sent to Document AI (or the
+DOCUMENTAI_ENDPOINT stand-in) as uploaded and as optimized, bypassing the OCR cache:
+
+    python benchmarks/pdf_optimize.py --ocr --runs 3
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fake_services import DOCS_DIR  # noqa: E402
+from preprocess import PDF_JPEG_QUALITY, PDF_TARGET_DPI, optimize_pdf  # noqa: E402
+
+
+async def ocr_seconds(content: bytes, runs: int) -> List[float]:
+    from ocr import _process_request, pool
+    from pipeline import processor_name
+
+    seconds = []
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        await pool.process(_process_request(processor_name, content))
+        seconds.append(time.perf_counter() - started_at)
+    return seconds
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", help="PDFs to try, default the samples in Docs/")
+    parser.add_argument("--dpi", type=float, default=PDF_TARGET_DPI)
+    parser.add_argument("--quality", type=int, default=PDF_JPEG_QUALITY)
+    parser.add_argument("--ocr", action="store_true", help="also time Document AI on both versions")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(os.path.join(DOCS_DIR, name) for name in os.listdir(DOCS_DIR) if name.endswith(".pdf"))
+    header = f"{'':<20}{'bytes':>10}{'optimized':>11}{'saved':>7}{'ms':>7}  {'images':>6}{'recompressed':>13}{'blank':>6}"
+    print(header + (f"{'ocr s':>8}{'after':>8}" if args.ocr else ""))
+    for path in paths:
+        with open(path, "rb") as f:
+            content = f.read()
+        started_at = time.perf_counter()
+        optimized, stats = optimize_pdf(content, args.dpi, args.quality)
+        milliseconds = (time.perf_counter() - started_at) * 1000
+        line = (
+            f"{os.path.basename(path):<20}{len(content):>10}{len(optimized):>11}{1 - len(optimized) / len(content):>7.0%}"
+            f"{milliseconds:>7.0f}  {stats['images']:>6}{stats['images_recompressed']:>13}{stats['blank_pages']:>6}"
+        )
+        if args.ocr:
+            before = statistics.median(await ocr_seconds(content, args.runs))
+            after = statistics.median(await ocr_seconds(optimized, args.runs))
+            line += f"{before:>8.2f}{after:>8.2f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
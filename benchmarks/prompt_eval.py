@@ -0,0 +1,99 @@
+"""Prompt-evaluation time of llama3 extractions with and without the shared prompt prefix reused.
+
+For each sample in Docs/ the OCR text is sent with its document type's system prompt twice: once
+after a request with the same prefix, so ollama only evaluates the document text, and once with a
+unique first line, so nothing is reused. ollama reports the tokens it evaluated and the time taken.
+Needs a local ollama server with the model pulled; the text comes from Document AI, or with
+--sample-text from the canned OCR text in fake_services.py:
+
+    python benchmarks/prompt_eval.py --runs 3
+    python benchmarks/prompt_eval.py --sample-text --fake-prompt-rate 100
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import uuid
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from doctypes import DOC_TYPES, detect_type  # noqa: E402
+from fake_services import DOCS_DIR, SAMPLE_TEXT, FakeOllama  # noqa: E402
+from llm import LLM_KEEP_ALIVE, LLM_MODEL, messages  # noqa: E402
+
+
+async def ocr_texts(sample_text: bool) -> Dict[str, str]:
+    if sample_text:
+        return dict(SAMPLE_TEXT)
+
+    from ocr import process_document
+    from pipeline import processor_name
+
+    texts = {}
+    for name in sorted(os.listdir(DOCS_DIR)):
+        if name.endswith(".pdf"):
+            with open(os.path.join(DOCS_DIR, name), "rb") as f:
+                texts[name] = (await process_document(processor_name, f.read())).text
+    return texts
+
+
+async def prompt_eval(client, system: str, text: str) -> Tuple[int, float]:
+    # One token of output is enough: only the prompt is being measured
+    response = await client.chat(
+        model=LLM_MODEL, messages=messages(system, text), format="json", stream=False,
+        keep_alive=LLM_KEEP_ALIVE, options={"num_predict": 1},
+    )
+    return response.get("prompt_eval_count", 0), response.get("prompt_eval_duration", 0) / 1e9
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--sample-text", action="store_true", help="use the canned OCR text instead of Document AI")
+    parser.add_argument("--fake-prompt-rate", type=float, help="run against the fake ollama at this many prompt tokens per second")
+    args = parser.parse_args()
+
+    if args.fake_prompt_rate:
+        from load_test import free_port
+
+        port = free_port()
+        FakeOllama(latency=0.0, prompt_rate=args.fake_prompt_rate).serve(port)
+        os.environ["OLLAMA_HOST"] = f"http://localhost:{port}"
+
+    import ollama
+
+    client = ollama.AsyncClient()
+    await client.generate(model=LLM_MODEL, keep_alive=LLM_KEEP_ALIVE)
+
+    results: Dict[str, List[Tuple[int, float]]] = {"reused": [], "cold": []}
+    print(f"{'':<20}{'type':<32}{'reused tokens':>14}{'s':>8}{'cold tokens':>13}{'s':>8}")
+    for name, text in (await ocr_texts(args.sample_text)).items():
+        doc_type, _ = detect_type(text)
+        if doc_type is None:
+            print(f"{name:<20}unrecognized, skipped")
+            continue
+        system = DOC_TYPES[doc_type].prompt
+        reused, cold = [], []
+        for _ in range(args.runs):
+            # Another document of the same type first, as under steady traffic
+            await prompt_eval(client, system, "-")
+            reused.append(await prompt_eval(client, system, text))
+            cold.append(await prompt_eval(client, f"[request] {uuid.uuid4()}\n{system}", text))
+        results["reused"].extend(reused)
+        results["cold"].extend(cold)
+        print(
+            f"{name:<20}{doc_type:<32}{statistics.median(t for t, _ in reused):>14.0f}{statistics.median(s for _, s in reused):>8.3f}"
+            f"{statistics.median(t for t, _ in cold):>13.0f}{statistics.median(s for _, s in cold):>8.3f}"
+        )
+
+    if results["cold"]:
+        reused_seconds = statistics.median(s for _, s in results["reused"])
+        cold_seconds = statistics.median(s for _, s in results["cold"])
+        print(f"median prompt eval: {reused_seconds:.3f}s reused, {cold_seconds:.3f}s cold")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
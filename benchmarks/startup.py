@@ -0,0 +1,147 @@
+"""Cold-start cost of the app: how long importing main takes, and how long a fresh uvicorn worker
+takes to accept requests, to report ready, and to answer its first extraction.
+
+Document AI and ollama are the stand-ins from fake_services.py; --model-load is how long the fake
+ollama takes for the first generation, like llama3 being read into memory:
+
+    python benchmarks/startup.py --runs 5 --model-load 4
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import FakeDocumentAI, FakeOllama  # noqa: E402
+from load_test import ROOT, free_port  # noqa: E402
+
+IMPORT_SCRIPT = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+
+
+def import_seconds(env: dict) -> float:
+    output = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(env: dict, count: int = 10) -> List[tuple]:
+    """The modules main imports directly (or nearly), by cumulative import time."""
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in output.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2]
+        depth = (len(name) - len(name.lstrip())) // 2
+        if 1 <= depth <= 2:
+            rows.append((name.strip(), int(parts[1]) / 1e6))
+    return sorted(rows, key=lambda row: row[1], reverse=True)[:count]
+
+
+class ModelLoad(FakeOllama):
+    """The fake ollama, with a one-off delay on the first generation of each server."""
+
+    def __init__(self, load_seconds: float, **kwargs):
+        super().__init__(**kwargs)
+        self.load_seconds = load_seconds
+        self.loaded = False
+
+    def generate(self, body: dict) -> str:
+        if not self.loaded:
+            time.sleep(self.load_seconds)
+            self.loaded = True
+        return super().generate(body)
+
+
+def cold_start(env: dict, port: int, sample: bytes) -> Dict[str, float]:
+    started = time.monotonic()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "localhost", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    timings = {}
+    try:
+        while time.monotonic() - started < 120:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited with {server.returncode}")
+            try:
+                response = httpx.get(f"http://localhost:{port}/ready", timeout=1)
+            except httpx.HTTPError:
+                time.sleep(0.05)
+                continue
+            timings.setdefault("serving", time.monotonic() - started)
+            if response.status_code == 200:
+                timings["ready"] = time.monotonic() - started
+                timings["reported_import_and_startup"] = response.json()["serving_after_seconds"]
+                break
+            time.sleep(0.05)
+        else:
+            raise RuntimeError("Server was not ready within 120 seconds")
+
+        request_started = time.monotonic()
+        response = httpx.post(f"http://localhost:{port}/process-aadhaar/", files={"file": ("test.pdf", sample)}, timeout=120)
+        response.raise_for_status()
+        timings["first_request"] = time.monotonic() - request_started
+        return timings
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--model-load", type=float, default=2.0, help="seconds the fake ollama takes to load the model")
+    parser.add_argument("--ocr-latency", type=float, default=0.2)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT, "Docs", "test.pdf"), "rb") as f:
+        sample = f.read()
+
+    ocr_port = free_port()
+    # Held on to: a grpc.Server that is garbage collected stops serving
+    grpc_server = FakeDocumentAI(args.ocr_latency, 0.0).serve(ocr_port)
+    data_dir = os.path.join(ROOT, ".data", f"startup-{os.getpid()}")
+    env = {
+        **os.environ,
+        "DOCUMENTAI_ENDPOINT": f"localhost:{ocr_port}",
+        "GRANTS_CACHE_DIR": os.path.join(data_dir, "cache"),
+        "GRANTS_DATA_DIR": data_dir,
+        "OCR_CACHE_MEMORY_BYTES": "0",
+        "OCR_CACHE_DISK_BYTES": "0",
+        "LLM_CACHE_MEMORY_BYTES": "0",
+        "LLM_CACHE_DISK_BYTES": "0",
+    }
+
+    imports = [import_seconds(env) for _ in range(args.runs)]
+    print(f"import main: median {statistics.median(imports):.3f}s over {args.runs} runs")
+    for name, seconds in slowest_imports(env):
+        print(f"  {name:<40}{seconds:>8.3f}s")
+
+    runs = []
+    try:
+        for _ in range(args.runs):
+            # A fresh fake ollama per run, so every worker starts against an unloaded model
+            llm_port = free_port()
+            ModelLoad(args.model_load, latency=args.llm_latency).serve(llm_port)
+            runs.append(cold_start({**env, "OLLAMA_HOST": f"http://localhost:{llm_port}"}, free_port(), sample))
+    finally:
+        grpc_server.stop(None)
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(f"{'':<28}{'median':>8}{'max':>8}")
+    for key in runs[0]:
+        values = [run[key] for run in runs]
+        print(f"{key:<28}{statistics.median(values):>8.3f}{max(values):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
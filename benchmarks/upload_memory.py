@@ -0,0 +1,106 @@
+"""Peak RSS of one upload handled the old way (/tmp round trip) versus through read_upload.
+
+Each variant runs in a fresh interpreter so the numbers do not share allocator state. The run exits
+1 when the new path's peak grows by more than --max-ratio times the upload size (plus --slack-mb).
+read_upload holds about two copies of an upload and the old path three:
+
+    python benchmarks/upload_memory.py Docs/low.pdf --size-mb 15
+"""
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Imported before the baseline is taken, so only the request itself shows up in the delta
+from google.cloud import documentai_v1beta3 as documentai  # noqa: E402
+
+from uploads import read_upload  # noqa: E402
+
+
+def peak_rss_kb() -> int:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def make_upload(path: str, size_mb: float):
+    from starlette.datastructures import UploadFile
+
+    with open(path, "rb") as f:
+        content = f.read()
+    # Pad small samples up to the requested size, as a phone scan would be
+    target = int(size_mb * 1024 * 1024)
+    if len(content) < target:
+        content += b"\0" * (target - len(content))
+
+    # Starlette spools request bodies over 1 MB to disk in the same way
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spooled.write(content)
+    spooled.seek(0)
+    del content
+    return UploadFile(spooled, filename=os.path.basename(path))
+
+
+async def old_path(file) -> int:
+    file_path = f"/tmp/{file.filename}"
+    with open(file_path, "wb") as f:
+        f.write(await file.read())
+    with open(file_path, "rb") as f:
+        document_content = f.read()
+    request = documentai.RawDocument(content=document_content, mime_type="application/pdf")
+    os.remove(file_path)
+    return len(request.content)
+
+
+async def new_path(file) -> int:
+    upload = await read_upload(file, max_bytes=1024 * 1024 * 1024)
+    request = documentai.RawDocument(content=upload.content, mime_type="application/pdf")
+    return len(request.content)
+
+
+def run_variant(variant: str, path: str, size_mb: float) -> None:
+    file = make_upload(path, size_mb)
+    before = peak_rss_kb()
+    handler = old_path if variant == "old" else new_path
+    asyncio.run(handler(file))
+    print(peak_rss_kb() - before)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*", default=["Docs/low.pdf", "Docs/medium_aadhar.pdf", "Docs/strike.pdf", "Docs/test.pdf"])
+    parser.add_argument("--size-mb", type=float, default=15, help="pad each sample to this size")
+    parser.add_argument("--max-ratio", type=float, default=2.5, help="allowed new path peak per upload byte")
+    parser.add_argument("--slack-mb", type=float, default=1, help="allowed on top, for allocator noise")
+    parser.add_argument("--variant", choices=["old", "new"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.files[0], args.size_mb)
+        return
+
+    print(f"{'file':<28}{'size MB':>10}{'old peak KB':>14}{'new peak KB':>14}{'bound KB':>12}")
+    failed = []
+    for path in args.files:
+        size_mb = max(args.size_mb, os.path.getsize(path) / (1024 * 1024))
+        deltas = {}
+        for variant in ("old", "new"):
+            output = subprocess.run(
+                [sys.executable, __file__, path, "--size-mb", str(size_mb), "--variant", variant],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            deltas[variant] = int(output.split()[-1])
+        bound = int((args.max_ratio * size_mb + args.slack_mb) * 1024)
+        print(f"{os.path.basename(path):<28}{size_mb:>10.2f}{deltas['old']:>14}{deltas['new']:>14}{bound:>12}")
+        if deltas["new"] > bound:
+            failed.append(os.path.basename(path))
+    if failed:
+        sys.exit(f"FAIL peak RSS over the bound for {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# Directory holding the on-disk cache tiers
+CACHE_DIR = os.getenv("GRANTS_CACHE_DIR", ".cache")
+
+
+class MemoryLRU:
+    """Size-bounded in-memory LRU of byte values with a TTL."""
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, created_at = entry
+            if time.time() - created_at > self.ttl:
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: bytes, created_at: Optional[float] = None) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (value, created_at or time.time())
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _pop(self, key: str) -> None:
+        value, _ = self._entries.pop(key)
+        self.size -= len(value)
+
+
+class SQLiteCache:
+    """Persistent byte cache in a single SQLite file, evicted by total size (LRU) and TTL.
+
+    Entries carry a namespace so a whole group (one processor, one prompt template) can be
+    dropped at once.
+    """
+
+    def __init__(self, path: str, max_bytes: int, ttl: float):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_namespace ON entries (namespace)")
+        self.size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl:
+                self._delete(key)
+                return None
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            return value, created_at
+
+    def put(self, key: str, value: bytes, namespace: str = "") -> None:
+        if len(value) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            # One write transaction, so another process storing the same key in between cannot collide
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._delete(key)
+                self._conn.execute(
+                    "INSERT INTO entries (key, namespace, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, namespace, value, len(value), now, now),
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            self.size += len(value)
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._delete(key)
+
+    def invalidate_namespace(self, namespace: str) -> int:
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,)).rowcount
+            self.size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def _delete(self, key: str) -> None:
+        row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.size -= row[0]
+
+    def _evict(self) -> None:
+        # Drop expired entries first, then the least recently used until back under budget
+        self._conn.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl,))
+        self.size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        target = self.max_bytes * 0.9
+        if self.size <= target:
+            return
+        freed = 0
+        evict = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+            evict.append((key,))
+            freed += size
+            if self.size - freed <= target:
+                break
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", evict)
+        self.size -= freed
+
+
+class TieredCache:
+    """Memory LRU in front of a SQLite tier, with hit/miss counters."""
+
+    def __init__(self, path: str, memory_bytes: int, disk_bytes: int, ttl: float):
+        self.memory = MemoryLRU(memory_bytes, ttl)
+        self.disk = SQLiteCache(path, disk_bytes, ttl)
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.hits_memory += 1
+            return value
+        entry = self.disk.get(key)
+        if entry is not None:
+            self.hits_disk += 1
+            value, created_at = entry
+            # Promote so the next hit is served from memory, keeping the original age for the TTL
+            self.memory.put(key, value, created_at)
+            return value
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value: bytes, namespace: str = "") -> None:
+        self.memory.put(key, value)
+        self.disk.put(key, value, namespace)
+
+    def invalidate_namespace(self, namespace: str) -> int:
+        # The memory tier does not track namespaces, so it is simply emptied
+        self.memory.clear()
+        return self.disk.invalidate_namespace(namespace)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_ratio": (self.hits_memory + self.hits_disk) / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.size,
+            "disk_entries": len(self.disk),
+            "disk_bytes": self.disk.size,
+        }
@@ -1,254 +1,271 @@
 from fastapi import HTTPException
+from dataclasses import dataclass
+from datetime import date, datetime
 import re
-from typing import Dict
+from typing import Callable, Dict, List, Optional, Union
+
+import metrics
+
+# Field formats shared by the document schemas
+NAME = r'[A-Za-z\s\-]+'                  # alphabetic characters, spaces, and hyphens
+WORDS = r'[A-Za-z\s]+'                   # alphabetic characters and spaces
+DATE = r'\d{2}/\d{2}/\d{4}'              # dd/mm/yyyy
+AADHAAR = r'\d{4}\s?\d{4}\s?\d{4}'       # 12 digits with optional spaces
+MOBILE = r'\d{10}'                       # 10 digits
+CARD_NUMBER = r'[A-Za-z0-9\s\-]+'        # alphanumeric with optional spaces and hyphens
+INCOME = r'\d+(?:,\d{3})*'               # number with optional thousands separators
+NUMBER = r'\d+'
+ADDRESS = r'[A-Za-z0-9\s,]+'             # letters, numbers, spaces, and optional commas
+MEMBER_NAMES = r'[A-Za-z\s,]+'           # comma separated names
+
+# Verhoeff tables: multiplication in the dihedral group D5, and the position permutation
+_VERHOEFF_D = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
+    [1, 2, 3, 4, 0, 6, 7, 8, 9, 5],
+    [2, 3, 4, 0, 1, 7, 8, 9, 5, 6],
+    [3, 4, 0, 1, 2, 8, 9, 5, 6, 7],
+    [4, 0, 1, 2, 3, 9, 5, 6, 7, 8],
+    [5, 9, 8, 7, 6, 0, 4, 3, 2, 1],
+    [6, 5, 9, 8, 7, 1, 0, 4, 3, 2],
+    [7, 6, 5, 9, 8, 2, 1, 0, 4, 3],
+    [8, 7, 6, 5, 9, 3, 2, 1, 0, 4],
+    [9, 8, 7, 6, 5, 4, 3, 2, 1, 0],
+]
+_VERHOEFF_P = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
+    [1, 5, 7, 6, 2, 8, 3, 0, 9, 4],
+    [5, 8, 0, 3, 7, 9, 6, 1, 4, 2],
+    [8, 9, 1, 6, 0, 4, 3, 5, 2, 7],
+    [9, 4, 5, 3, 1, 2, 6, 8, 7, 0],
+    [4, 2, 8, 6, 5, 7, 3, 9, 0, 1],
+    [2, 7, 9, 3, 8, 0, 6, 4, 1, 5],
+    [7, 0, 4, 6, 9, 1, 3, 2, 5, 8],
+]
+
+
+def verhoeff_valid(number: str) -> bool:
+    """Whether the last digit of an Aadhaar number is its Verhoeff check digit."""
+    check = 0
+    for position, digit in enumerate(reversed(re.sub(r"\D", "", number))):
+        check = _VERHOEFF_D[check][_VERHOEFF_P[position % 8][int(digit)]]
+    return check == 0
+
+
+def real_date(value: str) -> bool:
+    """Whether a dd/mm/yyyy date exists on the calendar and is not in the future."""
+    try:
+        parsed = datetime.strptime(value, "%d/%m/%Y").date()
+    except ValueError:
+        return False
+    return date(1900, 1, 1) <= parsed <= date.today()
+
+
+# Checks run on values whose format already matches, for mistakes a pattern cannot catch
+FORMAT_CHECKS: Dict[str, Callable[[str], bool]] = {
+    AADHAAR: verhoeff_valid,
+    DATE: real_date,
+}
+
+
+@dataclass(frozen=True)
+class Field:
+    key: str
+    pattern: str
+    label: str
+    # Optional fields are only checked when present
+    required: bool = True
+    message: Optional[str] = None
+
+    @property
+    def error(self) -> str:
+        return self.message or f"Unrecognized entity: {self.label} is missing or invalid"
+
+
+def _clean(value) -> str:
+    return "" if value is None else str(value).strip()
+
+
+class Schema:
+    """Declarative per-document validation rules, compiled once at import."""
+
+    def __init__(self, name: str, fields: List[Field]):
+        self.name = name
+        self.fields = fields
+        self.patterns = {field.key: re.compile(field.pattern) for field in fields}
+        self.checks = {field.key: FORMAT_CHECKS.get(field.pattern, bool) for field in fields}
+
+    def is_valid(self, key: str, value) -> bool:
+        value = _clean(value)
+        return bool(self.patterns[key].fullmatch(value)) and self.checks[key](value)
+
+    def errors(self, record: Dict[str, str]) -> Dict[str, str]:
+        """Returns every failing field of one record mapped to its error message."""
+        errors = {}
+        for field in self.fields:
+            value = _clean(record.get(field.key))
+            if not value and not field.required:
+                continue
+            if not self.patterns[field.key].fullmatch(value) or not self.checks[field.key](value):
+                errors[field.key] = field.error
+        return errors
+
+    def validate(self, record: Dict[str, str]) -> None:
+        errors = self.errors(record)
+        if errors:
+            for key in errors:
+                metrics.VALIDATION_FAILURES.labels(self.name, key).inc()
+            raise HTTPException(status_code=422, detail=errors)
+
+    def validate_batch(self, records):
+        """Validates many records in one pass.
+
+        A list of dicts gives a list of error dicts (empty when the record is valid). A pandas
+        DataFrame is checked column-wise with vectorized ``str.fullmatch`` and gives a DataFrame
+        with one column per field holding the error message, or null where the value is valid.
+        """
+        if hasattr(records, "columns"):
+            return self._validate_frame(records)
+        return [self.errors(record) for record in records]
+
+    def _validate_frame(self, frame):
+        import pandas as pd
+
+        result = pd.DataFrame(index=frame.index)
+        for field in self.fields:
+            if field.key in frame.columns:
+                values = frame[field.key].fillna("").astype(str).str.strip()
+            else:
+                values = pd.Series("", index=frame.index)
+            valid = values.str.fullmatch(field.pattern).fillna(False).astype(bool)
+            if field.pattern in FORMAT_CHECKS:
+                valid &= values.map(FORMAT_CHECKS[field.pattern]).astype(bool)
+            if not field.required:
+                valid |= values.eq("")
+            result[field.key] = pd.Series(None, index=frame.index, dtype=object).where(valid, field.error)
+        return result
+
+
+AADHAAR_SCHEMA = Schema("aadhaar", [
+    Field("Name", NAME, "Name"),
+    Field("Aadhaar_number", AADHAAR, "Aadhaar number"),
+    Field("Date_of_birth", DATE, "Date of birth"),
+])
+
+# The messages /process-income-cert/ has always answered with, which clients match on
+NAME_FORMAT_MESSAGE = "Invalid name format. Only letters, spaces, and hyphens are allowed."
+
+INCOME_CERT_SCHEMA = Schema("income_cert", [
+    Field("Applicant Name", NAME, "Applicant Name", message=NAME_FORMAT_MESSAGE),
+    Field("Father_Husband_Name", NAME, "Father/Husband Name", message=NAME_FORMAT_MESSAGE),
+    Field("Date_of_birth", DATE, "Date of Birth", message="Invalid date format. Expected format is dd/mm/yyyy."),
+    Field("Adhaar_Number", AADHAAR, "Aadhaar Number",
+          message="Invalid Aadhaar number. It should be a 12-digit number with optional spaces."),
+    Field("Mobile_number", MOBILE, "Mobile Number", message="Invalid mobile number. It should be a 10-digit number."),
+    Field("Ration_card", CARD_NUMBER, "Ration Card Number",
+          message="Invalid ration card number. Only alphanumeric characters, spaces, and hyphens are allowed."),
+])
+
+COMMUNITY_OR_BIRTH_CERTIFICATE_SCHEMA = Schema("community_or_birth_certificate", [
+    Field("Name", NAME, "Name"),
+    Field("Father_Husband_Name", NAME, "Father/Husband Name"),
+    Field("Date_of_birth", DATE, "Date of Birth"),
+    Field("Mobile_number", MOBILE, "Mobile Number"),
+    Field("Caste", NAME, "Caste"),
+    Field("Aadhaar_Number", AADHAAR, "Aadhaar Number"),
+])
+
+CARD_SCHEMA = Schema("card", [
+    Field("Name", NAME, "Name"),
+    Field("Date_of_birth", DATE, "Date of Birth"),
+    Field("Card_No", CARD_NUMBER, "Card Number"),
+])
+
+RATION_CARD_SCHEMA = Schema("ration_card", CARD_SCHEMA.fields + [
+    Field("Member_Name(s)", MEMBER_NAMES, "Member Names", required=False,
+          message="Unrecognized entity: Member Names are invalid or formatted incorrectly"),
+])
+
+EBC_CERTIFICATE_SCHEMA = Schema("ebc_certificate", [
+    Field("Name", NAME, "Name"),
+    Field("Father_Husband_Name", NAME, "Father/Husband Name"),
+    Field("Date_of_birth", DATE, "Date of Birth"),
+    Field("Mobile_No", MOBILE, "Mobile Number"),
+    Field("Caste", WORDS, "Caste"),
+    Field("Aadhar_Card_No", AADHAAR, "Aadhaar Card Number"),
+    Field("Annual_Income", INCOME, "Annual Income"),
+])
+
+EWS_CERTIFICATE_SCHEMA = Schema("ews_certificate", EBC_CERTIFICATE_SCHEMA.fields)
+
+OBC_CERTIFICATE_SCHEMA = Schema("obc_certificate", [
+    Field("Name", NAME, "Name"),
+    Field("Father_Husband_Name", NAME, "Father/Husband Name"),
+    Field("Date_of_birth", DATE, "Date of Birth"),
+    Field("Mobile_No", MOBILE, "Mobile Number"),
+    Field("Caste_Subcaste", WORDS, "Caste/Subcaste"),
+    Field("Aadhar_Card_No", AADHAAR, "Aadhaar Card Number"),
+])
+
+RESIDENCE_CERTIFICATE_SCHEMA = Schema("residence_certificate", [
+    Field("Name", NAME, "Name"),
+    Field("Father_Husband_Name", NAME, "Father/Husband Name"),
+    Field("Mandal_Name", WORDS, "Mandal Name"),
+    Field("Village_Name", WORDS, "Village Name"),
+    Field("House_Number", CARD_NUMBER, "House Number"),
+    Field("No_of_years", NUMBER, "Number of Years"),
+    Field("Address", ADDRESS, "Address"),
+])
+
+SCHEMAS = {
+    schema.name: schema
+    for schema in [
+        AADHAAR_SCHEMA,
+        INCOME_CERT_SCHEMA,
+        COMMUNITY_OR_BIRTH_CERTIFICATE_SCHEMA,
+        CARD_SCHEMA,
+        RATION_CARD_SCHEMA,
+        EBC_CERTIFICATE_SCHEMA,
+        EWS_CERTIFICATE_SCHEMA,
+        OBC_CERTIFICATE_SCHEMA,
+        RESIDENCE_CERTIFICATE_SCHEMA,
+    ]
+}
 
 
 def validate_aadhaar_info(aadhaar_info: dict) -> None:
-    name = aadhaar_info.get("Name", "").strip()
-    aadhaar_number = aadhaar_info.get("Aadhaar_number", "").strip()
-    dob = aadhaar_info.get("Date_of_birth", "").strip()
-
-    # Check Name (ensure it's a valid name with alphabetic characters, spaces, and hyphens)
-    if not re.match(r'^[A-Za-z\s\-]+$', name):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Name is missing or invalid")
-    
-    # Check Aadhaar Number (ensure it matches the 12-digit format with optional spaces)
-    if not re.match(r'^\d{4}\s?\d{4}\s?\d{4}$', aadhaar_number):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Aadhaar number is missing or invalid")
-    
-    # Check Date of Birth (ensure it matches the dd/mm/yyyy format)
-    if not re.match(r'^\d{2}/\d{2}/\d{4}$', dob):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Date of birth is missing or invalid")
+    AADHAAR_SCHEMA.validate(aadhaar_info)
 
 
 def validate_income_cert_applicant_form(applicant_data: Dict[str, str]) -> None:
-    applicant_name = applicant_data.get("Applicant Name", "").strip()
-    father_husband_name = applicant_data.get("Father_Husband_Name", "").strip()
-    dob = applicant_data.get("Date_of_birth", "").strip()
-    aadhaar_number = applicant_data.get("Adhaar_Number", "").strip()
-    mobile_number = applicant_data.get("Mobile_number", "").strip()
-    ration_card = applicant_data.get("Ration_card", "").strip()
-
-    # Check Applicant Name (ensure it's a valid name with alphabetic characters, spaces, and hyphens)
-    if not re.match(r'^[A-Za-z\s\-]+$', applicant_name):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Applicant Name is missing or invalid")
-    
-    # Check Father/Husband Name (ensure it's a valid name with alphabetic characters, spaces, and hyphens)
-    if not re.match(r'^[A-Za-z\s\-]+$', father_husband_name):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Father/Husband Name is missing or invalid")
-    
-    # Check Date of Birth (ensure it matches the dd/mm/yyyy format)
-    if not re.match(r'^\d{2}/\d{2}/\d{4}$', dob):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Date of Birth is missing or invalid")
-    
-    # Check Aadhaar Number (ensure it matches the 12-digit format with optional spaces)
-    if not re.match(r'^\d{4}\s?\d{4}\s?\d{4}$', aadhaar_number):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Aadhaar Number is missing or invalid")
-    
-    # Check Mobile Number (ensure it matches the 10-digit format)
-    if not re.match(r'^\d{10}$', mobile_number):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Mobile Number is missing or invalid")
-    
-    # Check Ration Card Number (ensure it's a valid alphanumeric string with optional spaces and hyphens)
-    if not re.match(r'^[A-Za-z0-9\s\-]+$', ration_card):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Ration Card Number is missing or invalid")
+    INCOME_CERT_SCHEMA.validate(applicant_data)
 
 
 def validate_community_or_birth_certificate_form(birth_certificate_data: Dict[str, str]) -> None:
-    name = birth_certificate_data.get("Name", "").strip()
-    father_husband_name = birth_certificate_data.get("Father_Husband_Name", "").strip()
-    dob = birth_certificate_data.get("Date_of_birth", "").strip()
-    mobile_number = birth_certificate_data.get("Mobile_number", "").strip()
-    caste = birth_certificate_data.get("Caste", "").strip()
-    aadhaar_number = birth_certificate_data.get("Aadhaar_Number", "").strip()
-
-    # Check Name (ensure it's a valid name with alphabetic characters, spaces, and hyphens)
-    if not re.match(r'^[A-Za-z\s\-]+$', name):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Name is missing or invalid")
-    
-    # Check Father/Husband Name (ensure it's a valid name with alphabetic characters, spaces, and hyphens)
-    if not re.match(r'^[A-Za-z\s\-]+$', father_husband_name):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Father/Husband Name is missing or invalid")
-    
-    # Check Date of Birth (ensure it matches the dd/mm/yyyy format)
-    if not re.match(r'^\d{2}/\d{2}/\d{4}$', dob):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Date of Birth is missing or invalid")
-    
-    # Check Mobile Number (ensure it matches the 10-digit format)
-    if not re.match(r'^\d{10}$', mobile_number):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Mobile Number is missing or invalid")
-    
-    # Check Caste (ensure it's a valid string with alphabetic characters, spaces, and hyphens)
-    if not re.match(r'^[A-Za-z\s\-]+$', caste):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Caste is missing or invalid")
-    
-    # Check Aadhaar Number (ensure it matches the 12-digit format with optional spaces)
-    if not re.match(r'^\d{4}\s?\d{4}\s?\d{4}$', aadhaar_number):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Aadhaar Number is missing or invalid")
-    
+    COMMUNITY_OR_BIRTH_CERTIFICATE_SCHEMA.validate(birth_certificate_data)
+
+
 def validate_aadhar_ration_EPIC_card_info(card_data: Dict[str, str], document_type: str) -> None:
-    name = card_data.get("Name", "").strip()
-    dob = card_data.get("Date_of_birth", "").strip()
-    card_no = card_data.get("Card_No", "").strip()
-    member_names = card_data.get("Member_Name(s)", "").strip()  # Relevant for Ration Card
-
-    # Check Name (ensure it's a valid name with alphabetic characters, spaces, and hyphens)
-    if not re.match(r'^[A-Za-z\s\-]+$', name):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Name is missing or invalid")
-    
-    # Check Date of Birth (ensure it matches the dd/mm/yyyy format)
-    if not re.match(r'^\d{2}/\d{2}/\d{4}$', dob):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Date of Birth is missing or invalid")
-    
-    # Check Card Number (ensure it matches a generic card number format)
-    if not re.match(r'^[A-Za-z0-9\s\-]+$', card_no):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Card Number is missing or invalid")
-
-    # Check Member Names (only applicable for Ration Card; ensure it's a valid string with alphabetic characters and spaces)
-    if document_type == 'ration_card' and member_names and not re.match(r'^[A-Za-z\s,]+$', member_names):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Member Names are invalid or formatted incorrectly")
+    # Member names are only relevant for a ration card
+    schema = RATION_CARD_SCHEMA if document_type == 'ration_card' else CARD_SCHEMA
+    schema.validate(card_data)
+
 
 def validate_ebc_certificate_info(ebc_data: Dict[str, str]) -> None:
-    name = ebc_data.get("Name", "").strip()
-    father_husband_name = ebc_data.get("Father_Husband_Name", "").strip()
-    dob = ebc_data.get("Date_of_birth", "").strip()
-    mobile_no = ebc_data.get("Mobile_No", "").strip()
-    caste = ebc_data.get("Caste", "").strip()
-    aadhaar_no = ebc_data.get("Aadhar_Card_No", "").strip()
-    annual_income = ebc_data.get("Annual_Income", "").strip()
-
-    # Check Name (ensure it's a valid name with alphabetic characters, spaces, and hyphens)
-    if not re.match(r'^[A-Za-z\s\-]+$', name):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Name is missing or invalid")
-    
-    # Check Father/Husband Name (ensure it's a valid name with alphabetic characters, spaces, and hyphens)
-    if not re.match(r'^[A-Za-z\s\-]+$', father_husband_name):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Father/Husband Name is missing or invalid")
-    
-    # Check Date of Birth (ensure it matches the dd/mm/yyyy format)
-    if not re.match(r'^\d{2}/\d{2}/\d{4}$', dob):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Date of Birth is missing or invalid")
-    
-    # Check Mobile Number (ensure it matches a 10-digit number)
-    if not re.match(r'^\d{10}$', mobile_no):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Mobile Number is missing or invalid")
-    
-    # Check Caste (ensure it's a valid string with alphabetic characters and spaces)
-    if not re.match(r'^[A-Za-z\s]+$', caste):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Caste is missing or invalid")
-    
-    # Check Aadhaar Number (ensure it matches the 12-digit format with optional spaces)
-    if not re.match(r'^\d{4}\s?\d{4}\s?\d{4}$', aadhaar_no):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Aadhaar Card Number is missing or invalid")
-    
-    # Check Annual Income (ensure it's a valid numerical value, optionally with commas)
-    if not re.match(r'^\d+(?:,\d{3})*$|^\d+$', annual_income):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Annual Income is missing or invalid")
+    EBC_CERTIFICATE_SCHEMA.validate(ebc_data)
 
 
 def validate_ews_applicant_form(ews_data: Dict[str, str]) -> None:
-    name = ews_data.get("Name", "").strip()
-    father_husband_name = ews_data.get("Father_Husband_Name", "").strip()
-    dob = ews_data.get("Date_of_birth", "").strip()
-    mobile_no = ews_data.get("Mobile_No", "").strip()
-    caste = ews_data.get("Caste", "").strip()
-    aadhar_card_no = ews_data.get("Aadhar_Card_No", "").strip()
-    annual_income = ews_data.get("Annual_Income", "").strip()
-
-    # Check Name (ensure it's a valid name with alphabetic characters, spaces, and hyphens)
-    if not re.match(r'^[A-Za-z\s\-]+$', name):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Name is missing or invalid")
-
-    # Check Father/Husband Name (ensure it's a valid name with alphabetic characters, spaces, and hyphens)
-    if not re.match(r'^[A-Za-z\s\-]+$', father_husband_name):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Father/Husband Name is missing or invalid")
-
-    # Check Date of Birth (ensure it matches the dd/mm/yyyy format)
-    if not re.match(r'^\d{2}/\d{2}/\d{4}$', dob):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Date of Birth is missing or invalid")
-
-    # Check Mobile Number (ensure it's a 10-digit number)
-    if not re.match(r'^\d{10}$', mobile_no):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Mobile Number is missing or invalid")
-
-    # Check Caste (ensure it's a valid string with alphabetic characters and spaces)
-    if not re.match(r'^[A-Za-z\s]+$', caste):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Caste is missing or invalid")
-
-    # Check Aadhaar Card Number (ensure it matches the 12-digit format with optional spaces)
-    if not re.match(r'^\d{4}\s?\d{4}\s?\d{4}$', aadhar_card_no):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Aadhaar Card Number is missing or invalid")
-
-    # Check Annual Income (ensure it matches a number with optional thousands separators)
-    if not re.match(r'^\d+(?:,\d{3})*$|^\d+$', annual_income):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Annual Income is missing or invalid")
-    
+    EWS_CERTIFICATE_SCHEMA.validate(ews_data)
+
+
 def validate_obc_applicant_form(obc_data: Dict[str, str]) -> None:
-    name = obc_data.get("Name", "").strip()
-    father_husband_name = obc_data.get("Father_Husband_Name", "").strip()
-    dob = obc_data.get("Date_of_birth", "").strip()
-    mobile_no = obc_data.get("Mobile_No", "").strip()
-    caste_subcaste = obc_data.get("Caste_Subcaste", "").strip()
-    aadhar_card_no = obc_data.get("Aadhar_Card_No", "").strip()
-
-    # Check Name (ensure it's a valid name with alphabetic characters, spaces, and hyphens)
-    if not re.match(r'^[A-Za-z\s\-]+$', name):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Name is missing or invalid")
-
-    # Check Father/Husband Name (ensure it's a valid name with alphabetic characters, spaces, and hyphens)
-    if not re.match(r'^[A-Za-z\s\-]+$', father_husband_name):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Father/Husband Name is missing or invalid")
-
-    # Check Date of Birth (ensure it matches the dd/mm/yyyy format)
-    if not re.match(r'^\d{2}/\d{2}/\d{4}$', dob):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Date of Birth is missing or invalid")
-
-    # Check Mobile Number (ensure it's a 10-digit number)
-    if not re.match(r'^\d{10}$', mobile_no):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Mobile Number is missing or invalid")
-
-    # Check Caste/Subcaste (ensure it contains alphabetic characters and spaces)
-    if not re.match(r'^[A-Za-z\s]+$', caste_subcaste):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Caste/Subcaste is missing or invalid")
-
-    # Check Aadhaar Card Number (ensure it matches the 12-digit format with optional spaces)
-    if not re.match(r'^\d{4}\s?\d{4}\s?\d{4}$', aadhar_card_no):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Aadhaar Card Number is missing or invalid")
-    
+    OBC_CERTIFICATE_SCHEMA.validate(obc_data)
+
 
 def validate_residence_certificate_form(residence_data: Dict[str, str]) -> None:
-    name = residence_data.get("Name", "").strip()
-    father_husband_name = residence_data.get("Father_Husband_Name", "").strip()
-    mandal_name = residence_data.get("Mandal_Name", "").strip()
-    village_name = residence_data.get("Village_Name", "").strip()
-    house_number = residence_data.get("House_Number", "").strip()
-    no_of_years = residence_data.get("No_of_years", "").strip()
-    address = residence_data.get("Address", "").strip()
-
-    # Check Name (ensure it's a valid name with alphabetic characters, spaces, and hyphens)
-    if not re.match(r'^[A-Za-z\s\-]+$', name):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Name is missing or invalid")
-
-    # Check Father/Husband Name (ensure it's a valid name with alphabetic characters, spaces, and hyphens)
-    if not re.match(r'^[A-Za-z\s\-]+$', father_husband_name):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Father/Husband Name is missing or invalid")
-
-    # Check Mandal Name (ensure it's a valid string with alphabetic characters and spaces)
-    if not re.match(r'^[A-Za-z\s]+$', mandal_name):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Mandal Name is missing or invalid")
-
-    # Check Village Name (ensure it's a valid string with alphabetic characters and spaces)
-    if not re.match(r'^[A-Za-z\s]+$', village_name):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Village Name is missing or invalid")
-
-    # Check House Number (ensure it's alphanumeric with optional spaces and hyphens)
-    if not re.match(r'^[A-Za-z0-9\s\-]+$', house_number):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: House Number is missing or invalid")
-
-    # Check No of Years (ensure it's a numeric value)
-    if not re.match(r'^\d+$', no_of_years):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Number of Years is missing or invalid")
-
-    # Check Address (ensure it's a valid address with alphabetic characters, numbers, spaces, and optional commas)
-    if not re.match(r'^[A-Za-z0-9\s,]+$', address):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Address is missing or invalid")
\ No newline at end of file
+    RESIDENCE_CERTIFICATE_SCHEMA.validate(residence_data)
+
+
+def validate_batch(schema_name: str, records: Union[List[Dict[str, str]], "pandas.DataFrame"]):
+    """Re-validates a batch of historical records against the named schema."""
+    return SCHEMAS[schema_name].validate_batch(records)
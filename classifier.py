@@ -0,0 +1,148 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Below this score the text is not recognisably any supported document
+CLASSIFIER_MIN_SCORE = float(os.getenv("CLASSIFIER_MIN_SCORE", "2"))
+# Types scoring within this fraction of the best are treated as candidates for tie-breaking
+CLASSIFIER_AMBIGUITY = float(os.getenv("CLASSIFIER_AMBIGUITY", "0.75"))
+# Lines at the top of the first page that hold the card or form title
+TITLE_LINES = 8
+# A page in a bundle must score this much to start a new document rather than continue the last one
+BUNDLE_MIN_PAGE_SCORE = float(os.getenv("BUNDLE_MIN_PAGE_SCORE", "4"))
+
+# Weighted phrases that identify each type in checks.SCHEMAS; matched on word boundaries, case-insensitively
+KEYWORDS = {
+    "aadhaar": {
+        "unique identification authority": 3, "aadhaar": 1.5, "aadhar": 1.5, "vid": 1,
+        "government of india": 1, "enrolment no": 2, "dob": 0.5, "male": 0.5, "female": 0.5,
+    },
+    "income_cert": {
+        "income certificate": 4, "annual income": 1.5, "income": 1, "ration card": 0.5, "applicant": 0.5,
+    },
+    "community_or_birth_certificate": {
+        "community and date of birth": 4, "date of birth certificate": 3, "community certificate": 3,
+        "form-ii": 2, "scheduled castes": 1.5, "scheduled tribes": 1.5, "community": 1,
+    },
+    "card": {
+        "election commission": 3, "elector photo identity": 3, "elector": 2, "epic": 2, "identity card": 1.5,
+    },
+    "ration_card": {
+        "ration card": 2, "civil supplies": 2, "food security": 2, "fair price shop": 2,
+        "family members": 1.5, "head of the family": 1,
+    },
+    "ebc_certificate": {
+        "economically backward class": 4, "economically backward classes": 4, "ebc": 3,
+    },
+    "ews_certificate": {
+        "economically weaker section": 4, "economically weaker sections": 4, "ews": 3,
+    },
+    "obc_certificate": {
+        "other backward classes": 3, "other backward class": 3, "obc": 2, "backward classes": 1, "sub-caste": 1,
+    },
+    "residence_certificate": {
+        "residence certificate": 4, "residential certificate": 4, "domicile": 2, "residence": 1.5,
+        "residing": 1, "no. of years": 1.5, "mandal": 0.5, "village": 0.5,
+    },
+}
+
+# Wallet cards: one or two pages and few labelled lines, unlike the application forms
+CARD_TYPES = {"aadhaar", "card", "ration_card"}
+CARD_MAX_PAGES = 2
+FORM_MIN_LABEL_LINES = 5
+
+_KEYWORD_PATTERNS = {
+    doc_type: [(re.compile(r"(?<!\w)" + re.escape(phrase) + r"(?!\w)", re.IGNORECASE), weight) for phrase, weight in keywords.items()]
+    for doc_type, keywords in KEYWORDS.items()
+}
+label_line_pattern = re.compile(r"^\s*(?:\d+[.)]\s*)?[A-Za-z][A-Za-z'/ .]{1,40}\s*:", re.MULTILINE)
+aadhaar_number_pattern = re.compile(r"(?<!\d)\d{4} \d{4} \d{4}(?! ?\d)")
+
+
+@dataclass
+class Classification:
+    doc_type: str
+    confidence: float
+    scores: Dict[str, float]
+    # Types close enough to the best that the regex tier should break the tie
+    candidates: List[str]
+
+    @property
+    def recognized(self) -> bool:
+        return self.scores.get(self.doc_type, 0.0) >= CLASSIFIER_MIN_SCORE
+
+
+def classify(text: str, page_count: int = 1) -> Classification:
+    """Scores the OCR text against every document type from keywords and page layout alone.
+
+    Keywords in the title lines count double. Multi-page documents and text with many
+    ``Label:`` lines are penalised as wallet cards, and a card with a printed Aadhaar number
+    gets a bonus as an Aadhaar card.
+    """
+    title = "\n".join([line for line in text.splitlines() if line.strip()][:TITLE_LINES])
+    label_lines = len(label_line_pattern.findall(text))
+    is_form = page_count > CARD_MAX_PAGES or label_lines >= FORM_MIN_LABEL_LINES
+
+    scores = {}
+    for doc_type, patterns in _KEYWORD_PATTERNS.items():
+        score = 0.0
+        for pattern, weight in patterns:
+            if pattern.search(title):
+                score += 2 * weight
+            elif pattern.search(text):
+                score += weight
+        if doc_type in CARD_TYPES and is_form:
+            score *= 0.5
+        scores[doc_type] = score
+
+    if not is_form and aadhaar_number_pattern.search(text):
+        scores["aadhaar"] += 2
+
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    best = ranked[0]
+    total = sum(scores.values())
+    candidates = [doc_type for doc_type in ranked if scores[doc_type] > 0 and scores[doc_type] >= scores[best] * CLASSIFIER_AMBIGUITY]
+    return Classification(
+        doc_type=best,
+        confidence=scores[best] / total if total else 0.0,
+        scores=scores,
+        candidates=candidates or [best],
+    )
+
+
+@dataclass
+class Segment:
+    """A run of pages in a bundle that make up one document; pages are 1-based and inclusive."""
+
+    doc_type: Optional[str]
+    first_page: int
+    last_page: int
+    texts: List[str]
+    confidence: float = 0.0
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.texts)
+
+
+def segment_pages(texts: List[str]) -> List[Segment]:
+    """Splits a bundle's page texts into documents using page-level classification.
+
+    A page whose best type scores at least ``BUNDLE_MIN_PAGE_SCORE`` and differs from the open
+    document starts a new one; weaker pages (backs of cards, later form pages) continue it.
+    Leading pages that match nothing form a segment with no type.
+    """
+    segments: List[Segment] = []
+    for number, text in enumerate(texts, start=1):
+        page = classify(text, 1)
+        starts = page.scores[page.doc_type] >= BUNDLE_MIN_PAGE_SCORE
+        current = segments[-1] if segments else None
+        if current is not None and (not starts or page.doc_type == current.doc_type):
+            current.last_page = number
+            current.texts.append(text)
+        elif starts:
+            segments.append(Segment(page.doc_type, number, number, [text], page.confidence))
+        else:
+            segments.append(Segment(None, number, number, [text]))
+    return segments
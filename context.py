@@ -0,0 +1,198 @@
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from layout import Chunk
+
+# Upper bound on the estimated tokens of OCR text pasted into an extraction prompt
+LLM_CONTEXT_TOKEN_BUDGET = int(os.getenv("LLM_CONTEXT_TOKEN_BUDGET", "400"))
+# Smaller budget for the excerpt sent when re-asking for fields that failed validation
+LLM_REPAIR_TOKEN_BUDGET = int(os.getenv("LLM_REPAIR_TOKEN_BUDGET", "120"))
+# Paragraph chunks larger than this are scored line by line instead
+MAX_CHUNK_TOKENS = 48
+
+# Words that sit next to the values each document's fields are read from
+FIELD_KEYWORDS = {
+    "aadhaar": [
+        "dob", "date of birth", "year of birth", "birth", "male", "female",
+        "aadhaar", "aadhar", "vid", "name", "s/o", "d/o", "w/o", "c/o",
+    ],
+    "income_cert": [
+        "applicant", "name", "father", "husband", "guardian", "dob", "date of birth", "birth",
+        "aadhaar", "aadhar", "adhaar", "mobile", "phone", "cell", "ration", "card", "income",
+    ],
+    "community_or_birth_certificate": [
+        "name", "father", "husband", "dob", "date of birth", "birth", "mobile", "cell",
+        "caste", "community", "aadhaar", "aadhar",
+    ],
+    "card": ["name", "elector", "dob", "date of birth", "birth", "epic", "card", "number"],
+    "ration_card": [
+        "name", "head of the family", "dob", "date of birth", "birth", "card", "number",
+        "member", "family", "relation",
+    ],
+    "ebc_certificate": [
+        "name", "father", "husband", "dob", "date of birth", "birth", "mobile", "cell",
+        "caste", "aadhaar", "aadhar", "income", "annual",
+    ],
+    "ews_certificate": [
+        "name", "father", "husband", "dob", "date of birth", "birth", "mobile", "cell",
+        "caste", "aadhaar", "aadhar", "income", "annual",
+    ],
+    "obc_certificate": [
+        "name", "father", "husband", "dob", "date of birth", "birth", "mobile", "cell",
+        "caste", "sub-caste", "subcaste", "aadhaar", "aadhar",
+    ],
+    "residence_certificate": [
+        "name", "father", "husband", "mandal", "village", "house", "door", "years",
+        "residing", "address",
+    ],
+}
+
+# Shapes of the values themselves: dates, Aadhaar numbers, mobile numbers
+DATE_VALUE = re.compile(r"\d{2}[/\-.]\d{2}[/\-.]\d{4}")
+AADHAAR_VALUE = re.compile(r"\d{4}\s?\d{4}\s?\d{4}")
+MOBILE_VALUE = re.compile(r"(?<!\d)\d{10}(?!\d)")
+VALUE_PATTERNS = [DATE_VALUE, AADHAAR_VALUE, MOBILE_VALUE]
+
+# Words next to one field's value and the value's shape, matched on the lowercased field key in this order
+FIELD_HINTS = [
+    (("aadhaar", "adhaar", "aadhar"), ["aadhaar", "aadhar", "adhaar", "uid"], AADHAAR_VALUE),
+    (("date", "birth"), ["dob", "date of birth", "birth", "born"], DATE_VALUE),
+    (("mobile", "phone"), ["mobile", "phone", "cell"], MOBILE_VALUE),
+    (("father", "husband"), ["father", "husband", "s/o", "d/o", "w/o", "guardian"], None),
+    (("income",), ["income", "annual"], None),
+    (("ration",), ["ration", "card"], None),
+    (("card",), ["card", "epic", "number"], None),
+    (("caste",), ["caste", "community", "sub-caste", "subcaste"], None),
+    (("member",), ["member", "family", "relation"], None),
+    (("mandal",), ["mandal"], None),
+    (("village",), ["village"], None),
+    (("house",), ["house", "door"], None),
+    (("years",), ["years", "residing"], None),
+    (("address",), ["address", "street", "village"], None),
+    (("name",), ["name", "applicant"], None),
+]
+
+# Lines that appear on every card or form and never carry a field value
+BOILERPLATE = [
+    "government of india",
+    "unique identification authority of india",
+    "download date",
+    "issue date",
+    "help@uidai.gov.in",
+    "www.uidai.gov.in",
+    "aadhaar is proof of identity",
+    "signature",
+]
+
+LATIN = re.compile(r"[A-Za-z0-9]")
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four UTF-8 bytes per llama3 token for English, closer to one per character for Telugu
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+def split_chunks(text: str) -> List[str]:
+    """Blank-line separated paragraphs, with oversized ones broken into lines."""
+    chunks = []
+    for paragraph in text.split("\n\n"):
+        if estimate_tokens(paragraph) > MAX_CHUNK_TOKENS:
+            chunks.extend(line for line in paragraph.split("\n") if line.strip())
+        elif paragraph.strip():
+            chunks.append(paragraph)
+    return chunks
+
+
+def is_noise(line: str) -> bool:
+    # Lines with no Latin letters or digits are the Telugu duplicates of English lines
+    lowered = line.lower()
+    return not LATIN.search(line) or any(phrase in lowered for phrase in BOILERPLATE)
+
+
+def strip_noise(chunk: str) -> str:
+    """The chunk without its noise lines: a boilerplate line such as "Government of India" must not
+    take the name and DOB printed in the same paragraph down with it.
+    """
+    return "\n".join(line for line in chunk.split("\n") if line.strip() and not is_noise(line))
+
+
+def score_chunk(chunk: str, keywords: List[str], patterns: List[re.Pattern] = VALUE_PATTERNS) -> float:
+    if is_noise(chunk):
+        return 0.0
+    lowered = chunk.lower()
+    score = sum(1.0 for keyword in keywords if keyword in lowered)
+    score += sum(2.0 for pattern in patterns if pattern.search(chunk))
+    return score
+
+
+def field_hints(fields: Iterable[str]) -> Tuple[List[str], List[re.Pattern]]:
+    """Keywords and value shapes for particular fields rather than a whole document type."""
+    keywords, patterns = [], []
+    for field in fields:
+        lowered = field.lower()
+        for keys, words, pattern in FIELD_HINTS:
+            if any(key in lowered for key in keys):
+                keywords.extend(words)
+                if pattern is not None:
+                    patterns.append(pattern)
+                break
+    return list(dict.fromkeys(keywords)), list(dict.fromkeys(patterns))
+
+
+def select_context(
+    text: str,
+    doc_type: str,
+    token_budget: int = LLM_CONTEXT_TOKEN_BUDGET,
+    hints: Optional[Tuple[List[str], List[re.Pattern]]] = None,
+    layout: Optional[Sequence[Chunk]] = None,
+) -> Tuple[str, Dict[str, int]]:
+    """Keeps the chunks most relevant to the document's fields within ``token_budget``.
+
+    ``hints`` (from ``field_hints``) narrows the ranking to particular fields instead of the
+    whole document type. ``layout`` gives the paragraphs of ``text`` from Document AI's layout
+    (see ``layout.layout_chunks``); without it the text is split on blank lines, which scans
+    rarely have.
+
+    Chunks are ranked by keyword and value-shape hits. Labels and values are often split across
+    neighbouring lines (the card name sits just above the DOB), so each chunk also gets half the
+    score of the chunks on either side. Repeated chunks are kept once, in their original order.
+    Text already within budget is returned as is.
+    """
+    tokens_before = estimate_tokens(text)
+    if tokens_before <= token_budget:
+        return text, {"tokens_before": tokens_before, "tokens_after": tokens_before, "tokens_saved": 0}
+
+    if layout:
+        pieces = [piece for chunk in layout for piece in split_chunks(chunk.text(text).strip())]
+    else:
+        pieces = split_chunks(text)
+    # Noise is dropped line by line; a chunk left with nothing is dropped altogether
+    chunks = [chunk for chunk in map(strip_noise, pieces) if chunk]
+    keywords, patterns = hints or (FIELD_KEYWORDS[doc_type], VALUE_PATTERNS)
+    own = [score_chunk(chunk, keywords, patterns) for chunk in chunks]
+    scores = [
+        own[index] + (own[index - 1] if index > 0 else 0) / 2 + (own[index + 1] if index + 1 < len(chunks) else 0) / 2
+        for index in range(len(chunks))
+    ]
+
+    selected = set()
+    seen = set()
+    used = 0
+    for index in sorted(range(len(chunks)), key=lambda i: scores[i], reverse=True):
+        if scores[index] <= 0:
+            break
+        cost = estimate_tokens(chunks[index]) + 1
+        if chunks[index].strip() in seen or used + cost > token_budget:
+            continue
+        selected.add(index)
+        seen.add(chunks[index].strip())
+        used += cost
+
+    # Nothing recognisable: send the text unchanged rather than an empty prompt
+    if not selected:
+        return text, {"tokens_before": tokens_before, "tokens_after": tokens_before, "tokens_saved": 0}
+
+    context = "\n".join(chunks[index] for index in sorted(selected))
+    tokens_after = estimate_tokens(context)
+    return context, {"tokens_before": tokens_before, "tokens_after": tokens_after, "tokens_saved": tokens_before - tokens_after}
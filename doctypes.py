@@ -0,0 +1,65 @@
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from checks import SCHEMAS, Schema
+from classifier import Classification, classify
+from extractors import (
+    Extraction,
+    extract_aadhaar_entities,
+    extract_form_entities,
+    extract_income_cert_entities,
+    tiered_extract,
+)
+from layout import Chunk
+from llm import PROMPTS, parse_document
+
+
+@dataclass(frozen=True)
+class DocumentType:
+    """The prompt, regex tier and validator for one document type, all keyed by its schema name."""
+
+    name: str
+    schema: Schema
+    regex_extract: Callable[[str], Dict[str, str]]
+
+    @property
+    def prompt(self) -> str:
+        return PROMPTS[self.name]
+
+    def regex_coverage(self, text: str) -> float:
+        """Share of the schema's fields the regex tier reads validly, used to break classifier ties."""
+        found = self.regex_extract(text)
+        valid = [key for key, value in found.items() if key in self.schema.patterns and self.schema.is_valid(key, value)]
+        return len(valid) / len(self.schema.fields)
+
+    async def extract(self, text: str, layout: Optional[Sequence[Chunk]] = None) -> Extraction:
+        return await tiered_extract(self.name, text, self.regex_extract, partial(parse_document, self.name), layout)
+
+    def validate(self, fields: dict) -> None:
+        self.schema.validate(fields)
+
+
+# Card and income form layouts have their own regex tier; the other forms share the labelled-field one
+REGEX_EXTRACTORS = {
+    "aadhaar": extract_aadhaar_entities,
+    "income_cert": extract_income_cert_entities,
+}
+
+DOC_TYPES = {
+    name: DocumentType(name, schema, REGEX_EXTRACTORS.get(name) or partial(extract_form_entities, schema))
+    for name, schema in SCHEMAS.items()
+}
+
+
+def detect_type(text: str, page_count: int = 1) -> Tuple[Optional[str], Classification]:
+    """Classifies OCR text, returning no type when nothing is recognisable.
+
+    On a close call the same text is reclassified without another OCR or LLM call: the candidate
+    whose regex tier reads the most valid fields wins.
+    """
+    classification = classify(text, page_count)
+    if not classification.recognized:
+        return None, classification
+    doc_type = max(classification.candidates, key=lambda name: DOC_TYPES[name].regex_coverage(text))
+    return doc_type, classification
@@ -0,0 +1,240 @@
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional, Sequence
+
+from fastapi import HTTPException
+
+import metrics
+from checks import SCHEMAS, Schema
+from context import LLM_REPAIR_TOKEN_BUDGET, field_hints, select_context
+from layout import Chunk
+from llm import parse_aadhaar_info, parse_fields, parse_income_cert
+
+# Follow-up prompts for fields still invalid after extraction, before the request fails with 422
+LLM_REPAIR_ATTEMPTS = int(os.getenv("LLM_REPAIR_ATTEMPTS", "2"))
+
+# Patterns from the Grants notebook, tightened so a 16 digit VID is not read as an Aadhaar number
+dob_pattern = re.compile(r"(?:DOB|Date\s+of\s+Birth|పుట్టిన తేదీ)[\s:/\-]*(\d{2}/\d{2}/\d{4})\b", re.IGNORECASE)
+aadhaar_pattern = re.compile(r"(?<!\d)(?<!\d )\d{4} ?\d{4} ?\d{4}(?! ?\d)")
+name_line_pattern = re.compile(r"^[A-Za-z][A-Za-z\s\-\.]+$")
+
+# Labelled fields on the income certificate application form
+applicant_name_pattern = re.compile(r"(?:Applicant(?:'s)?\s+Name|Name\s+of\s+the\s+Applicant)[\s:.\-]*([A-Za-z][A-Za-z \-]+)", re.IGNORECASE)
+father_husband_pattern = re.compile(r"(?:Father|Husband)(?:\s*/\s*(?:Father|Husband))?(?:'s)?\s+Name[\s:.\-]*([A-Za-z][A-Za-z \-]+)", re.IGNORECASE)
+form_dob_pattern = re.compile(r"(?:DOB|Date\s+of\s+Birth)[\s:.\-]*(\d{2}/\d{2}/\d{4})\b", re.IGNORECASE)
+mobile_pattern = re.compile(r"(?:Mobile|Cell|Phone)(?:\s*No\.?|\s*Number)?[\s:.\-]*(\+?91[\s\-]?)?(\d(?: ?\d){9})(?! ?\d)", re.IGNORECASE)
+ration_card_pattern = re.compile(r"Ration\s*Card(?:\s*No\.?|\s*Number)?[\s:.\-]*([A-Za-z0-9][A-Za-z0-9\-]*)", re.IGNORECASE)
+
+# Labels shared by the other certificate application forms
+form_name_pattern = re.compile(
+    r"^\s*(?:\d+[.)]\s*)?(?:Name(?:\s+of\s+the\s+Applicant)?|Applicant(?:'s)?\s+Name)\s*[:.\-]\s*([A-Za-z][A-Za-z \-]+)",
+    re.IGNORECASE | re.MULTILINE,
+)
+caste_pattern = re.compile(r"(?:Caste|Community)(?:\s*/\s*Sub[\s\-]?caste)?\s*[:.\-]\s*([A-Za-z][A-Za-z ]+)", re.IGNORECASE)
+income_pattern = re.compile(r"Income[^:\n]*[:\-]\s*(?:Rs\.?\s*)?(\d[\d,]*)", re.IGNORECASE)
+card_number_pattern = re.compile(r"(?:EPIC|Card)\s*No\.?[\s:.\-]*([A-Za-z0-9][A-Za-z0-9/\-]*)", re.IGNORECASE)
+
+# Form field keys in checks.py mapped to the pattern (and group) that reads them
+FORM_FIELD_PATTERNS = {
+    "Name": (form_name_pattern, 1),
+    "Applicant Name": (applicant_name_pattern, 1),
+    "Father_Husband_Name": (father_husband_pattern, 1),
+    "Date_of_birth": (form_dob_pattern, 1),
+    "Caste": (caste_pattern, 1),
+    "Caste_Subcaste": (caste_pattern, 1),
+    "Aadhaar_Number": (aadhaar_pattern, 0),
+    "Adhaar_Number": (aadhaar_pattern, 0),
+    "Aadhar_Card_No": (aadhaar_pattern, 0),
+    "Annual_Income": (income_pattern, 1),
+    "Card_No": (card_number_pattern, 1),
+    "Ration_card": (ration_card_pattern, 1),
+}
+MOBILE_FIELDS = {"Mobile_number", "Mobile_No"}
+
+# Header lines that look like names but never are
+NON_NAME_LINES = {
+    "government of india",
+    "unique identification authority of india",
+    "download date",
+    "issue date",
+    "male",
+    "female",
+}
+
+# How often each tier served a field, how many requests never reached the LLM, and prompt tokens trimmed
+stats = Counter()
+
+
+@dataclass
+class Extraction:
+    fields: dict
+    field_sources: Dict[str, str]
+    prompt_tokens_saved: int = 0
+    # Follow-up prompts spent on each field that failed validation
+    repair_attempts: Dict[str, int] = field(default_factory=dict)
+
+    def response(self) -> dict:
+        return {
+            **self.fields,
+            "field_sources": self.field_sources,
+            "prompt_tokens_saved": self.prompt_tokens_saved,
+            "repair_attempts": self.repair_attempts,
+        }
+
+
+def _search(pattern: re.Pattern, text: str, group: int = 1) -> Optional[str]:
+    match = pattern.search(text)
+    return match.group(group).strip() if match else None
+
+
+def extract_aadhaar_entities(text: str) -> Dict[str, str]:
+    entities = {}
+
+    dob_match = dob_pattern.search(text)
+    if dob_match:
+        entities["Date_of_birth"] = dob_match.group(1)
+
+        # On the card the English name is printed on the line just above the DOB
+        lines = [line.strip() for line in text[:dob_match.start()].splitlines() if line.strip()]
+        for line in reversed(lines[-3:]):
+            if name_line_pattern.match(line) and line.lower() not in NON_NAME_LINES:
+                entities["Name"] = line
+                break
+
+    aadhaar_number = _search(aadhaar_pattern, text, group=0)
+    if aadhaar_number:
+        entities["Aadhaar_number"] = aadhaar_number
+
+    return entities
+
+
+def extract_income_cert_entities(text: str) -> Dict[str, str]:
+    entities = {
+        "Applicant Name": _search(applicant_name_pattern, text),
+        "Father_Husband_Name": _search(father_husband_pattern, text),
+        "Date_of_birth": _search(form_dob_pattern, text),
+        "Adhaar_Number": _search(aadhaar_pattern, text, group=0),
+        "Ration_card": _search(ration_card_pattern, text),
+    }
+
+    mobile_match = mobile_pattern.search(text)
+    if mobile_match:
+        entities["Mobile_number"] = re.sub(r"\s", "", mobile_match.group(2))
+
+    return {field: value for field, value in entities.items() if value}
+
+
+def extract_form_entities(schema: Schema, text: str) -> Dict[str, str]:
+    """Reads the labelled fields of ``schema`` that have a known pattern; the rest are left to the LLM."""
+    entities = {}
+    for field in schema.fields:
+        if field.key in MOBILE_FIELDS:
+            mobile_match = mobile_pattern.search(text)
+            if mobile_match:
+                entities[field.key] = re.sub(r"\s", "", mobile_match.group(2))
+        elif field.key in FORM_FIELD_PATTERNS:
+            pattern, group = FORM_FIELD_PATTERNS[field.key]
+            value = _search(pattern, text, group=group)
+            if value:
+                entities[field.key] = value
+    return entities
+
+
+async def tiered_extract(
+    doc_type: str,
+    text: str,
+    regex_extract: Callable[[str], Dict[str, str]],
+    llm_parse: Callable[[str], Awaitable[dict]],
+    layout: Optional[Sequence[Chunk]] = None,
+) -> Extraction:
+    """Runs the regex tier and only asks the LLM for fields it could not fill validly.
+
+    Returns the merged fields and which tier ("regex", "llm" or "repair") served each field. When
+    the regex tier filled none of the fields the document's own prompt is sent; otherwise the LLM
+    is asked for just the missing or invalid keys, so regex hits are never generated again. The
+    LLM only sees the OCR chunks relevant to those fields, cut along ``layout`` when the
+    document's paragraphs are known. Fields still invalid afterwards are asked for again on their
+    own, see ``repair_fields``.
+    """
+    # A regex value is kept only if it passes the same rule the document's validator applies
+    schema = SCHEMAS[doc_type]
+    found = regex_extract(text)
+    info = {field: value for field, value in found.items() if field in schema.patterns and schema.is_valid(field, value)}
+    sources = {field: "regex" for field in info}
+    tokens_saved = 0
+    missing = [field for field in schema.patterns if field not in info]
+
+    if not missing:
+        stats[f"{doc_type}.regex_only"] += 1
+    else:
+        stats[f"{doc_type}.llm_fallback"] += 1
+        if info:
+            context, usage = select_context(text, doc_type, hints=field_hints(missing), layout=layout)
+            llm_info = await parse_fields(doc_type, {field: found.get(field) for field in missing}, context)
+        else:
+            context, usage = select_context(text, doc_type, layout=layout)
+            llm_info = await llm_parse(context)
+        tokens_saved = usage["tokens_saved"]
+        stats[f"{doc_type}.prompt_tokens_saved"] += tokens_saved
+        for field, value in llm_info.items():
+            if field not in info:
+                info[field] = value
+                if field in schema.patterns:
+                    sources[field] = "llm"
+
+    extraction = Extraction(info, sources, tokens_saved)
+    await repair_fields(doc_type, text, extraction, layout=layout)
+    for key, source in extraction.field_sources.items():
+        stats[f"{doc_type}.{source}"] += 1
+    return extraction
+
+
+async def repair_fields(
+    doc_type: str,
+    text: str,
+    extraction: Extraction,
+    attempts: int = LLM_REPAIR_ATTEMPTS,
+    layout: Optional[Sequence[Chunk]] = None,
+) -> None:
+    """Re-asks the LLM for just the fields that fail validation, keeping every valid one.
+
+    Each attempt sends only the failing keys, the values that were rejected and the OCR chunks
+    around those fields, so it costs a fraction of a full extraction. Stops after ``attempts``
+    rounds or when the LLM reply cannot be used; whatever is still invalid fails validation.
+    """
+    schema = SCHEMAS[doc_type]
+    previous = None
+    for attempt in range(1, attempts + 1):
+        failing = schema.errors(extraction.fields)
+        if not failing:
+            return
+        rejected = {key: extraction.fields.get(key) for key in failing}
+        # Each retry widens the excerpt; once it covers everything there is nothing new to ask with
+        context, _ = select_context(text, doc_type, LLM_REPAIR_TOKEN_BUDGET * attempt, field_hints(failing), layout)
+        if (context, rejected) == previous:
+            return
+        previous = context, rejected
+        for key in failing:
+            extraction.repair_attempts[key] = extraction.repair_attempts.get(key, 0) + 1
+        try:
+            repaired = await parse_fields(doc_type, rejected, context)
+        except HTTPException:
+            return
+        for key in failing:
+            value = repaired.get(key)
+            if value is not None and schema.is_valid(key, value):
+                extraction.fields[key] = value
+                extraction.field_sources[key] = "repair"
+                metrics.FIELD_REPAIRS.labels(doc_type, key, "repaired").inc()
+            else:
+                metrics.FIELD_REPAIRS.labels(doc_type, key, "failed").inc()
+
+
+async def extract_aadhaar_info(extracted_text: str, layout: Optional[Sequence[Chunk]] = None) -> Extraction:
+    return await tiered_extract("aadhaar", extracted_text, extract_aadhaar_entities, parse_aadhaar_info, layout)
+
+
+async def extract_income_cert_info(extracted_text: str, layout: Optional[Sequence[Chunk]] = None) -> Extraction:
+    return await tiered_extract("income_cert", extracted_text, extract_income_cert_entities, parse_income_cert, layout)
@@ -0,0 +1,250 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from pipeline import StageTimer
+from uploads import Upload
+
+# Directory for state that must survive restarts
+DATA_DIR = os.getenv("GRANTS_DATA_DIR", ".data")
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# A running job whose worker has not finished it within the lease is picked up again
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "600"))
+# While a job runs its worker renews the lease this often, so only a dead worker's jobs lapse
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", str(JOB_LEASE_SECONDS / 4)))
+# Claims after which a job whose worker keeps dying is failed instead of being picked up again
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Longest a GET /jobs/{id}?wait= long poll is held open
+JOB_MAX_WAIT_SECONDS = float(os.getenv("JOB_MAX_WAIT_SECONDS", "60"))
+
+Pipeline = Callable[..., Awaitable[dict]]
+
+FINISHED = ("succeeded", "failed")
+
+
+class JobQueue:
+    """SQLite-persisted work queue drained by a pool of asyncio worker tasks.
+
+    Uploads are stored with the job so queued work survives a restart; a job left running by a
+    crashed process is claimed again once its lease expires, up to ``JOB_MAX_ATTEMPTS`` claims.
+    Each claim bumps ``attempts``, and a worker only renews or finishes the claim it holds, so a
+    worker that lost its lease cannot overwrite the result of the one that took over.
+    """
+
+    def __init__(self, path: str, pipelines: Dict[str, Pipeline], workers: int = JOB_WORKERS):
+        self.path = path
+        self.pipelines = pipelines
+        self.workers = workers
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                doc_type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                shard_pages INTEGER,
+                payload BLOB,
+                result TEXT,
+                error TEXT,
+                timings TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                lease_until REAL,
+                finished_at REAL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created_at ON jobs (status, created_at)")
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._finished: Optional[asyncio.Condition] = None
+        # Seconds spent per stage by jobs finished in this process
+        self.stage_seconds = Counter()
+        self.stage_counts = Counter()
+
+    async def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        if self._finished is None:
+            self._finished = asyncio.Condition()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, doc_type: str, upload: Upload, shard_pages: Optional[int] = None) -> str:
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT INTO jobs (id, doc_type, status, filename, sha256, shard_pages, payload, created_at) "
+            "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)",
+            (job_id, doc_type, upload.filename, upload.sha256, shard_pages, upload.content, time.time()),
+        )
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, doc_type, status, filename, result, error, timings, attempts, created_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for column in ("result", "error", "timings"):
+            job[column] = json.loads(job[column]) if job[column] else None
+        return job
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[dict]:
+        """Long poll: returns the job once it has finished or ``timeout`` seconds have passed."""
+        deadline = time.monotonic() + min(timeout, JOB_MAX_WAIT_SECONDS)
+        if self._finished is None:
+            # Also usable on a queue whose workers run elsewhere and was never started here
+            self._finished = asyncio.Condition()
+        while True:
+            job = await asyncio.to_thread(self.get, job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in FINISHED or remaining <= 0:
+                return job
+            # Woken early by local completions; the timeout also covers jobs finished by other processes
+            async with self._finished:
+                try:
+                    await asyncio.wait_for(self._finished.wait(), timeout=min(remaining, 1.0))
+                except asyncio.TimeoutError:
+                    pass
+
+    def depth(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth(),
+            "workers": len(self._tasks),
+            "mean_stage_seconds": {
+                stage: self.stage_seconds[stage] / self.stage_counts[stage] for stage in self.stage_counts
+            },
+        }
+
+    def _execute(self, sql: str, params: tuple = ()) -> None:
+        with self._lock:
+            self._conn.execute(sql, params)
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock, so two processes can never claim the same job
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = self._conn.execute(
+                        "SELECT id, doc_type, filename, sha256, shard_pages, payload, created_at, attempts + 1 AS attempt "
+                        "FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) "
+                        "ORDER BY created_at LIMIT 1",
+                        (now,),
+                    ).fetchone()
+                    if row is None or row["attempt"] <= JOB_MAX_ATTEMPTS:
+                        break
+                    # Every worker that took it died on the way, so the next one most likely would too
+                    error = {"status_code": 500, "detail": f"Job abandoned after {row['attempt'] - 1} attempts"}
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, payload = NULL, lease_until = NULL, finished_at = ? "
+                        "WHERE id = ?",
+                        (json.dumps(error), now, row["id"]),
+                    )
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', started_at = ?, lease_until = ?, attempts = ? WHERE id = ?",
+                        (now, now + JOB_LEASE_SECONDS, row["attempt"], row["id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row
+
+    def _renew(self, job_id: str, attempt: int) -> None:
+        self._execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+            (time.time() + JOB_LEASE_SECONDS, job_id, attempt),
+        )
+
+    def _finish(
+        self, job_id: str, attempt: int, status: str, result: Optional[dict], error: Optional[dict], timings: dict
+    ) -> None:
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, timings = ?, payload = NULL, lease_until = NULL, finished_at = ? "
+            "WHERE id = ? AND status = 'running' AND attempts = ?",
+            (
+                status,
+                json.dumps(result) if result is not None else None,
+                json.dumps(error) if error is not None else None,
+                json.dumps(timings),
+                time.time(),
+                job_id,
+                attempt,
+            ),
+        )
+
+    async def _heartbeat(self, job_id: str, attempt: int) -> None:
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            await asyncio.to_thread(self._renew, job_id, attempt)
+
+    async def _worker(self) -> None:
+        while True:
+            row = await asyncio.to_thread(self._claim)
+            if row is None:
+                self._wakeup.clear()
+                try:
+                    # Poll now and then as well, for jobs submitted by other processes or whose lease lapsed
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(row)
+
+    async def _run(self, row: sqlite3.Row) -> None:
+        timer = StageTimer()
+        timer.timings["queue_wait"] = time.time() - row["created_at"]
+        upload = Upload(filename=row["filename"], content=row["payload"], sha256=row["sha256"])
+        result, error, status = None, None, "succeeded"
+        heartbeat = asyncio.create_task(self._heartbeat(row["id"], row["attempt"]))
+        try:
+            pipeline = self.pipelines[row["doc_type"]]
+            result = await pipeline(upload, shard_pages=row["shard_pages"], timer=timer)
+        except HTTPException as e:
+            status, error = "failed", {"status_code": e.status_code, "detail": e.detail}
+        except Exception as e:
+            status, error = "failed", {"status_code": 500, "detail": repr(e)}
+        finally:
+            heartbeat.cancel()
+
+        await asyncio.to_thread(self._finish, row["id"], row["attempt"], status, result, error, timer.timings)
+        for stage, seconds in timer.timings.items():
+            self.stage_seconds[stage] += seconds
+            self.stage_counts[stage] += 1
+        async with self._finished:
+            self._finished.notify_all()
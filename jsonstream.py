@@ -0,0 +1,89 @@
+from typing import Iterable, Optional, Set
+
+
+class JSONObjectStream:
+    """Incrementally scans a streamed JSON object and reports when generation can stop.
+
+    Only the top level is tracked: which keys have a finished value, and where the last finished
+    value ends. The object is complete once it closes, or once every expected key has a value, so
+    whatever the model would write after that (extra keys, trailing whitespace) is never waited for.
+    """
+
+    def __init__(self, expected_keys: Iterable[str] = ()):
+        self.expected_keys = set(expected_keys)
+        self.completed: Set[str] = set()
+        self.buffer = ""
+        self.closed = False
+        self._start: Optional[int] = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._key: Optional[str] = None
+        self._in_value = False
+        # Offset just past the last top-level value that was followed by "," or "}"
+        self._last_value_end: Optional[int] = None
+
+    @property
+    def complete(self) -> bool:
+        return self.closed or bool(self.expected_keys) and self.expected_keys <= self.completed
+
+    def feed(self, chunk: str) -> bool:
+        """Adds streamed text and returns whether the object is complete."""
+        offset = len(self.buffer)
+        self.buffer += chunk
+        for index in range(offset, len(self.buffer)):
+            if self.complete:
+                break
+            self._scan(index, self.buffer[index])
+        return self.complete
+
+    def _scan(self, index: int, char: str) -> None:
+        if self._in_string:
+            if self._escaped:
+                self._escaped = False
+            elif char == "\\":
+                self._escaped = True
+            elif char == '"':
+                self._in_string = False
+                if self._depth == 1 and not self._in_value:
+                    self._key = self.buffer[self._string_start + 1:index]
+            return
+
+        if self._start is None:
+            # Anything the model writes before the opening brace is ignored
+            if char == "{":
+                self._start = index
+                self._depth = 1
+        elif char == '"':
+            self._in_string = True
+            self._string_start = index
+        elif char in "{[":
+            self._depth += 1
+        elif char == ":" and self._depth == 1:
+            self._in_value = True
+        elif char == "," and self._depth == 1:
+            self._finish_value(index)
+        elif char in "}]":
+            self._depth -= 1
+            if self._depth == 0:
+                self._finish_value(index)
+                self._last_value_end = index
+                self.closed = True
+
+    def _finish_value(self, index: int) -> None:
+        if self._in_value and self._key is not None:
+            self.completed.add(self._key)
+            self._last_value_end = index
+        self._in_value = False
+        self._key = None
+
+    def text(self) -> str:
+        """The object as far as it is complete: closed as generated, or cut after the last finished value."""
+        if self._start is None:
+            return self.buffer
+        if self.closed:
+            return self.buffer[self._start:self._last_value_end + 1]
+        if self._last_value_end is None:
+            return self.buffer[self._start:]
+        return self.buffer[self._start:self._last_value_end] + "}"
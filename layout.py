@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from google.cloud import documentai_v1beta3 as documentai
+
+BoundingBox = Tuple[float, float, float, float]
+
+
+class Chunk(NamedTuple):
+    """One paragraph of a Document as a span of ``document.text``; pages are 1-based.
+
+    ``bbox`` is (left, top, right, bottom) in page-normalized coordinates, when Document AI gave one.
+    """
+
+    page: int
+    start: int
+    end: int
+    confidence: float = 0.0
+    bbox: Optional[BoundingBox] = None
+
+    def text(self, text: str) -> str:
+        return text[self.start:self.end]
+
+
+def _bbox(layout) -> Optional[BoundingBox]:
+    vertices = layout.bounding_poly.normalized_vertices
+    if not vertices:
+        return None
+    xs = [vertex.x for vertex in vertices]
+    ys = [vertex.y for vertex in vertices]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def paragraph_spans(text: str, start: int, end: int) -> Iterator[Tuple[int, int]]:
+    """Spans of ``text[start:end]`` between blank lines, found without slicing the text."""
+    while start < end:
+        split = text.find("\n\n", start, end)
+        stop = end if split == -1 else split
+        if stop > start:
+            yield start, stop
+        start = stop + 2
+
+
+def layout_chunks(document: documentai.Document, text: Optional[str] = None) -> List[Chunk]:
+    """The document's paragraphs in reading order, read from the page layout rather than the text.
+
+    Falls back to blocks for pages without paragraphs, and to blank-line splitting of the page
+    (or, without any page anchors, of the whole text) when there is no layout at all. Paragraphs
+    and blocks are never mixed on one page, so no text is covered twice.
+
+    ``text`` is ``document.text`` when the caller already has it: every read of the field copies
+    the whole string out of the protobuf.
+    """
+    text = document.text if text is None else text
+    chunks = []
+    # Walked on the raw protobuf: proto-plus wraps every nested message it hands out, which costs
+    # more than the chunking itself on a long document
+    for number, page in enumerate(type(document).pb(document).pages, start=1):
+        page_number = page.page_number or number
+        elements = page.paragraphs or page.blocks
+        if elements:
+            for element in elements:
+                layout = element.layout
+                bbox = _bbox(layout)
+                for segment in layout.text_anchor.text_segments:
+                    if segment.end_index > segment.start_index:
+                        chunks.append(Chunk(page_number, segment.start_index, segment.end_index, layout.confidence, bbox))
+        else:
+            for segment in page.layout.text_anchor.text_segments:
+                for start, end in paragraph_spans(text, segment.start_index, segment.end_index):
+                    chunks.append(Chunk(page_number, start, end, page.layout.confidence))
+    if not chunks:
+        chunks = [Chunk(1, start, end) for start, end in paragraph_spans(text, 0, len(text))]
+    return chunks
+
+
+def page_spans(document: documentai.Document) -> List[Optional[Tuple[int, int]]]:
+    """Each page's (start, end) in ``document.text``, or None where its anchor is not one span.
+
+    Matches ``ocr.page_texts``: a document without page anchors is a single page of all the text.
+    """
+    spans = []
+    for page in type(document).pb(document).pages:
+        segments = page.layout.text_anchor.text_segments
+        spans.append((segments[0].start_index, segments[0].end_index) if len(segments) == 1 else None)
+    if not any(spans):
+        return [(0, len(document.text))]
+    return spans
+
+
+def segment_chunks(
+    chunks: Sequence[Chunk], spans: List[Optional[Tuple[int, int]]], first_page: int, texts: List[str]
+) -> Optional[List[Chunk]]:
+    """The chunks of a bundle segment, moved onto its text: the page texts joined with newlines.
+
+    None when one of its pages has an anchor split in several spans, so the caller falls back to
+    splitting the segment text.
+    """
+    by_page: Dict[int, List[Chunk]] = {}
+    for chunk in chunks:
+        by_page.setdefault(chunk.page, []).append(chunk)
+
+    moved = []
+    offset = 0
+    for index, page_text in enumerate(texts):
+        number = first_page + index
+        span = spans[number - 1] if number - 1 < len(spans) else None
+        if span is None:
+            return None
+        page_start, page_end = span
+        for chunk in by_page.get(number, ()):
+            if page_start <= chunk.start and chunk.end <= page_end:
+                moved.append(chunk._replace(start=chunk.start - page_start + offset, end=chunk.end - page_start + offset))
+        offset += len(page_text) + 1
+    return moved
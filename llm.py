@@ -0,0 +1,342 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+import metrics
+from cache import CACHE_DIR, TieredCache
+from jsonstream import JSONObjectStream
+
+# The ollama client (and httpx under it) is imported by the scheduler's start(), not at app import
+if TYPE_CHECKING:
+    import ollama
+
+LLM_MODEL = os.getenv("LLM_MODEL", "llama3")
+
+# Generations the local ollama server runs at once; everything else waits in a FIFO queue
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "2"))
+# A request still queued after this many seconds is dropped with 503 instead of being generated
+LLM_QUEUE_DEADLINE = float(os.getenv("LLM_QUEUE_DEADLINE", "120"))
+# How long ollama keeps the model in memory after the last request (ollama's own default is 5m)
+LLM_KEEP_ALIVE = os.getenv("LLM_KEEP_ALIVE", "30m")
+
+# Memoized extractions: bounded LRU in memory and in SQLite, keyed by model, prompt version and text
+LLM_CACHE_MEMORY_BYTES = int(os.getenv("LLM_CACHE_MEMORY_BYTES", str(8 * 1024 * 1024)))
+LLM_CACHE_DISK_BYTES = int(os.getenv("LLM_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600)))
+
+# Each template is the fixed system message for its document type and the OCR text is sent after it
+# on its own, so every request of a type shares the same prompt prefix. ollama keeps the evaluated
+# prefix of the last prompt in each of its slots, and only evaluates what comes after it.
+AADHAAR_PROMPT = """[Requirement] for the content that follows, parsed from a scanned Aadhaar card document. The Aadhaar number is a 12 digit number with spaces in between. I want you to give me the following data in the following json structure.
+[json_structure] {"Name":---, "Aadhaar_number":---, "Date_of_birth":---}"""
+
+INCOME_CERT_PROMPT = """[Requirement] for the content that follows, which was extracted from an application form that was scanned. In addition to the applicant's name, which is a character with spaces between it, the date of birth is a variable character,  the mobile number with 10 digit number with spaces between it, the Adhaar number is a 12-digit number with spaces between it, and the ration card number is also a character. Please provide me with the following information in the JSON structure.
+[json_structure] {"Applicant Name":---, "Father_Husband_Name":---, "Date_of_birth":---  "Adhaar_Number":---  "Mobile_number":---  "Ration_card:---}"""
+
+COMMUNITY_OR_BIRTH_CERTIFICATE_PROMPT = """[Requirement] for the content that follows, parsed from a scanned community and date of birth certificate application. The date of birth is in dd/mm/yyyy format, the mobile number is a 10 digit number and the Aadhaar number is a 12 digit number with spaces in between. I want you to give me the following data in the following json structure.
+[json_structure] {"Name":---, "Father_Husband_Name":---, "Date_of_birth":---, "Mobile_number":---, "Caste":---, "Aadhaar_Number":---}"""
+
+CARD_PROMPT = """[Requirement] for the content that follows, parsed from a scanned voter ID (EPIC) card. The date of birth is in dd/mm/yyyy format and the card number is the alphanumeric EPIC number. I want you to give me the following data in the following json structure.
+[json_structure] {"Name":---, "Date_of_birth":---, "Card_No":---}"""
+
+RATION_CARD_PROMPT = """[Requirement] for the content that follows, parsed from a scanned ration card. The date of birth is in dd/mm/yyyy format, the card number is alphanumeric and the member names are the family members listed on the card, separated by commas. I want you to give me the following data in the following json structure.
+[json_structure] {"Name":---, "Date_of_birth":---, "Card_No":---, "Member_Name(s)":---}"""
+
+EBC_CERTIFICATE_PROMPT = """[Requirement] for the content that follows, parsed from a scanned economically backward classes (EBC) certificate application. The date of birth is in dd/mm/yyyy format, the mobile number is a 10 digit number, the Aadhaar card number is a 12 digit number with spaces in between and the annual income is a number. I want you to give me the following data in the following json structure.
+[json_structure] {"Name":---, "Father_Husband_Name":---, "Date_of_birth":---, "Mobile_No":---, "Caste":---, "Aadhar_Card_No":---, "Annual_Income":---}"""
+
+EWS_CERTIFICATE_PROMPT = """[Requirement] for the content that follows, parsed from a scanned economically weaker sections (EWS) certificate application. The date of birth is in dd/mm/yyyy format, the mobile number is a 10 digit number, the Aadhaar card number is a 12 digit number with spaces in between and the annual income is a number. I want you to give me the following data in the following json structure.
+[json_structure] {"Name":---, "Father_Husband_Name":---, "Date_of_birth":---, "Mobile_No":---, "Caste":---, "Aadhar_Card_No":---, "Annual_Income":---}"""
+
+OBC_CERTIFICATE_PROMPT = """[Requirement] for the content that follows, parsed from a scanned other backward classes (OBC) certificate application. The date of birth is in dd/mm/yyyy format, the mobile number is a 10 digit number and the Aadhaar card number is a 12 digit number with spaces in between. I want you to give me the following data in the following json structure.
+[json_structure] {"Name":---, "Father_Husband_Name":---, "Date_of_birth":---, "Mobile_No":---, "Caste_Subcaste":---, "Aadhar_Card_No":---}"""
+
+RESIDENCE_CERTIFICATE_PROMPT = """[Requirement] for the content that follows, parsed from a scanned residence certificate application. The number of years is how long the applicant has lived at the address. I want you to give me the following data in the following json structure.
+[json_structure] {"Name":---, "Father_Husband_Name":---, "Mandal_Name":---, "Village_Name":---, "House_Number":---, "No_of_years":---, "Address":---}"""
+
+# Follow-up for fields that failed validation: only those keys, with a short excerpt of the OCR text.
+# The instruction is fixed and the per-request part goes in the user message, content last.
+FIELD_REPAIR_PROMPT = """[Requirement] some values read from a scanned document are missing or invalid; they are listed under [rejected]. Read only these fields again from the content that follows and give me them in the json structure given with them."""
+
+FIELD_REPAIR_REQUEST = """[document] {document}
+[rejected] {rejected}
+[json_structure] {{{structure}}}
+[content] {content}"""
+
+# Keyed like checks.SCHEMAS, so each prompt asks for exactly the fields its validator checks
+PROMPTS = {
+    "aadhaar": AADHAAR_PROMPT,
+    "income_cert": INCOME_CERT_PROMPT,
+    "community_or_birth_certificate": COMMUNITY_OR_BIRTH_CERTIFICATE_PROMPT,
+    "card": CARD_PROMPT,
+    "ration_card": RATION_CARD_PROMPT,
+    "ebc_certificate": EBC_CERTIFICATE_PROMPT,
+    "ews_certificate": EWS_CERTIFICATE_PROMPT,
+    "obc_certificate": OBC_CERTIFICATE_PROMPT,
+    "residence_certificate": RESIDENCE_CERTIFICATE_PROMPT,
+}
+
+# The keys each prompt's [json_structure] asks for; streaming stops once all of them have a value
+json_key_pattern = re.compile(r'"([^":{}]+)"?\s*:\s*---')
+PROMPT_KEYS = {name: tuple(key.strip() for key in json_key_pattern.findall(prompt)) for name, prompt in PROMPTS.items()}
+
+
+class LLMScheduler:
+    """Single gateway to ollama: bounded in-flight generations, FIFO queue with deadlines,
+    and coalescing of identical prompts that are already queued or generating.
+    """
+
+    def __init__(self, max_in_flight: int = LLM_MAX_IN_FLIGHT, queue_deadline: float = LLM_QUEUE_DEADLINE):
+        self.max_in_flight = max_in_flight
+        self.queue_deadline = queue_deadline
+        self.client: Optional["ollama.AsyncClient"] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.in_flight = 0
+        self.requests = 0
+        self.coalesced = 0
+        self.expired = 0
+        self.failed = 0
+        self.early_stops = 0
+        self.queue_wait_seconds = 0.0
+        self.generation_seconds = 0.0
+        self.generations = 0
+        # Until the first streamed token ollama is evaluating the prompt, less any cached prefix
+        self.first_token_seconds = 0.0
+        self.first_tokens = 0
+
+    def start(self) -> None:
+        if self._queue is not None:
+            return
+        import ollama
+
+        self.client = ollama.AsyncClient()
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_in_flight)]
+
+    async def warm_up(self) -> None:
+        """Loads the model into ollama's memory, so the first extraction does not pay for it."""
+        self.start()
+        # A generate call without a prompt only loads the model and sets its keep-alive
+        await self.client.generate(model=LLM_MODEL, keep_alive=LLM_KEEP_ALIVE)
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        self._workers = []
+        self._queue = None
+
+    async def chat(self, expected_keys: Iterable[str] = (), **request) -> dict:
+        """Queues an ``ollama.chat`` call and returns its response.
+
+        A streamed request is cut off as soon as its JSON object has a value for every one of
+        ``expected_keys``; the response then holds the object up to that point.
+        """
+        # Lazily start so scripts can use the scheduler without an app lifespan
+        self.start()
+        self.requests += 1
+        key = hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+        future = self._pending.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[key] = future
+            self._queue.put_nowait((time.monotonic(), key, request, tuple(expected_keys), future))
+        # Shielded so one caller going away does not cancel the generation the others wait on
+        return await asyncio.shield(future)
+
+    def stats(self) -> dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "expired": self.expired,
+            "failed": self.failed,
+            "early_stops": self.early_stops,
+            "generations": self.generations,
+            "mean_queue_wait_seconds": self.queue_wait_seconds / self.generations if self.generations else 0.0,
+            "mean_generation_seconds": self.generation_seconds / self.generations if self.generations else 0.0,
+            "mean_first_token_seconds": self.first_token_seconds / self.first_tokens if self.first_tokens else 0.0,
+        }
+
+    async def _worker(self) -> None:
+        while True:
+            enqueued_at, key, request, expected_keys, future = await self._queue.get()
+            waited = time.monotonic() - enqueued_at
+            if waited > self.queue_deadline:
+                self.expired += 1
+                self._pending.pop(key, None)
+                if not future.done():
+                    future.set_exception(HTTPException(status_code=503, detail="LLM queue deadline exceeded"))
+                continue
+
+            self.in_flight += 1
+            started_at = time.monotonic()
+            try:
+                response = await self._generate(request, expected_keys)
+            except Exception as e:
+                self.failed += 1
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(response)
+            finally:
+                self.in_flight -= 1
+                self._pending.pop(key, None)
+                generation_seconds = time.monotonic() - started_at
+                self.generations += 1
+                self.queue_wait_seconds += waited
+                self.generation_seconds += generation_seconds
+                metrics.LLM_QUEUE_WAIT.observe(waited)
+                metrics.LLM_GENERATION.observe(generation_seconds)
+
+    async def _generate(self, request: dict, expected_keys: Tuple[str, ...]) -> dict:
+        if not request.get("stream"):
+            return await self.client.chat(**request)
+
+        decoder = JSONObjectStream(expected_keys)
+        started_at = time.monotonic()
+        first_token = True
+        stream = await self.client.chat(**request)
+        try:
+            async for part in stream:
+                if first_token:
+                    self._first_token(time.monotonic() - started_at)
+                    first_token = False
+                if decoder.feed(part["message"]["content"]) and not part.get("done"):
+                    self.early_stops += 1
+                    break
+        finally:
+            # Closing the stream drops the connection, which makes ollama stop generating
+            await stream.aclose()
+        return {"message": {"role": "assistant", "content": decoder.text()}}
+
+    def _first_token(self, seconds: float) -> None:
+        self.first_token_seconds += seconds
+        self.first_tokens += 1
+        metrics.LLM_FIRST_TOKEN.observe(seconds)
+
+
+scheduler = LLMScheduler()
+
+memo = TieredCache(
+    os.path.join(CACHE_DIR, "llm.sqlite3"),
+    memory_bytes=LLM_CACHE_MEMORY_BYTES,
+    disk_bytes=LLM_CACHE_DISK_BYTES,
+    ttl=LLM_CACHE_TTL,
+)
+
+
+def prompt_version(template: str) -> str:
+    # Editing a template changes its version, so stale extractions are never served for it
+    return hashlib.sha256(template.encode()).hexdigest()[:16]
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def memo_key(model: str, template_name: str, text: str) -> str:
+    version = prompt_version(PROMPTS[template_name])
+    digest = hashlib.sha256(normalize_text(text).encode()).hexdigest()
+    return f"{model}:{template_name}:{version}:{digest}"
+
+
+def invalidate_prompt(template_name: str, model: str = LLM_MODEL) -> int:
+    """Drops every memoized extraction made with any version of the given template."""
+    return memo.invalidate_namespace(f"{model}:{template_name}")
+
+
+async def _memo_get(key: str) -> Optional[dict]:
+    cached = await asyncio.to_thread(memo.get, key)
+    if cached is None:
+        return None
+    return json.loads(cached)
+
+
+async def _memo_put(key: str, template_name: str, info: dict) -> None:
+    await asyncio.to_thread(memo.put, key, json.dumps(info).encode(), f"{LLM_MODEL}:{template_name}")
+
+
+def messages(system: str, content: str) -> List[dict]:
+    """The fixed instruction as the system message, followed by the per-request content."""
+    return [
+        {
+            'role': 'system',
+            'content': system,
+        },
+        {
+            'role': 'user',
+            'content': content,
+        },
+    ]
+
+
+async def _ask(template_name: str, key: str, system: str, content: str, expected_keys: Iterable[str]) -> dict:
+    info = await _memo_get(key)
+    if info is not None:
+        return info
+
+    with metrics.stage("llm"):
+        response = await scheduler.chat(
+            model=LLM_MODEL, messages=messages(system, content),
+            format="json", stream=True, keep_alive=LLM_KEEP_ALIVE, expected_keys=expected_keys,
+        )
+
+    with metrics.stage("json_parse"):
+        try:
+            info = json.loads(response['message']['content'])
+        except json.JSONDecodeError:
+            info = None
+    if not isinstance(info, dict):
+        metrics.LLM_PARSE_FAILURES.labels(template_name).inc()
+        raise HTTPException(status_code=502, detail={"error": f"Failed to parse {template_name} information"})
+
+    await _memo_put(key, template_name, info)
+    return info
+
+
+async def parse_document(template_name: str, extracted_text: str) -> dict:
+    """Asks llama3 for the fields of ``PROMPTS[template_name]`` in the given OCR text.
+
+    The reply is streamed and generation stops once every key has a value. A reply that is not a
+    JSON object raises 502, so it is never mistaken for a record that failed validation.
+    """
+    key = memo_key(LLM_MODEL, template_name, extracted_text)
+    return await _ask(template_name, key, PROMPTS[template_name], extracted_text, PROMPT_KEYS[template_name])
+
+
+async def parse_fields(template_name: str, rejected: Dict[str, Optional[str]], extracted_text: str) -> dict:
+    """Asks llama3 again for only the ``rejected`` fields, given the values that failed and a short excerpt."""
+    request = FIELD_REPAIR_REQUEST.format(
+        document=template_name.replace("_", " "),
+        rejected=json.dumps(rejected),
+        structure=", ".join(f'"{field}":---' for field in rejected),
+        content=extracted_text,
+    )
+    # The whole prompt is hashed, so a different excerpt or set of rejected values is asked afresh
+    key = memo_key(LLM_MODEL, template_name, FIELD_REPAIR_PROMPT + request)
+    return await _ask(template_name, key, FIELD_REPAIR_PROMPT, request, rejected)
+
+
+async def parse_aadhaar_info(extracted_text: str) -> dict:
+    return await parse_document("aadhaar", extracted_text)
+
+
+async def parse_income_cert(extracted_text: str) -> dict:
+    return await parse_document("income_cert", extracted_text)
@@ -1,216 +1,228 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from google.cloud import documentai_v1beta3 as documentai
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from starlette.routing import Match
+import json
 import os
-from typing import List, Dict
-import ollama
-import ast
-import re
+import time
+from typing import AsyncIterator, Optional
+
+import admission
+import applicants
+import extractors
+import llm
+import metrics
+import ocr
+import preprocess
+from doctypes import DOC_TYPES
+from jobs import DATA_DIR, JobQueue
+from layout import layout_chunks
+from ocr import iter_document
+from pipeline import PIPELINES, pipeline_name, processor_name, run_aadhaar, run_bundle, run_document, run_income_cert, run_pdf
+from uploads import Upload, read_upload
+from warmup import WarmUp
 
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "/Users/astrobalaji/Documents/stacknexus/grants/notebook/creds/grant01-joby.json"
 
-app = FastAPI()
 
-# If you already have a Document AI Processor in your project, assign the full processor resource name here.
-processor_name = "projects/332125695616/locations/us/processors/a6bceed480e9d614"
-
-
-def process_document(processor_name: str, file_path: str) -> documentai.Document:
-    client = documentai.DocumentProcessorServiceClient()
-
-    # Read the file into memory
-    with open(file_path, "rb") as f:
-        document_content = f.read()
-
-    # Configure the request
-    request = documentai.ProcessRequest(
-        name=processor_name,
-        raw_document=documentai.RawDocument(
-            content=document_content,
-            mime_type="application/pdf"
-        )
-    )
-
-    result = client.process_document(request=request)
-    return result.document
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await job_queue.start()
+    # The Document AI client, its channel, the llama3 model and a PDF optimizer process are readied
+    # in the background; requests are served meanwhile and /ready reports when warm-up is done
+    warmup.start()
+    yield
+    await warmup.stop()
+    await job_queue.stop()
+    await llm.scheduler.stop()
+    ocr.pool.shutdown()
+    preprocess.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
+job_queue = JobQueue(os.path.join(DATA_DIR, "jobs.sqlite3"), PIPELINES)
+
+warmup = WarmUp({"documentai": ocr.pool.warm_up, "llm": llm.scheduler.warm_up, "pdf_optimizer": preprocess.warm_up})
+
+# Cache, scheduler and queue counters show up on /metrics alongside the request histograms
+metrics.register_stats("admission", admission.controller.stats)
+metrics.register_stats("ocr_cache", ocr.cache.stats)
+metrics.register_stats("ocr_pool", ocr.pool.stats)
+metrics.register_stats("pdf_optimize", preprocess.stats)
+metrics.register_stats("llm_cache", llm.memo.stats)
+metrics.register_stats("llm_scheduler", llm.scheduler.stats)
+metrics.register_stats("jobs", job_queue.stats)
+metrics.register_stats("applicants", applicants.index.stats)
+metrics.register_stats("extraction", lambda: dict(extractors.stats))
+metrics.register_stats("startup", lambda: {
+    "ready": int(warmup.ready),
+    "serving_after_seconds": warmup.serving_after,
+    "ready_after_seconds": warmup.ready_after,
+    **{f"{step}_seconds": seconds for step, seconds in warmup.seconds.items()},
+})
+
+
+# Added before the metrics middleware below, so it runs inside it and rejections are counted there too
+app.add_middleware(admission.AdmissionMiddleware, controller=admission.controller)
+
+
+def endpoint_label(request: Request) -> str:
+    # Label by route template so job ids don't each get their own series
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    endpoint = endpoint_label(request)
+    metrics.REQUESTS_IN_FLIGHT.labels(endpoint).inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.REQUEST_LATENCY.labels(request.method, endpoint, str(status)).observe(time.perf_counter() - start)
+        metrics.REQUESTS_IN_FLIGHT.labels(endpoint).dec()
 
 
 @app.post("/process-pdf/")
-async def process_pdf(file: UploadFile = File(...)):
-    file_path = f"/tmp/{file.filename}"
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
-
-    document = process_document(processor_name, file_path=file_path)
-
-    if document:
-        extracted_data: List[Dict] = []
-
-        # Extract text from the document
-        document_text = document.text
-
-        # Split the text into chunks based on paragraphs
-        document_chunks = document_text.split('\n\n')  # Assuming paragraphs are separated by double newlines
-
-        for chunk_number, chunk_content in enumerate(document_chunks, start=1):
-            extracted_data.append(
-                {
-                    "file_name": file.filename,
-                    "file_type": os.path.splitext(file.filename)[1],
-                    "chunk_number": chunk_number,
-                    "content": chunk_content,
-                }
-            )
-
-        combined_list = [t["content"] for t in extracted_data]
-        combined_str = "\n".join(combined_list)
-
-        # Remove the temporary file
-        os.remove(file_path)
-
-        return {"text": combined_str}
-    else:
-        return {"error": "Failed to process the document"}
-
-
-def parse_aadhaar_info(extracted_text: str) -> dict:
-    response = ollama.chat(model='llama3', messages=[
-        {
-            'role': 'user',
-            'content': f"""[Requirement] for the following content parsed from a scanned Aadhaar card document. The Aadhaar number is a 12 digit number with spaces in between. I want you to give me the following data in the following json structure. 
-            [json_structure] {{"Name":---, "Aadhaar_number":---, "Date_of_birth":---}}
-            ["content"]{extracted_text}
-            """,
-        },
-    ], format="json")
-
-    # Safely evaluate the response content to convert it to a dictionary
-    try:
-        aadhaar_info = ast.literal_eval(response['message']['content'])
-    except (SyntaxError, ValueError) as e:
-        aadhaar_info = {"error": e}
-
-    return aadhaar_info
+async def process_pdf(file: UploadFile = File(...), shard_pages: Optional[int] = None, stream: bool = False):
+    upload = await read_upload(file)
 
+    if stream:
+        shards = iter_document(processor_name, upload.content, shard_pages=shard_pages, digest=upload.sha256)
+        # The first shard is awaited before the 200 goes out, so an OCR failure still gets the
+        # 503/504 the non-streamed path would return
+        first = await anext(shards)
+        return StreamingResponse(stream_pdf_chunks(upload, first, shards), media_type="application/x-ndjson")
 
-def validate_aadhaar_info(aadhaar_info: dict) -> None:
-    """Validates the extracted Aadhaar information."""
-    name = aadhaar_info.get("Name", "").strip()
-    aadhaar_number = aadhaar_info.get("Aadhaar_number", "").strip()
-    dob = aadhaar_info.get("Date_of_birth", "").strip()
+    return await run_pdf(upload, shard_pages=shard_pages)
 
-    # Check Name (ensure it's a valid name with alphabetic characters, spaces, and hyphens)
-    if not re.match(r'^[A-Za-z\s\-]+$', name):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Name is missing or invalid")
 
-    # Check Aadhaar Number (ensure it matches the 12-digit format with optional spaces)
-    if not re.match(r'^\d{4}\s?\d{4}\s?\d{4}$', aadhaar_number):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Aadhaar number is missing or invalid")
+async def stream_pdf_chunks(upload: Upload, first: tuple, shards: AsyncIterator[tuple]):
+    """Emits one NDJSON line per layout paragraph as each page shard finishes OCR.
 
-    # Check Date of Birth (ensure it matches the dd/mm/yyyy format)
-    if not re.match(r'^\d{2}/\d{2}/\d{4}$', dob):
-        raise HTTPException(status_code=422, detail="Unrecognized entity: Date of birth is missing or invalid")
+    ``start``/``end`` are offsets into the OCR text of the whole file, not of the shard. A shard
+    failing after the response has started ends the stream with an ``{"error": ...}`` line, shaped
+    like a failed job's error.
+    """
+    chunk_number = 0
+    # Length of the shards already sent, which is where this shard's text starts in the merged document
+    offset = 0
+    shard = first
+    try:
+        while shard is not None:
+            first_page, document = shard
+            text = document.text
+            for chunk in layout_chunks(document, text):
+                chunk_number += 1
+                yield json.dumps(
+                    {
+                        "file_name": upload.filename,
+                        "file_type": os.path.splitext(upload.filename)[1],
+                        "chunk_number": chunk_number,
+                        "content": chunk.text(text),
+                        "page": first_page + chunk.page,
+                        "start": offset + chunk.start,
+                        "end": offset + chunk.end,
+                        "confidence": chunk.confidence,
+                        "bbox": chunk.bbox,
+                    }
+                ) + "\n"
+            offset += len(text)
+            try:
+                shard = await anext(shards, None)
+            except HTTPException as e:
+                yield json.dumps({"error": {"status_code": e.status_code, "detail": e.detail}}, default=str) + "\n"
+                return
+            except Exception as e:
+                yield json.dumps({"error": {"status_code": 500, "detail": repr(e)}}) + "\n"
+                return
+    finally:
+        # Cancels the outstanding shards when the client goes away early
+        await shards.aclose()
 
 
 @app.post("/process-aadhaar/")
-async def process_aadhaar(file: UploadFile = File(...)):
-    file_path = f"/tmp/{file.filename}"
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
-
-    document = process_document(processor_name, file_path=file_path)
+async def process_aadhaar(file: UploadFile = File(...), shard_pages: Optional[int] = None):
+    upload = await read_upload(file)
+    return await run_aadhaar(upload, shard_pages=shard_pages)
 
-    if document:
-        extracted_text = document.text
-
-        # Parse Aadhaar information
-        aadhaar_info = parse_aadhaar_info(extracted_text)
-
-        # Validate Aadhaar information
-        validate_aadhaar_info(aadhaar_info)
-
-        # Remove the temporary file
-        os.remove(file_path)
-
-        return aadhaar_info
-    else:
-        return {"error": "Failed to process the document"}
-
-
-def parse_income_cert(extracted_text: str) -> dict:
-    prompt_template = """
-        [Requirement] for the content that follows, which was extracted from an application form that was scanned. In addition to the applicant's name, which is a character with spaces between it, the date of birth is a variable character,  the mobile number with 10 digit number with spaces between it, the Adhaar number is a 12-digit number with spaces between it, and the ration card number is also a character. Please provide me with the following information in the JSON structure. 
-        [json_structure] {{"Applicant Name":---, "Father_Husband_Name":---, "Date_of_birth":---  "Adhaar_Number":---  "Mobile_number":---  "Ration_card:---}}
-        [content] {0}
-    """
-    response = ollama.chat(model='llama3', messages=[
-        {
-            'role': 'user',
-            'content': prompt_template.format(extracted_text),
-        },
-    ], format="json")
-    # Safely evaluate the response content to convert it to a dictionary
-    try:
-        inc_info = ast.literal_eval(response['message']['content'])
-    except (SyntaxError, ValueError) as e:
-        inc_info = {"error": "Failed to parse income information"}
-
-    return inc_info
 
+@app.post("/process-income-cert/")
+async def process_income_cert(file: UploadFile = File(...), shard_pages: Optional[int] = None):
+    upload = await read_upload(file)
+    return await run_income_cert(upload, shard_pages=shard_pages)
 
-def validate_income_cert_applicant_form(applicant_data: Dict[str, str]) -> None:
-    validation_errors = {}
 
-    # Validate Applicant Name
-    if not re.match(r'^[A-Za-z\s\-]+$', applicant_data.get("Applicant Name", "").strip()):
-        validation_errors["Applicant Name"] = "Invalid name format. Only letters, spaces, and hyphens are allowed."
+@app.post("/process-document/")
+async def process_document(file: UploadFile = File(...), shard_pages: Optional[int] = None, doc_type: Optional[str] = None):
+    # doc_type skips classification for clients that already know what they are sending
+    if doc_type is not None and doc_type not in DOC_TYPES:
+        raise HTTPException(status_code=404, detail=f"Unknown document type: {doc_type}")
+    upload = await read_upload(file)
+    return await run_document(upload, shard_pages=shard_pages, doc_type=doc_type)
 
-    # Validate Father/Husband Name
-    if not re.match(r'^[A-Za-z\s\-]+$', applicant_data.get("Father_Husband_Name", "").strip()):
-        validation_errors["Father_Husband_Name"] = "Invalid name format. Only letters, spaces, and hyphens are allowed."
 
-    # Validate Date of Birth
-    if not re.match(r'^\d{2}/\d{2}/\d{4}$', applicant_data.get("Date_of_birth", "").strip()):
-        validation_errors["Date_of_birth"] = "Invalid date format. Expected format is dd/mm/yyyy."
+@app.post("/process-bundle/")
+async def process_bundle(file: UploadFile = File(...), shard_pages: Optional[int] = None):
+    upload = await read_upload(file)
+    return await run_bundle(upload, shard_pages=shard_pages)
 
-    # Validate Aadhaar Number
-    if not re.match(r'^\d{4}\s?\d{4}\s?\d{4}$', applicant_data.get("Adhaar_Number", "").strip()):
-        validation_errors["Adhaar_Number"] = "Invalid Aadhaar number. It should be a 12-digit number with optional spaces."
 
-    # Validate Mobile Number
-    if not re.match(r'^\d{10}$', applicant_data.get("Mobile_number", "").strip()):
-        validation_errors["Mobile_number"] = "Invalid mobile number. It should be a 10-digit number."
+@app.post("/jobs/{doc_type}", status_code=202)
+async def submit_job(doc_type: str, file: UploadFile = File(...), shard_pages: Optional[int] = None):
+    doc_type = pipeline_name(doc_type)
+    if doc_type not in PIPELINES:
+        raise HTTPException(status_code=404, detail=f"Unknown document type: {doc_type}")
+    upload = await read_upload(file)
+    job_id = await job_queue.submit(doc_type, upload, shard_pages=shard_pages)
+    return {"job_id": job_id, "status": "queued"}
 
-    # Validate Ration Card Number
-    if not re.match(r'^[A-Za-z0-9\s\-]+$', applicant_data.get("Ration_card", "").strip()):
-        validation_errors["Ration_card"] = "Invalid ration card number. Only alphanumeric characters, spaces, and hyphens are allowed."
 
-    if validation_errors:
-        raise HTTPException(status_code=422, detail=validation_errors)
+@app.get("/jobs")
+async def job_stats():
+    return job_queue.stats()
 
 
-@app.post("/process-income-cert/")
-async def process_income_cert(file: UploadFile = File(...)):
-    file_path = f"/tmp/{file.filename}"
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    # wait > 0 holds the request open until the job finishes or the timeout passes
+    job = await job_queue.wait(job_id, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
 
-    document = process_document(processor_name, file_path=file_path)
 
-    if document:
-        extracted_text = document.text
+@app.get("/stats")
+async def stats():
+    return {
+        "admission": admission.controller.stats(),
+        "ocr_cache": ocr.cache.stats(),
+        "ocr_pool": ocr.pool.stats(),
+        "llm_cache": llm.memo.stats(),
+        "llm_scheduler": llm.scheduler.stats(),
+        "extraction": dict(extractors.stats),
+    }
 
-        # Parse Income Certificate information
-        inc_info = parse_income_cert(extracted_text)
 
-        # Validate Income Certificate information
-        validate_income_cert_applicant_form(inc_info)
+@app.get("/ready")
+async def ready():
+    # 503 until warm-up has finished, so a load balancer only sends traffic to a warm worker
+    status = warmup.stats()
+    return JSONResponse(status, status_code=200 if warmup.ready else 503)
 
-        # Remove the temporary file
-        os.remove(file_path)
 
-        return inc_info
-    else:
-        return {"error": "Failed to process the document"}
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,93 @@
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily
+
+# Seconds buckets wide enough for a cached hit and a multi-page OCR plus llama3 run on CPU
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+SIZE_BUCKETS = (16e3, 64e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6, 16e6, 32e6)
+
+REQUEST_LATENCY = Histogram(
+    "grants_request_duration_seconds", "HTTP request latency by endpoint.",
+    ["method", "endpoint", "status"], buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge("grants_requests_in_flight", "HTTP requests being handled.", ["endpoint"])
+
+STAGE_LATENCY = Histogram(
+    "grants_stage_duration_seconds", "Time spent per pipeline stage (upload, ocr, extract, llm, json_parse, validate).",
+    ["stage"], buckets=LATENCY_BUCKETS,
+)
+STAGES_IN_FLIGHT = Gauge("grants_stages_in_flight", "Pipeline stages currently running.", ["stage"])
+
+UPLOAD_BYTES = Histogram("grants_upload_bytes", "Size of uploaded documents.", buckets=SIZE_BUCKETS)
+
+VALIDATION_FAILURES = Counter(
+    "grants_validation_failures_total", "Fields rejected by validation.", ["schema", "field"],
+)
+FIELD_REPAIRS = Counter(
+    "grants_field_repairs_total", "Fields re-asked for after failing validation, by outcome.", ["schema", "field", "outcome"],
+)
+
+OCR_CALL_LATENCY = Histogram("grants_ocr_call_seconds", "Latency of one Document AI call attempt.", buckets=LATENCY_BUCKETS)
+OCR_LIMIT_DECREASES = Counter("grants_ocr_limit_decreases_total", "Times the Document AI limit was cut on overload.")
+OCR_RETRIES = Counter("grants_ocr_retries_total", "Document AI attempts retried, by error.", ["error"])
+OCR_HEDGES = Counter("grants_ocr_hedges_total", "Hedged Document AI requests sent, and how many beat the original.", ["outcome"])
+OCR_PAGE_LATENCY = Histogram(
+    "grants_ocr_page_seconds", "Document AI seconds per page, for optimized and original uploads.", ["upload"], buckets=LATENCY_BUCKETS
+)
+PDF_OPTIMIZED = Counter("grants_pdf_optimized_total", "Uploads through the pre-OCR optimizer, by outcome.", ["outcome"])
+PDF_BYTES_SAVED = Counter("grants_pdf_bytes_saved_total", "Bytes not sent to Document AI thanks to the optimizer.")
+PDF_OPTIMIZE_SECONDS = Histogram("grants_pdf_optimize_seconds", "Time spent shrinking one upload.", buckets=LATENCY_BUCKETS)
+
+ADMISSION_REJECTED = Counter("grants_admission_rejected_total", "Requests turned away with 503 by admission control.", ["endpoint", "reason"])
+ADMISSION_WAIT = Histogram("grants_admission_wait_seconds", "Time a request waited for an admission slot.", buckets=LATENCY_BUCKETS)
+
+DOCUMENTS_CLASSIFIED = Counter("grants_documents_classified_total", "Documents routed by /process-document/.", ["doc_type"])
+DUPLICATES_FOUND = Counter("grants_duplicate_applicants_total", "Validated documents matching an earlier applicant record.", ["doc_type", "matched_on"])
+
+LLM_QUEUE_WAIT = Histogram("grants_llm_queue_wait_seconds", "Time a generation waited for an ollama slot.", buckets=LATENCY_BUCKETS)
+LLM_GENERATION = Histogram("grants_llm_generation_seconds", "Time ollama spent on one generation.", buckets=LATENCY_BUCKETS)
+LLM_FIRST_TOKEN = Histogram("grants_llm_first_token_seconds", "Time to the first streamed token, mostly prompt evaluation.", buckets=LATENCY_BUCKETS)
+LLM_PARSE_FAILURES = Counter("grants_llm_parse_failures_total", "LLM replies that were not a JSON object, by schema.", ["schema"])
+
+
+# The in-flight gauge's values, kept where admission control can read them
+stages_in_flight: Dict[str, int] = {}
+
+
+@contextmanager
+def stage(name: str):
+    """Times one pipeline stage into the stage histogram and in-flight gauge."""
+    STAGES_IN_FLIGHT.labels(name).inc()
+    stages_in_flight[name] = stages_in_flight.get(name, 0) + 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(name).observe(time.perf_counter() - start)
+        STAGES_IN_FLIGHT.labels(name).dec()
+        stages_in_flight[name] -= 1
+
+
+class StatsCollector:
+    """Publishes the numeric values of the components' ``stats()`` dicts as gauges."""
+
+    def __init__(self):
+        self.sources: Dict[str, Callable[[], dict]] = {}
+
+    def collect(self):
+        for section, source in self.sources.items():
+            for key, value in source().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    name = f"grants_{section}_{key}".replace(".", "_").replace("-", "_")
+                    yield GaugeMetricFamily(name, f"{section} {key}", value=value)
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def register_stats(section: str, source: Callable[[], dict]) -> None:
+    stats_collector.sources[section] = source
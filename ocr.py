@@ -0,0 +1,478 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+import io
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, AsyncIterator, Deque, List, Optional, Tuple
+
+from fastapi import HTTPException
+from google.api_core import exceptions as core_exceptions
+
+import metrics
+import preprocess
+from cache import CACHE_DIR, TieredCache
+
+# The Document AI client library and pikepdf take a good share of the app's import time, so they
+# are imported where first used: the pool's start() during warm-up, or the first request
+if TYPE_CHECKING:
+    from google.cloud import documentai_v1beta3 as documentai
+
+# host:port of a plaintext Document AI stand-in (benchmarks/fake_services.py); unset uses Google's endpoint
+DOCUMENTAI_ENDPOINT = os.getenv("DOCUMENTAI_ENDPOINT")
+
+# Ceiling and floor for the number of Document AI calls in flight at once in this worker; the
+# adaptive limit starts at the ceiling and moves between the two
+OCR_MAX_CONCURRENCY = int(os.getenv("OCR_MAX_CONCURRENCY", "8"))
+OCR_MIN_CONCURRENCY = int(os.getenv("OCR_MIN_CONCURRENCY", "1"))
+# Factor the limit is cut by on a quota or availability error, at most once per cooldown
+OCR_DECREASE_FACTOR = float(os.getenv("OCR_DECREASE_FACTOR", "0.5"))
+OCR_DECREASE_COOLDOWN = float(os.getenv("OCR_DECREASE_COOLDOWN", "2"))
+
+# Per-attempt gRPC timeout, overall deadline across retries, and retry backoff (full jitter)
+OCR_TIMEOUT = float(os.getenv("OCR_TIMEOUT", "60"))
+OCR_DEADLINE = float(os.getenv("OCR_DEADLINE", "120"))
+OCR_RETRIES = int(os.getenv("OCR_RETRIES", "3"))
+OCR_BACKOFF_BASE = float(os.getenv("OCR_BACKOFF_BASE", "0.5"))
+OCR_BACKOFF_MAX = float(os.getenv("OCR_BACKOFF_MAX", "8"))
+
+# Opt-in: send one duplicate of a call still running past this latency percentile, e.g. 0.95. Each
+# hedge is a second billable Document AI call, so hedging is off (0) unless set
+OCR_HEDGE_PERCENTILE = float(os.getenv("OCR_HEDGE_PERCENTILE", "0"))
+OCR_HEDGE_MIN_SAMPLES = int(os.getenv("OCR_HEDGE_MIN_SAMPLES", "20"))
+OCR_LATENCY_WINDOW = 200
+
+# Errors worth another attempt, and the subset that means Document AI wants less traffic
+RETRYABLE_ERRORS = (
+    core_exceptions.ResourceExhausted,
+    core_exceptions.TooManyRequests,
+    core_exceptions.ServiceUnavailable,
+    core_exceptions.DeadlineExceeded,
+    core_exceptions.InternalServerError,
+    core_exceptions.Aborted,
+)
+OVERLOAD_ERRORS = (
+    core_exceptions.ResourceExhausted,
+    core_exceptions.TooManyRequests,
+    core_exceptions.ServiceUnavailable,
+)
+
+# OCR result cache: in-memory LRU tier, SQLite tier, and how long a result stays valid
+OCR_CACHE_MEMORY_BYTES = int(os.getenv("OCR_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+OCR_CACHE_DISK_BYTES = int(os.getenv("OCR_CACHE_DISK_BYTES", str(1024 * 1024 * 1024)))
+OCR_CACHE_TTL = float(os.getenv("OCR_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Split PDFs longer than this many pages into shards OCRed concurrently (0 disables sharding)
+OCR_SHARD_PAGES = int(os.getenv("OCR_SHARD_PAGES", "0"))
+# Maximum number of shards of one document in flight at once
+OCR_SHARD_FANOUT = int(os.getenv("OCR_SHARD_FANOUT", "4"))
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit: +1/limit per success, multiplied down on overload.
+
+    A burst of errors from calls that were already in flight together only cuts the limit once
+    per cooldown.
+    """
+
+    def __init__(self, minimum: int, maximum: int, factor: float = OCR_DECREASE_FACTOR, cooldown: float = OCR_DECREASE_COOLDOWN):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.cooldown = cooldown
+        self.limit = float(maximum)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition: Optional[asyncio.Condition] = None
+
+    async def acquire(self) -> None:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= int(self.limit):
+            return False
+        self.in_flight += 1
+        return True
+
+    async def release(self) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def increase(self) -> None:
+        if self.limit < self.maximum:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def decrease(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit * self.factor)
+        metrics.OCR_LIMIT_DECREASES.inc()
+
+
+class DocumentAIPool:
+    """Process-wide Document AI client shared by every request.
+
+    The gRPC client is thread-safe, so one channel is reused for all calls and the
+    blocking ``process_document`` runs on a thread pool instead of the event loop. Calls go
+    through an adaptive concurrency limit, are retried with jittered backoff within a deadline,
+    and, when ``OCR_HEDGE_PERCENTILE`` is set, a call running past that recent latency percentile
+    gets one hedged duplicate.
+    """
+
+    def __init__(self, max_concurrency: int = OCR_MAX_CONCURRENCY, min_concurrency: int = OCR_MIN_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limiter = AdaptiveLimiter(min_concurrency, max_concurrency)
+        self.client: Optional[documentai.DocumentProcessorServiceClient] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.latencies: Deque[float] = deque(maxlen=OCR_LATENCY_WINDOW)
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def start(self) -> None:
+        if self.executor is not None:
+            return
+        import grpc
+        from google.cloud import documentai_v1beta3 as documentai
+        from google.cloud.documentai_v1beta3.services.document_processor_service.transports import (
+            DocumentProcessorServiceGrpcTransport,
+        )
+
+        # A client set beforehand (a notebook's own, or a stand-in) is kept
+        if self.client is None and DOCUMENTAI_ENDPOINT:
+            # Insecure channel without credentials, for local stand-ins only
+            transport = DocumentProcessorServiceGrpcTransport(channel=grpc.insecure_channel(DOCUMENTAI_ENDPOINT))
+            self.client = documentai.DocumentProcessorServiceClient(transport=transport)
+        elif self.client is None:
+            self.client = documentai.DocumentProcessorServiceClient()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="documentai")
+        # A fresh limiter per start, since its condition belongs to the event loop that first waits on it
+        self.limiter = AdaptiveLimiter(self.min_concurrency, self.max_concurrency)
+
+    async def warm_up(self) -> None:
+        """Starts the pool and connects its gRPC channel, so the first request does not wait for the handshake."""
+        import grpc
+
+        self.start()
+        channel = getattr(self.client.transport, "grpc_channel", None)
+        if channel is not None:
+            ready = grpc.channel_ready_future(channel)
+            try:
+                await asyncio.wrap_future(self.executor.submit(ready.result, timeout=OCR_TIMEOUT))
+            finally:
+                ready.cancel()
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.client is not None:
+            self.client.transport.close()
+        self.client = None
+        self.executor = None
+
+    def hedge_after(self) -> Optional[float]:
+        """Seconds after which a call gets a hedged duplicate, once enough latencies are known."""
+        if OCR_HEDGE_PERCENTILE <= 0 or len(self.latencies) < OCR_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(OCR_HEDGE_PERCENTILE * len(ordered)))]
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limiter.limit,
+            "in_flight": self.limiter.in_flight,
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_after_seconds": self.hedge_after() or 0.0,
+        }
+
+    async def process(self, request: documentai.ProcessRequest) -> documentai.Document:
+        # Lazily start so scripts and notebooks can use the pool without an app lifespan
+        self.start()
+        self.calls += 1
+        deadline = time.monotonic() + OCR_DEADLINE
+        for attempt in range(OCR_RETRIES + 1):
+            timeout = min(OCR_TIMEOUT, deadline - time.monotonic())
+            try:
+                return await self._hedged(request, timeout)
+            except RETRYABLE_ERRORS as e:
+                if isinstance(e, OVERLOAD_ERRORS):
+                    self.limiter.decrease()
+                backoff = random.uniform(0, min(OCR_BACKOFF_MAX, OCR_BACKOFF_BASE * 2 ** attempt))
+                if attempt == OCR_RETRIES or time.monotonic() + backoff >= deadline:
+                    self.failures += 1
+                    raise self._http_error(e) from e
+                self.retries += 1
+                metrics.OCR_RETRIES.labels(type(e).__name__).inc()
+                await asyncio.sleep(backoff)
+
+    async def _hedged(self, request: documentai.ProcessRequest, timeout: float) -> documentai.Document:
+        primary = asyncio.ensure_future(self._call(request, timeout))
+        hedge_after = self.hedge_after()
+        if hedge_after is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+        # Only hedge into spare capacity, so duplicates never push the limit further
+        if done or not self.limiter.try_acquire():
+            return await primary
+        self.hedges += 1
+        metrics.OCR_HEDGES.labels("sent").inc()
+        hedge = asyncio.ensure_future(self._call(request, timeout, limiter=self.limiter))
+
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None or not pending:
+                        if task is hedge and task.exception() is None:
+                            self.hedge_wins += 1
+                            metrics.OCR_HEDGES.labels("won").inc()
+                        return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _call(
+        self, request: documentai.ProcessRequest, timeout: float, limiter: Optional[AdaptiveLimiter] = None
+    ) -> documentai.Document:
+        """One Document AI call; ``limiter`` is passed when a slot was already taken on it (hedges)."""
+        if limiter is None:
+            limiter = self.limiter
+            await limiter.acquire()
+        loop = asyncio.get_running_loop()
+
+        def release(_) -> None:
+            # The slot goes back to the limiter and loop it was taken from: after a shutdown() and
+            # restart the pool has a new limiter, and the old loop may be closed already
+            if not loop.is_closed():
+                with contextlib.suppress(RuntimeError):
+                    asyncio.run_coroutine_threadsafe(limiter.release(), loop)
+
+        # The slot is held until the thread finishes, even if the awaiting task is cancelled by a hedge
+        future = self.executor.submit(self.client.process_document, request=request, retry=None, timeout=timeout)
+        future.add_done_callback(release)
+        started_at = time.monotonic()
+        result = await asyncio.wrap_future(future)
+        latency = time.monotonic() - started_at
+        self.latencies.append(latency)
+        limiter.increase()
+        metrics.OCR_CALL_LATENCY.observe(latency)
+        return result.document
+
+    @staticmethod
+    def _http_error(e: Exception) -> HTTPException:
+        # Quota and availability errors tell the client to come back later instead of surfacing as 500s
+        if isinstance(e, core_exceptions.DeadlineExceeded):
+            return HTTPException(status_code=504, detail="Document AI timed out")
+        return HTTPException(status_code=503, detail=f"Document AI unavailable: {e.message}", headers={"Retry-After": str(int(OCR_BACKOFF_MAX))})
+
+
+pool = DocumentAIPool()
+
+cache = TieredCache(
+    os.path.join(CACHE_DIR, "ocr.sqlite3"),
+    memory_bytes=OCR_CACHE_MEMORY_BYTES,
+    disk_bytes=OCR_CACHE_DISK_BYTES,
+    ttl=OCR_CACHE_TTL,
+)
+
+
+def cache_key(processor_name: str, content: bytes, digest: Optional[str] = None) -> str:
+    return f"{processor_name}:{digest or hashlib.sha256(content).hexdigest()}"
+
+
+def split_pdf(content: bytes, pages_per_shard: int) -> List[Tuple[int, bytes]]:
+    """Splits a PDF into (first page index, shard bytes) page ranges.
+
+    A document that already fits in one shard is returned as is.
+    """
+    import pikepdf
+
+    with pikepdf.open(io.BytesIO(content)) as pdf:
+        page_count = len(pdf.pages)
+        if page_count <= pages_per_shard:
+            return [(0, content)]
+
+        shards = []
+        for start in range(0, page_count, pages_per_shard):
+            shard = pikepdf.new()
+            shard.pages.extend(pdf.pages[start:start + pages_per_shard])
+            buffer = io.BytesIO()
+            shard.save(buffer)
+            shards.append((start, buffer.getvalue()))
+        return shards
+
+
+def _shift_anchors(message, offset: int, first_page: int) -> None:
+    """Moves every text anchor under a raw Document proto message by ``offset`` characters, and
+    every page reference by ``first_page`` pages, however deeply they are nested."""
+    for field, value in message.ListFields():
+        if field.message_type is None:
+            continue
+        for item in value if field.label == field.LABEL_REPEATED else (value,):
+            name = item.DESCRIPTOR.name
+            if name == "TextAnchor":
+                for segment in item.text_segments:
+                    segment.start_index += offset
+                    segment.end_index += offset
+            elif name == "PageRef":
+                item.page += first_page
+            else:
+                _shift_anchors(item, offset, first_page)
+
+
+def merge_documents(shards: List[Tuple[int, documentai.Document]]) -> documentai.Document:
+    """Stitches shard results back into one Document.
+
+    Texts are concatenated in page order and pages and entities are copied over, with page numbers
+    renumbered from each shard's first page. Every text anchor and page reference in them (blocks,
+    tokens, symbols, table cells, form fields, entity properties...) is moved by its shard's offset.
+    Other document-level annotations, such as entity relations and text styles, are dropped. The
+    shard documents themselves are left untouched.
+    """
+    from google.cloud import documentai_v1beta3 as documentai
+
+    shards = sorted(shards, key=lambda item: item[0])
+    merged = documentai.Document.pb(documentai.Document(mime_type="application/pdf"))
+    offset = 0
+    for first_page, shard in shards:
+        shard = documentai.Document.pb(shard)
+        for source, target in ((shard.pages, merged.pages), (shard.entities, merged.entities)):
+            for element in source:
+                copy = target.add()
+                copy.CopyFrom(element)
+                _shift_anchors(copy, offset, first_page)
+        for page in merged.pages[len(merged.pages) - len(shard.pages):]:
+            page.page_number += first_page
+        offset += len(shard.text)
+    merged.text = "".join(documentai.Document.pb(shard).text for _, shard in shards)
+    return documentai.Document.wrap(merged)
+
+
+def page_texts(document: documentai.Document) -> List[str]:
+    """The text of each page, read through the page layout's text anchor.
+
+    A document without page anchors is treated as a single page.
+    """
+    # Read once: each access to document.text copies the whole string out of the protobuf
+    text = document.text
+    texts = []
+    for page in document.pages:
+        segments = page.layout.text_anchor.text_segments
+        texts.append("".join(text[segment.start_index:segment.end_index] for segment in segments))
+    if not any(texts):
+        return [text]
+    return texts
+
+
+def _process_request(processor_name: str, content: bytes) -> documentai.ProcessRequest:
+    from google.cloud import documentai_v1beta3 as documentai
+
+    return documentai.ProcessRequest(
+        name=processor_name,
+        raw_document=documentai.RawDocument(
+            content=content,
+            mime_type="application/pdf"
+        )
+    )
+
+
+async def _start_shards(processor_name: str, content: bytes, shard_pages: Optional[int]) -> List[asyncio.Task]:
+    """Shrinks the document, then starts OCR for every shard of it and returns the tasks in page order."""
+    content, outcome = await preprocess.optimize(content)
+    optimized = outcome == "optimized"
+    shard_pages = OCR_SHARD_PAGES if shard_pages is None else shard_pages
+    if shard_pages > 0:
+        shards = await asyncio.to_thread(split_pdf, content, shard_pages)
+    else:
+        shards = [(0, content)]
+
+    fanout = asyncio.Semaphore(OCR_SHARD_FANOUT)
+
+    async def process_shard(first_page: int, shard: bytes) -> Tuple[int, documentai.Document]:
+        async with fanout:
+            started_at = time.perf_counter()
+            document = await pool.process(_process_request(processor_name, shard))
+            preprocess.record_ocr(optimized, len(document.pages), time.perf_counter() - started_at)
+            return first_page, document
+
+    return [asyncio.ensure_future(process_shard(first_page, shard)) for first_page, shard in shards]
+
+
+async def _store(key: str, processor_name: str, shards: List[Tuple[int, documentai.Document]]) -> documentai.Document:
+    from google.cloud import documentai_v1beta3 as documentai
+
+    document = shards[0][1] if len(shards) == 1 else merge_documents(shards)
+    await asyncio.to_thread(cache.put, key, documentai.Document.serialize(document), processor_name)
+    return document
+
+
+async def process_document(
+    processor_name: str, document_content: bytes, shard_pages: Optional[int] = None, digest: Optional[str] = None
+) -> documentai.Document:
+    """OCRs a PDF given as bytes; ``digest`` is its SHA-256 when the caller already has it."""
+    from google.cloud import documentai_v1beta3 as documentai
+
+    # Identical uploads to the same processor are served from the cache
+    key = cache_key(processor_name, document_content, digest)
+    cached = await asyncio.to_thread(cache.get, key)
+    if cached is not None:
+        return documentai.Document.deserialize(cached)
+
+    tasks = await _start_shards(processor_name, document_content, shard_pages)
+    try:
+        shards = await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+    return await _store(key, processor_name, shards)
+
+
+async def iter_document(
+    processor_name: str, document_content: bytes, shard_pages: Optional[int] = None, digest: Optional[str] = None
+) -> AsyncIterator[Tuple[int, documentai.Document]]:
+    """Yields (first page index, Document) for each shard in page order as soon as it is ready.
+
+    All shards are OCRed concurrently; a shard is held back only until the ones before it are
+    done. The merged result is cached once the last shard arrives.
+    """
+    from google.cloud import documentai_v1beta3 as documentai
+
+    key = cache_key(processor_name, document_content, digest)
+    cached = await asyncio.to_thread(cache.get, key)
+    if cached is not None:
+        yield 0, documentai.Document.deserialize(cached)
+        return
+
+    tasks = await _start_shards(processor_name, document_content, shard_pages)
+    shards = []
+    try:
+        for task in tasks:
+            shard = await task
+            shards.append(shard)
+            yield shard
+    finally:
+        # Stop outstanding shards if the consumer goes away early
+        for task in tasks:
+            task.cancel()
+    await _store(key, processor_name, shards)
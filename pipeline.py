@@ -0,0 +1,216 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+
+import metrics
+from applicants import index as applicant_index
+from checks import validate_aadhaar_info, validate_income_cert_applicant_form
+from classifier import Segment, segment_pages
+from doctypes import DOC_TYPES, detect_type
+from extractors import extract_aadhaar_info, extract_income_cert_info
+from layout import Chunk, layout_chunks, page_spans, segment_chunks
+from ocr import page_texts, process_document
+from uploads import Upload
+
+# If you already have a Document AI Processor in your project, assign the full processor resource name here.
+processor_name = "projects/332125695616/locations/us/processors/a6bceed480e9d614"
+
+
+class StageTimer:
+    """Accumulates wall-clock seconds per pipeline stage."""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            with metrics.stage(name):
+                yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+
+async def _record_applicant(doc_type: str, fields: Dict, source: str) -> Optional[dict]:
+    """Adds a validated record to the applicant index, returning the earlier record it repeats."""
+    with metrics.stage("dedupe"):
+        duplicate_of = await asyncio.to_thread(applicant_index.check_and_record, doc_type, fields, source)
+    if duplicate_of is not None:
+        metrics.DUPLICATES_FOUND.labels(doc_type, duplicate_of["matched_on"]).inc()
+    return duplicate_of
+
+
+async def run_pdf(upload: Upload, shard_pages: Optional[int] = None, timer: Optional[StageTimer] = None) -> dict:
+    timer = timer or StageTimer()
+    with timer.stage("ocr"):
+        document = await process_document(processor_name, upload.content, shard_pages=shard_pages, digest=upload.sha256)
+
+    if document:
+        # Same text as splitting on blank lines and joining the pieces with newlines, without the
+        # per-chunk copies; the paragraphs themselves are streamed by /process-pdf/?stream=true
+        return {"text": document.text.replace("\n\n", "\n")}
+    else:
+        return {"error": "Failed to process the document"}
+
+
+async def run_aadhaar(upload: Upload, shard_pages: Optional[int] = None, timer: Optional[StageTimer] = None) -> dict:
+    timer = timer or StageTimer()
+    with timer.stage("ocr"):
+        document = await process_document(processor_name, upload.content, shard_pages=shard_pages, digest=upload.sha256)
+
+    if document:
+        extracted_text = document.text
+
+        # Parse Aadhaar information, trying the regex tier before llama3
+        with timer.stage("extract"):
+            extraction = await extract_aadhaar_info(extracted_text, layout_chunks(document, extracted_text))
+
+        # Validate Aadhaar information
+        with timer.stage("validate"):
+            validate_aadhaar_info(extraction.fields)
+
+        duplicate_of = await _record_applicant("aadhaar", extraction.fields, upload.sha256)
+        return {**extraction.response(), "duplicate_of": duplicate_of}
+    else:
+        return {"error": "Failed to process the document"}
+
+
+async def run_income_cert(upload: Upload, shard_pages: Optional[int] = None, timer: Optional[StageTimer] = None) -> dict:
+    timer = timer or StageTimer()
+    with timer.stage("ocr"):
+        document = await process_document(processor_name, upload.content, shard_pages=shard_pages, digest=upload.sha256)
+
+    if document:
+        extracted_text = document.text
+
+        # Parse Income Certificate information, trying the regex tier before llama3
+        with timer.stage("extract"):
+            extraction = await extract_income_cert_info(extracted_text, layout_chunks(document, extracted_text))
+
+        # Validate Income Certificate information
+        with timer.stage("validate"):
+            validate_income_cert_applicant_form(extraction.fields)
+
+        duplicate_of = await _record_applicant("income_cert", extraction.fields, upload.sha256)
+        return {**extraction.response(), "duplicate_of": duplicate_of}
+    else:
+        return {"error": "Failed to process the document"}
+
+
+async def run_document(
+    upload: Upload,
+    shard_pages: Optional[int] = None,
+    timer: Optional[StageTimer] = None,
+    doc_type: Optional[str] = None,
+) -> dict:
+    """OCRs once, works out the document type from the text unless ``doc_type`` is given, then
+    extracts and validates with that type's prompt, regex tier and schema.
+    """
+    timer = timer or StageTimer()
+    with timer.stage("ocr"):
+        document = await process_document(processor_name, upload.content, shard_pages=shard_pages, digest=upload.sha256)
+
+    if not document:
+        return {"error": "Failed to process the document"}
+
+    extracted_text = document.text
+    with timer.stage("classify"):
+        detected, classification = detect_type(extracted_text, len(document.pages) or 1)
+    if doc_type is None:
+        if detected is None:
+            raise HTTPException(status_code=422, detail={"error": "Unrecognized document type", "scores": classification.scores})
+        doc_type = detected
+    metrics.DOCUMENTS_CLASSIFIED.labels(doc_type).inc()
+    document_type = DOC_TYPES[doc_type]
+
+    with timer.stage("extract"):
+        extraction = await document_type.extract(extracted_text, layout_chunks(document, extracted_text))
+
+    with timer.stage("validate"):
+        document_type.validate(extraction.fields)
+
+    duplicate_of = await _record_applicant(doc_type, extraction.fields, upload.sha256)
+    return {
+        "document_type": doc_type,
+        **extraction.response(),
+        "duplicate_of": duplicate_of,
+        "classification": {"confidence": classification.confidence, "scores": classification.scores},
+    }
+
+
+async def _extract_segment(segment: Segment, source: str, layout: Optional[List[Chunk]]) -> dict:
+    result = {"pages": [segment.first_page, segment.last_page]}
+    if segment.doc_type is None:
+        return {**result, "error": "Unrecognized document type"}
+
+    # One unreadable or invalid document should not fail the rest of the bundle, so errors are reported per segment
+    document_type = DOC_TYPES[segment.doc_type]
+    try:
+        extraction = await document_type.extract(segment.text, layout)
+    except HTTPException as e:
+        return {**result, "confidence": segment.confidence, "error": e.detail}
+
+    errors = {}
+    with metrics.stage("validate"):
+        try:
+            document_type.validate(extraction.fields)
+        except HTTPException as e:
+            errors = e.detail
+    # Only records that passed validation go into the applicant index
+    duplicate_of = None if errors else await _record_applicant(segment.doc_type, extraction.fields, source)
+    return {**result, **extraction.response(), "confidence": segment.confidence, "errors": errors, "duplicate_of": duplicate_of}
+
+
+async def run_bundle(upload: Upload, shard_pages: Optional[int] = None, timer: Optional[StageTimer] = None) -> dict:
+    """OCRs a multi-document scan once, splits it into documents by page and extracts them concurrently.
+
+    Results are keyed by document type, each a list of documents with their 1-based page range.
+    """
+    timer = timer or StageTimer()
+    with timer.stage("ocr"):
+        document = await process_document(processor_name, upload.content, shard_pages=shard_pages, digest=upload.sha256)
+
+    if not document:
+        return {"error": "Failed to process the document"}
+
+    with timer.stage("classify"):
+        texts = page_texts(document)
+        segments = segment_pages(texts)
+        chunks = layout_chunks(document)
+        spans = page_spans(document)
+    for segment in segments:
+        metrics.DOCUMENTS_CLASSIFIED.labels(segment.doc_type or "unrecognized").inc()
+
+    # Validation runs inside each segment's task, so "extract" covers both here
+    with timer.stage("extract"):
+        results = await asyncio.gather(*(
+            _extract_segment(segment, upload.sha256, segment_chunks(chunks, spans, segment.first_page, segment.texts))
+            for segment in segments
+        ))
+
+    documents: Dict[str, List[dict]] = {}
+    for segment, result in zip(segments, results):
+        documents.setdefault(segment.doc_type or "unrecognized", []).append(result)
+    return {"page_count": len(texts), "documents": documents}
+
+
+# Document types accepted by the job API, mapped to their process -> parse -> validate chain.
+# Keys use the schema spelling; see pipeline_name for the endpoint-style one
+PIPELINES = {
+    "pdf": run_pdf,
+    "aadhaar": run_aadhaar,
+    "income_cert": run_income_cert,
+    "document": run_document,
+    "bundle": run_bundle,
+}
+
+
+def pipeline_name(doc_type: str) -> str:
+    """The PIPELINES key for a job API document type: ``income-cert``, spelled as in the
+    /process-income-cert/ path, is ``income_cert`` as in the schemas and batch.py.
+    """
+    return doc_type.replace("-", "_")
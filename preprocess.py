@@ -0,0 +1,233 @@
+"""Shrinks scanned PDFs before they are sent to Document AI.
+
+Embedded scans above ``PDF_TARGET_DPI`` are downsampled, images are recompressed as JPEG when that
+saves enough, blank scanned pages are emptied and unreferenced objects are dropped. The work is
+CPU-bound, so it runs in a process pool; any PDF it cannot handle is sent unchanged.
+"""
+import asyncio
+import io
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+import metrics
+
+# Set to 0 to send uploads to Document AI exactly as received
+PDF_OPTIMIZE = os.getenv("PDF_OPTIMIZE", "1") == "1"
+# Uploads smaller than this are already cheap to send and are left alone
+PDF_OPTIMIZE_MIN_BYTES = int(os.getenv("PDF_OPTIMIZE_MIN_BYTES", str(256 * 1024)))
+# Processes the optimizer runs in; 0 runs it on a thread of this process instead, as batch.py's
+# workers do, being CPU processes already
+PDF_OPTIMIZE_WORKERS = int(os.getenv("PDF_OPTIMIZE_WORKERS", "2"))
+# Resolution embedded scans are reduced to; Document AI reads printed and typed text well at 200
+PDF_TARGET_DPI = float(os.getenv("PDF_TARGET_DPI", "200"))
+PDF_JPEG_QUALITY = int(os.getenv("PDF_JPEG_QUALITY", "75"))
+# An image, or the whole file, is only replaced when the result is at least this much smaller
+PDF_MIN_SAVING = float(os.getenv("PDF_MIN_SAVING", "0.1"))
+# A scanned page is blank when fewer than this share of its pixels are dark
+PDF_BLANK_INK = float(os.getenv("PDF_BLANK_INK", "0.001"))
+
+# Content stream operators a page made only of placed images uses; anything else (text, paths)
+# means the page is not a plain scan and is never treated as blank
+SCAN_OPERATORS = {"q", "Q", "cm", "Do", "gs"}
+
+
+def _image_dpi(image, page) -> float:
+    """Resolution of an image assumed to cover its page, which is what a scan does.
+
+    An image drawn smaller than the page has a higher real resolution, so this never overstates it.
+    """
+    box = [float(value) for value in page.mediabox]
+    width_inches = abs(box[2] - box[0]) / 72 or 1
+    height_inches = abs(box[3] - box[1]) / 72 or 1
+    return max(int(image.Width) / width_inches, int(image.Height) / height_inches)
+
+
+def _simple_image(image) -> bool:
+    """8-bit RGB or grey images without masks, the kind a scanner embeds; others are left as they are."""
+    import pikepdf
+
+    if image.get("/Subtype") != pikepdf.Name.Image or "/SMask" in image or "/Mask" in image or "/Decode" in image:
+        return False
+    if int(image.get("/BitsPerComponent", 0)) != 8:
+        return False
+    if image.get("/ColorSpace") not in (pikepdf.Name.DeviceRGB, pikepdf.Name.DeviceGray):
+        return False
+    filters = image.get("/Filter")
+    filters = [filters] if isinstance(filters, pikepdf.Name) else list(filters or [])
+    return all(name in (pikepdf.Name.DCTDecode, pikepdf.Name.FlateDecode) for name in filters)
+
+
+def _is_blank(pil_image) -> bool:
+    # Counted at full resolution: shrinking first blurs thin pen and print strokes to light grey
+    dark = sum(pil_image.convert("L").histogram()[:128])
+    return dark <= PDF_BLANK_INK * pil_image.width * pil_image.height
+
+
+def _recompress(image, pil_image, dpi: float, target_dpi: float, quality: int) -> int:
+    """Rewrites the image as a (possibly downsampled) JPEG when that saves enough; returns bytes saved."""
+    import pikepdf
+    from PIL import Image
+
+    if dpi > target_dpi * 1.1:
+        scale = target_dpi / dpi
+        size = (max(1, round(pil_image.width * scale)), max(1, round(pil_image.height * scale)))
+        pil_image = pil_image.resize(size, Image.Resampling.LANCZOS)
+    if pil_image.mode not in ("RGB", "L"):
+        pil_image = pil_image.convert("RGB")
+
+    buffer = io.BytesIO()
+    pil_image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    before = len(image.read_raw_bytes())
+    after = buffer.tell()
+    if after > before * (1 - PDF_MIN_SAVING):
+        return 0
+
+    image.write(buffer.getvalue(), filter=pikepdf.Name.DCTDecode)
+    image.Width = pil_image.width
+    image.Height = pil_image.height
+    image.ColorSpace = pikepdf.Name.DeviceGray if pil_image.mode == "L" else pikepdf.Name.DeviceRGB
+    image.BitsPerComponent = 8
+    if "/DecodeParms" in image:
+        del image["/DecodeParms"]
+    return before - after
+
+
+def optimize_pdf(content: bytes, target_dpi: float = PDF_TARGET_DPI, quality: int = PDF_JPEG_QUALITY) -> Tuple[bytes, dict]:
+    """Returns the smaller PDF (or ``content`` if nothing worthwhile was saved) and what was done.
+
+    Blank pages are emptied rather than removed, so page numbers in results still match the upload.
+    """
+    import pikepdf
+
+    stats = {"pages": 0, "images": 0, "images_recompressed": 0, "blank_pages": 0}
+    with pikepdf.open(io.BytesIO(content)) as pdf:
+        # Whether each image already handled (they can be shared between pages) is blank
+        blank_images: Dict[Tuple[int, int], bool] = {}
+        for page in pdf.pages:
+            stats["pages"] += 1
+            if "/Thumb" in page.obj:
+                del page.obj["/Thumb"]
+            operators = {str(instruction.operator) for instruction in pikepdf.parse_content_stream(page)}
+            scanned = operators <= SCAN_OPERATORS
+            blank = scanned and "Do" in operators
+            xobjects = page.obj.get("/Resources", {}).get("/XObject", {})
+            for name in list(xobjects.keys()):
+                image = xobjects[name]
+                if not _simple_image(image):
+                    blank = False
+                    continue
+                if image.objgen not in blank_images:
+                    stats["images"] += 1
+                    pil_image = pikepdf.PdfImage(image).as_pil_image()
+                    blank_images[image.objgen] = scanned and _is_blank(pil_image)
+                    if _recompress(image, pil_image, _image_dpi(image, page), target_dpi, quality):
+                        stats["images_recompressed"] += 1
+                blank = blank and blank_images[image.objgen]
+            if blank:
+                # Nothing to read: the page stays, so numbering holds, but its scan is not uploaded
+                page.obj.Contents = pdf.make_stream(b"")
+                page.obj.Resources = pikepdf.Dictionary()
+                stats["blank_pages"] += 1
+
+        pdf.remove_unreferenced_resources()
+        buffer = io.BytesIO()
+        pdf.save(buffer, compress_streams=True, object_stream_mode=pikepdf.ObjectStreamMode.generate)
+
+    optimized = buffer.getvalue()
+    if len(optimized) > len(content) * (1 - PDF_MIN_SAVING):
+        return content, stats
+    return optimized, stats
+
+
+def _load() -> None:
+    """Imports the PDF and image libraries in a fresh worker process."""
+    import pikepdf  # noqa: F401
+    from PIL import Image  # noqa: F401
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+# Outcomes, bytes in and out, and Document AI pages and seconds with and without optimization
+counts = Counter()
+
+
+def _pool() -> Optional[ProcessPoolExecutor]:
+    """The worker processes, or None (the event loop's default thread pool) with no worker processes."""
+    global _executor
+    if _executor is None and PDF_OPTIMIZE_WORKERS > 0:
+        # Spawned, not forked: the app has gRPC and executor threads running by the first request
+        _executor = ProcessPoolExecutor(max_workers=PDF_OPTIMIZE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+async def warm_up() -> None:
+    """Starts a worker process, so the first upload does not wait for one.
+
+    The optimizer is optional, so a worker that cannot start does not hold up readiness: uploads
+    are then sent as received until a new pool manages to start.
+    """
+    if PDF_OPTIMIZE and PDF_OPTIMIZE_WORKERS > 0:
+        try:
+            await asyncio.get_running_loop().run_in_executor(_pool(), _load)
+        except BrokenProcessPool:
+            shutdown()
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+
+async def optimize(content: bytes) -> Tuple[bytes, str]:
+    """The upload as it should be sent to Document AI, and the outcome: optimized, unchanged,
+    skipped (too small or disabled) or error (not a PDF pikepdf can rewrite).
+    """
+    if not PDF_OPTIMIZE or len(content) < PDF_OPTIMIZE_MIN_BYTES:
+        outcome, optimized = "skipped", content
+    else:
+        started_at = time.perf_counter()
+        try:
+            optimized, _ = await asyncio.get_running_loop().run_in_executor(_pool(), optimize_pdf, content)
+        except BrokenProcessPool:
+            # A worker died (out of memory on a huge scan, say); the next upload gets a fresh pool
+            shutdown()
+            outcome, optimized = "error", content
+        except Exception:
+            outcome, optimized = "error", content
+        else:
+            outcome = "optimized" if len(optimized) < len(content) else "unchanged"
+        metrics.PDF_OPTIMIZE_SECONDS.observe(time.perf_counter() - started_at)
+    metrics.PDF_OPTIMIZED.labels(outcome).inc()
+    metrics.PDF_BYTES_SAVED.inc(len(content) - len(optimized))
+    counts[outcome] += 1
+    counts["bytes_in"] += len(content)
+    counts["bytes_out"] += len(optimized)
+    return optimized, outcome
+
+
+def record_ocr(optimized: bool, pages: int, seconds: float) -> None:
+    """Adds one Document AI call, so per-page OCR latency can be compared with and without optimization."""
+    label = "optimized" if optimized else "original"
+    metrics.OCR_PAGE_LATENCY.labels(label).observe(seconds / max(pages, 1))
+    counts[f"ocr_pages.{label}"] += max(pages, 1)
+    counts[f"ocr_seconds.{label}"] += seconds
+
+
+def stats() -> dict:
+    per_page = {
+        label: counts[f"ocr_seconds.{label}"] / counts[f"ocr_pages.{label}"] if counts[f"ocr_pages.{label}"] else None
+        for label in ("optimized", "original")
+    }
+    return {
+        **counts,
+        "bytes_saved": counts["bytes_in"] - counts["bytes_out"],
+        # Positive when optimized uploads are OCRed faster per page than ones sent as received
+        "ocr_page_seconds_delta": per_page["original"] - per_page["optimized"] if None not in per_page.values() else None,
+    }
@@ -0,0 +1,50 @@
+import hashlib
+import os
+from dataclasses import dataclass
+
+from fastapi import HTTPException, UploadFile
+
+import metrics
+
+# Uploads larger than this are rejected with 413 before they reach OCR
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+@dataclass
+class Upload:
+    filename: str
+    content: bytes
+    sha256: str
+
+    @property
+    def size(self) -> int:
+        return len(self.content)
+
+
+async def read_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> Upload:
+    """Reads an upload once, hashing it while enforcing the size limit.
+
+    Starlette already spools the request body into a SpooledTemporaryFile, so the first pass
+    streams it in fixed-size chunks to compute the SHA-256 and reject oversized files early,
+    and the bytes are only materialized once afterwards. Nothing is written under /tmp by us,
+    and the spooled file is always closed.
+    """
+    try:
+        with metrics.stage("upload"):
+            digest = hashlib.sha256()
+            size = 0
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"Upload exceeds the {max_bytes} byte limit")
+                digest.update(chunk)
+
+            await file.seek(0)
+            content = await file.read()
+    finally:
+        await file.close()
+
+    metrics.UPLOAD_BYTES.observe(len(content))
+
+    return Upload(filename=file.filename or "", content=content, sha256=digest.hexdigest())
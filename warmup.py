@@ -0,0 +1,68 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+import psutil
+
+# Seconds before a failed warm-up step (say, ollama still starting) is tried again
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+
+
+class WarmUp:
+    """Runs the startup steps concurrently in the background and records how long each took.
+
+    The app serves requests while this runs; ``ready`` only turns true once every step has
+    succeeded, and a failing step is retried until it does.
+    """
+
+    def __init__(self, steps: Dict[str, Callable[[], Awaitable[None]]], retry_seconds: float = WARMUP_RETRY_SECONDS):
+        self.steps = steps
+        self.retry_seconds = retry_seconds
+        self.seconds: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.attempts: Dict[str, int] = {}
+        self.ready = False
+        # Both measured from process start, so they include interpreter start-up and imports
+        self.serving_after: Optional[float] = None
+        self.ready_after: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self.serving_after = time.time() - psutil.Process().create_time()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        await asyncio.gather(*(self._step(name, step) for name, step in self.steps.items()))
+        self.ready_after = time.time() - psutil.Process().create_time()
+        self.ready = True
+
+    async def _step(self, name: str, step: Callable[[], Awaitable[None]]) -> None:
+        while True:
+            self.attempts[name] = self.attempts.get(name, 0) + 1
+            started_at = time.perf_counter()
+            try:
+                await step()
+            except Exception as e:
+                self.errors[name] = repr(e)
+                await asyncio.sleep(self.retry_seconds)
+                continue
+            self.seconds[name] = time.perf_counter() - started_at
+            self.errors.pop(name, None)
+            return
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "serving_after_seconds": self.serving_after,
+            "ready_after_seconds": self.ready_after,
+            "step_seconds": dict(self.seconds),
+            "attempts": dict(self.attempts),
+            "errors": dict(self.errors),
+        }